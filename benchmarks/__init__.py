@@ -0,0 +1,7 @@
+"""Performance benchmarks for indiek-core.
+
+Run from the top level of the repo with ``python -m benchmarks.run``; see
+``python -m benchmarks.run --help`` for sizes, repetitions and baseline
+options. Corpora are synthetic and seeded, so two runs with the same
+arguments measure the same workload.
+"""
@@ -0,0 +1,165 @@
+"""Synthetic, reproducible corpora of items and note trees.
+
+Corpora are only written to the in-memory mockdb driver, made the default by
+`isolated_driver`, or to a temporary SQLite database (`sqlite_corpus`), so
+that running benchmarks never touches a real database, whatever
+`INDIEK_DRIVER` says.
+"""
+from __future__ import annotations
+import os
+import random
+import tempfile
+from contextlib import contextmanager
+from types import ModuleType
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+from indiek.core import drivers
+from indiek.core.items import CORE_ITEM_TYPES, Item, Note
+
+
+VOCABULARY_SIZE = 5000
+COMMON_WORD = 'w0'
+"""Most frequent word of every corpus, matched by a large share of the items."""
+RARE_WORD = 'zzrare'
+"""Word planted in about one item out of 10 000."""
+
+
+def _vocabulary(size: int = VOCABULARY_SIZE) -> Tuple[List[str], List[float]]:
+    """Words w0, w1, ... with Zipf-distributed weights."""
+    words = [f'w{rank}' for rank in range(size)]
+    weights = [1 / (rank + 1) for rank in range(size)]
+    return words, weights
+
+
+def generate_records(n: int,
+                     seed: int = 0,
+                     item_types: Sequence[type] = CORE_ITEM_TYPES) -> Iterator[Tuple[type, Dict[str, str]]]:
+    """Yield n (core type, item dict) pairs with Zipf-distributed words.
+
+    Names have 2 to 5 words and contents 20 to 80, types are drawn uniformly.
+    """
+    rng = random.Random(seed)
+    words, weights = _vocabulary()
+    for position in range(n):
+        name = rng.choices(words, weights, k=rng.randint(2, 5))
+        content = rng.choices(words, weights, k=rng.randint(20, 80))
+        if position % 10000 == 0:
+            content.append(RARE_WORD)
+        yield rng.choice(item_types), {'name': ' '.join(name), 'content': ' '.join(content)}
+
+
+_isolated: Optional[ModuleType] = None
+
+
+@contextmanager
+def isolated_driver() -> Iterator[ModuleType]:
+    """Make the in-memory mockdb driver the default one for the enclosed block."""
+    global _isolated
+    previous = drivers.default()
+    _isolated = drivers.get('mockdb')
+    drivers.set_default(_isolated)
+    try:
+        yield _isolated
+    finally:
+        clear()
+        _isolated = None
+        drivers.set_default(previous)
+
+
+def _store(item_type: type) -> dict:
+    """In-memory table of item_type, refusing any backend but the isolated one."""
+    db_cls = item_type.BACKEND_CLS
+    if _isolated is None or db_cls is not getattr(_isolated, db_cls.__name__):
+        raise RuntimeError("Benchmark corpora only go to the driver set by isolated_driver().")
+    return db_cls._item_dict[db_cls.__name__]
+
+
+def clear(item_types: Sequence[type] = CORE_ITEM_TYPES) -> None:
+    """Remove every stored item of item_types from the isolated driver."""
+    for item_type in item_types:
+        _store(item_type).clear()
+
+
+def populate(n: int, seed: int = 0, item_types: Sequence[type] = CORE_ITEM_TYPES) -> Dict[type, List[int]]:
+    """Replace the stored items of item_types by a corpus of n items, see `isolated_driver`.
+
+    The in-memory mockdb store is filled directly, as its `save` scans every
+    existing ikid and would make large corpora quadratic to build.
+
+    Returns:
+        Dict[type, List[int]]: ikids of the new items per core type.
+    """
+    clear(item_types)
+    by_type: Dict[type, List[Dict[str, str]]] = {item_type: [] for item_type in item_types}
+    for item_type, record in generate_records(n, seed, item_types):
+        by_type[item_type].append(record)
+
+    ikids: Dict[type, List[int]] = {}
+    next_ikid = 0
+    for item_type, records in by_type.items():
+        table = _store(item_type)
+        ikids[item_type] = list(range(next_ikid, next_ikid + len(records)))
+        for ikid, record in zip(ikids[item_type], records):
+            table[ikid] = dict(record, _ikid=ikid)
+        next_ikid += len(records)
+    return ikids
+
+
+@contextmanager
+def sqlite_corpus(n: int, seed: int = 0, item_types: Sequence[type] = CORE_ITEM_TYPES) -> Iterator[Dict[type, List[int]]]:
+    """Corpus of n items in a temporary SQLite database, the default driver for the enclosed block.
+
+    Yields:
+        Dict[type, List[int]]: ikids of the items per core type.
+    """
+    from indiek.core.drivers import sqlite
+    previous = drivers.default()
+    by_type: Dict[type, List[Dict[str, str]]] = {item_type: [] for item_type in item_types}
+    for item_type, record in generate_records(n, seed, item_types):
+        by_type[item_type].append(record)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        sqlite.connect(os.path.join(tmpdir, 'corpus.sqlite3'))
+        drivers.set_default(sqlite)
+        try:
+            yield {item_type: item_type.BACKEND_CLS.save_many(records) for item_type, records in by_type.items()}
+        finally:
+            drivers.set_default(previous)
+            sqlite.close()
+
+
+def sample_item(seed: int = 0) -> Item:
+    """Unsaved core item drawn like the corpus ones."""
+    item_type, record = next(generate_records(1, seed))
+    return item_type(**record)
+
+
+def deep_note(depth: int, text: str = 'leaf text') -> Tuple[Note, Note]:
+    """Chain of depth nested notes, each holding a string and the next note.
+
+    Returns:
+        Tuple[Note, Note]: root and innermost note.
+    """
+    leaf = Note()
+    leaf.add_content(text)
+    node = leaf
+    for level in range(depth - 1):
+        parent = Note()
+        parent.add_content(f'level {level}')
+        parent.add_content(node)
+        node = parent
+    return node, leaf
+
+
+def wide_note(width: int, text: str = 'leaf text') -> Tuple[Note, List[Note]]:
+    """Root note holding width leaf notes.
+
+    Returns:
+        Tuple[Note, List[Note]]: root and its leaves.
+    """
+    root = Note()
+    leaves = []
+    for position in range(width):
+        leaf = Note()
+        leaf.add_content(f'{text} {position}')
+        leaves.append(leaf)
+    root.content = leaves
+    return root, leaves
@@ -0,0 +1,134 @@
+"""Timing, memory measurement and baseline comparison."""
+from __future__ import annotations
+import gc
+import json
+import math
+import platform
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass
+from typing import Callable, Dict, List, Optional
+
+
+@dataclass
+class Result:
+    """Measurements of one benchmark case.
+
+    Attributes:
+        calls (int): number of timed calls.
+        ops_per_sec (float): calls per second over the whole timed run.
+        p50_us, p90_us, p99_us (float): latency percentiles, in microseconds.
+        peak_kib (float): peak memory allocated by a single call, in KiB.
+    """
+    calls: int
+    ops_per_sec: float
+    p50_us: float
+    p90_us: float
+    p99_us: float
+    peak_kib: float
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of already sorted values."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(fraction * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def measure(call: Callable[[], object], repeat: int, warmup: int = 1) -> Result:
+    """Time repeat calls one by one, then trace the memory peak of one more.
+
+    Memory is traced in a separate call since tracemalloc slows allocations
+    down and would skew timings.
+    """
+    for _ in range(warmup):
+        call()
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        latencies = []
+        clock = time.perf_counter_ns
+        for _ in range(repeat):
+            start = clock()
+            call()
+            latencies.append(clock() - start)
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+    tracemalloc.start()
+    try:
+        call()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    latencies.sort()
+    total = sum(latencies)
+    return Result(calls=repeat,
+                  ops_per_sec=repeat / (total / 1e9) if total else float('inf'),
+                  p50_us=percentile(latencies, 0.50) / 1e3,
+                  p90_us=percentile(latencies, 0.90) / 1e3,
+                  p99_us=percentile(latencies, 0.99) / 1e3,
+                  peak_kib=peak / 1024)
+
+
+def environment() -> Dict[str, str]:
+    return {'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'machine': platform.machine()}
+
+
+def save(results: Dict[str, Result], path: str) -> None:
+    """Write results, with a description of the environment, as JSON."""
+    payload = {'environment': environment(),
+               'results': {name: asdict(result) for name, result in results.items()}}
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump(payload, file, indent=2, sort_keys=True)
+
+
+def load(path: str) -> Dict[str, Result]:
+    with open(path, encoding='utf-8') as file:
+        payload = json.load(file)
+    return {name: Result(**values) for name, values in payload['results'].items()}
+
+
+@dataclass
+class Comparison:
+    """Relative change of a case against its baseline (0.1 means 10% worse)."""
+    name: str
+    latency_change: float
+    memory_change: float
+
+    def regressed(self, tolerance: float) -> bool:
+        return self.latency_change > tolerance or self.memory_change > tolerance
+
+
+def _change(current: float, reference: float) -> float:
+    if reference <= 0:
+        return 0.0
+    return current / reference - 1
+
+
+def compare(results: Dict[str, Result], baseline: Dict[str, Result]) -> List[Comparison]:
+    """Compare median latency and peak memory of the cases present in both runs."""
+    return [Comparison(name,
+                       _change(result.p50_us, baseline[name].p50_us),
+                       _change(result.peak_kib, baseline[name].peak_kib))
+            for name, result in results.items() if name in baseline]
+
+
+def format_table(results: Dict[str, Result], comparisons: Optional[List[Comparison]] = None) -> str:
+    changes = {c.name: c for c in comparisons or ()}
+    header = f"{'case':<36}{'ops/s':>12}{'p50 us':>11}{'p90 us':>11}{'p99 us':>11}{'peak KiB':>11}"
+    if changes:
+        header += f"{'d p50':>9}{'d mem':>9}"
+    lines = [header, '-' * len(header)]
+    for name, r in results.items():
+        line = (f"{name:<36}{r.ops_per_sec:>12.1f}{r.p50_us:>11.1f}{r.p90_us:>11.1f}"
+                f"{r.p99_us:>11.1f}{r.peak_kib:>11.1f}")
+        if name in changes:
+            line += f"{changes[name].latency_change:>+9.0%}{changes[name].memory_change:>+9.0%}"
+        lines.append(line)
+    return '\n'.join(lines)
@@ -0,0 +1,153 @@
+"""Benchmark entry point.
+
+Examples:
+    python -m benchmarks.run
+    python -m benchmarks.run --sizes 1000 100000 --save baseline.json
+    python -m benchmarks.run --baseline baseline.json --tolerance 0.25
+
+With --baseline, the exit status is 1 if the median latency or the peak
+memory of any case grew by more than the tolerance.
+"""
+from __future__ import annotations
+import argparse
+import itertools
+import os
+import subprocess
+import sys
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from indiek.core.items import CORE_ITEM_TYPES, Definition
+from indiek.core.search import filter_str, list_all_items
+from benchmarks import corpus, harness
+
+
+DEFAULT_SIZES = (1000, 10000)
+DEFAULT_DEPTH = 200
+DEFAULT_WIDTH = 10000
+
+Case = Tuple[str, Callable[[], object], int]
+
+
+def item_cases(n: int, repeat: int, seed: int) -> Iterator[Case]:
+    """Cases run against a freshly populated corpus of n items."""
+    ikids = corpus.populate(n, seed)
+    loaded_ikids = itertools.cycle(ikids[Definition])
+    db_definition = Definition.BACKEND_CLS.load(ikids[Definition][0])
+    samples = itertools.count(seed)
+
+    def save_load():
+        item = corpus.sample_item(next(samples))
+        item.save()
+        type(item).load(item.ikid)
+        item.delete()
+
+    core_definition = Definition.from_db(db_definition)
+    scans = max(1, repeat // 10)
+    yield f'save_load[n={n}]', save_load, repeat
+    yield f'load[n={n}]', lambda: Definition.load(next(loaded_ikids)), repeat
+    yield f'to_db[n={n}]', core_definition._to_db, repeat
+    yield f'from_db[n={n}]', lambda: Definition.from_db(db_definition), repeat
+    yield f'filter_str_common[n={n}]', lambda: filter_str(corpus.COMMON_WORD, CORE_ITEM_TYPES), scans
+    yield f'filter_str_rare[n={n}]', lambda: filter_str(corpus.RARE_WORD, CORE_ITEM_TYPES), scans
+    yield f'list_all_items[n={n}]', lambda: list_all_items(CORE_ITEM_TYPES), scans
+
+
+def sqlite_search_cases(n: int, repeat: int, seed: int) -> Iterator[Case]:
+    """Serial and multi-process search of a temporary SQLite corpus of n items."""
+    scans = max(1, repeat // 10)
+    with corpus.sqlite_corpus(n, seed):
+        for word in (corpus.COMMON_WORD, corpus.RARE_WORD):
+            # The common word is too short for the trigram index, so every row goes through the regex.
+            label = 'common' if word == corpus.COMMON_WORD else 'rare'
+            yield f'sqlite_filter_str_{label}[n={n}]', lambda w=word: filter_str(w, CORE_ITEM_TYPES), scans
+            yield (f'sqlite_filter_str_{label}_parallel[n={n}]',
+                   lambda w=word: filter_str(w, CORE_ITEM_TYPES, processes=os.cpu_count()), scans)
+
+
+def note_cases(depth: int, width: int, repeat: int) -> Iterator[Case]:
+    """Rendering cases; each call edits a leaf first, so that caches are invalidated."""
+    deep_root, deep_leaf = corpus.deep_note(depth)
+    wide_root, wide_leaves = corpus.wide_note(width)
+    leaves = itertools.cycle(wide_leaves)
+
+    def render_deep():
+        deep_leaf.content[0] = 'edited'
+        return str(deep_root)
+
+    def render_wide():
+        next(leaves).content[0] = 'edited'
+        return str(wide_root)
+
+    def render_wide_cold():
+        root, _ = corpus.wide_note(width)
+        return str(root)
+
+    yield f'note_str_deep[depth={depth}]', render_deep, repeat
+    yield f'note_str_wide[width={width}]', render_wide, repeat
+    yield f'note_str_wide_cold[width={width}]', render_wide_cold, max(1, repeat // 10)
+
+
+def import_cases(repeat: int) -> Iterator[Case]:
+    """Cold imports in a fresh interpreter, startup included; no backend is loaded by either."""
+    def importer(module: str) -> Callable[[], object]:
+        command = [sys.executable, '-c', f'import {module}']
+        return lambda: subprocess.run(command, check=True)
+
+    calls = max(1, repeat // 20)
+    yield 'import_core_items', importer('indiek.core.items'), calls
+    yield 'import_core_search', importer('indiek.core.search'), calls
+
+
+def run(sizes: List[int], repeat: int, seed: int, depth: int, width: int,
+        selected: Optional[str] = None, log: Callable[[str], None] = print) -> Dict[str, harness.Result]:
+    """Run all cases whose name contains selected, or all of them."""
+    results = {}
+    groups = [lambda n=n: item_cases(n, repeat, seed) for n in sizes]
+    groups += [lambda n=n: sqlite_search_cases(n, repeat, seed) for n in sizes]
+    groups.append(lambda: note_cases(depth, width, repeat))
+    groups.append(lambda: import_cases(repeat))
+    with corpus.isolated_driver():
+        for group in groups:
+            for name, call, calls in group():
+                if selected and selected not in name:
+                    continue
+                log(f"running {name}")
+                results[name] = harness.measure(call, calls)
+    return results
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.run', description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES),
+                        help="corpus sizes, in items (default: %(default)s)")
+    parser.add_argument('--repeat', type=int, default=200,
+                        help="timed calls per case; scans use a tenth of it (default: %(default)s)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--depth', type=int, default=DEFAULT_DEPTH, help="deep note tree depth")
+    parser.add_argument('--width', type=int, default=DEFAULT_WIDTH, help="wide note tree width")
+    parser.add_argument('--only', help="only run cases whose name contains this string")
+    parser.add_argument('--save', metavar='PATH', help="write results to PATH as JSON")
+    parser.add_argument('--baseline', metavar='PATH', help="compare results to a file written by --save")
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help="relative slowdown or memory growth counted as regression (default: %(default)s)")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    results = run(args.sizes, args.repeat, args.seed, args.depth, args.width, args.only,
+                  log=lambda message: print(message, file=sys.stderr))
+    comparisons = None
+    if args.baseline:
+        comparisons = harness.compare(results, harness.load(args.baseline))
+    print(harness.format_table(results, comparisons))
+    if args.save:
+        harness.save(results, args.save)
+    regressions = [c.name for c in comparisons or () if c.regressed(args.tolerance)]
+    if regressions:
+        print(f"\nRegressions beyond {args.tolerance:.0%}: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,129 @@
+"""Result cache for repeated searches.
+
+Cached results are tagged with the generation of every item type they cover.
+Generations are bumped on each `save` and `delete` of that type, so a result
+is never served once one of its types has been written to. Writes made
+outside this process are not seen; use a TTL to bound staleness then.
+"""
+from __future__ import annotations
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Sequence, Tuple
+from indiek.core.items import add_listener
+
+
+DEFAULT_MAXSIZE = 1024
+
+_generations: Dict[type, int] = {}
+_generations_lock = threading.Lock()
+
+
+def generation(item_type: type) -> int:
+    """Current write generation of item_type."""
+    return _generations.get(item_type, 0)
+
+
+def bump(item_type: type) -> None:
+    # Locked so that concurrent writes can't lose an increment and leave stale results valid.
+    with _generations_lock:
+        _generations[item_type] = _generations.get(item_type, 0) + 1
+
+
+def track(event: str, obj: Any, ikid: int) -> None:
+    """Listener bumping the generation of the saved or deleted object's type and its bases.
+
+    Bases are bumped too since subclasses may share their backend records,
+    as PointerNote does with Note.
+    """
+    for item_type in type(obj).__mro__[:-1]:
+        bump(item_type)
+
+
+add_listener(track)
+
+
+def normalize_search_str(search_str: str) -> str:
+    """Canonical form of a search string: unique terms, sorted, single-spaced.
+
+    Terms are or-ed by `build_search_query`, so neither their order nor their
+    repetition changes the result.
+    """
+    return ' '.join(sorted(set(search_str.split())))
+
+
+class QueryCache:
+    """LRU cache of search results with optional time-to-live.
+
+    Attributes:
+        maxsize (int): number of results kept before least recently used ones are evicted.
+        ttl (float, optional): seconds after which a result expires; None means never.
+    """
+
+    def __init__(self, maxsize: int = DEFAULT_MAXSIZE, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._entries: OrderedDict[Hashable, Tuple[Tuple[int, ...], float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def make_key(search_str: str, item_types: Sequence[type], *extra: Hashable) -> Hashable:
+        return (normalize_search_str(search_str), tuple(item_types), *extra)
+
+    def get(self, key: Hashable, item_types: Sequence[type]) -> Optional[Any]:
+        """Return cached result for key, or None if absent, expired or stale."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                generations, stamp, result = entry
+                expired = self.ttl is not None and time.monotonic() - stamp > self.ttl
+                if expired or generations != tuple(map(generation, item_types)):
+                    del self._entries[key]
+                    self.invalidations += 1
+                else:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return result
+            self.misses += 1
+            return None
+
+    def put(self, key: Hashable, item_types: Sequence[type], result: Any,
+            generations: Optional[Tuple[int, ...]] = None) -> None:
+        """Store result for key.
+
+        Args:
+            generations (Tuple[int, ...], optional): generations of item_types taken
+                before computing result. Defaults to the current ones.
+        """
+        if generations is None:
+            generations = tuple(map(generation, item_types))
+        with self._lock:
+            self._entries[key] = (generations, time.monotonic(), result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, float]:
+        """Snapshot of hit/miss counters and occupancy."""
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations,
+            'size': len(self._entries),
+            'maxsize': self.maxsize,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
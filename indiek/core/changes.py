@@ -0,0 +1,131 @@
+"""Ordered log of saves and deletes, for incremental sync of downstream copies.
+
+Each save or delete made in this process, from the import of
+`indiek.core.items` on, is appended to `CHANGES` with the next sequence
+number. Writes made in a `session.session` are appended once it commits, and
+not at all if it rolls back. A consumer, e.g. a search replica, remembers the last
+sequence number it applied and later asks for the changes since then, so that
+staying in sync costs as much as the writes made in the meantime:
+
+    >>> from indiek.core.changes import CHANGES
+    >>> seq = CHANGES.last_seq
+    >>> ...
+    >>> for change in CHANGES.changes_since(seq):
+    ...     apply(change)
+    ...     seq = change.seq
+
+Only the latest `maxlen` changes are kept. A consumer that fell further
+behind gets `ChangeLogTruncated` and must rescan, e.g. with `list_all_items`.
+"""
+from __future__ import annotations
+import threading
+from typing import Any, Dict, Iterator, List, NamedTuple, Tuple
+
+
+DEFAULT_MAXLEN = 100_000
+CHUNK_SIZE = 256
+"""Changes read per lock acquisition by `changes_since`."""
+
+
+class ChangeLogTruncated(LookupError):
+    """Changes requested were dropped from the log; the consumer must rescan."""
+    pass
+
+
+class Change(NamedTuple):
+    seq: int
+    item_type: type
+    driver: Any
+    """Driver module written to, as drivers may hand out the same ikids."""
+    ikid: int
+    op: str
+    """'save' or 'delete'."""
+
+
+class ChangeLog:
+    """Thread-safe log of saves and deletes, numbered from 1.
+
+    Sequence numbers are consecutive, so the position of any change in the
+    log is found by subtraction.
+
+    Attributes:
+        maxlen (int): number of changes kept; older ones are dropped.
+    """
+
+    def __init__(self, maxlen: int = DEFAULT_MAXLEN):
+        self.maxlen = maxlen
+        self._changes: List[Change] = []
+        self._first_seq = 1
+        self._lock = threading.Lock()
+
+    @property
+    def last_seq(self) -> int:
+        """Sequence number of the latest change, 0 if none was logged."""
+        return self._first_seq + len(self._changes) - 1
+
+    @property
+    def first_seq(self) -> int:
+        """Sequence number of the oldest change kept."""
+        return self._first_seq
+
+    def __len__(self) -> int:
+        return len(self._changes)
+
+    def record(self, event: str, obj: Any, ikid: int) -> None:
+        """Listener appending a change; see `attach`."""
+        with self._lock:
+            changes = self._changes
+            changes.append(Change(self._first_seq + len(changes), type(obj), obj.backend, ikid, event))
+            # Drop old changes by batches, so that appending stays O(1) amortized.
+            excess = len(changes) - self.maxlen
+            if excess > self.maxlen // 4:
+                del changes[:excess]
+                self._first_seq += excess
+
+    def changes_since(self, seq: int) -> Iterator[Change]:
+        """Yield changes with a sequence number above seq, oldest first.
+
+        Changes logged while iterating are yielded too.
+
+        Raises:
+            ChangeLogTruncated: if some of these changes were already dropped.
+        """
+        while True:
+            with self._lock:
+                start = seq + 1 - self._first_seq
+                if start < 0:
+                    raise ChangeLogTruncated(f"Changes after {seq} were dropped; oldest kept is {self._first_seq}.")
+                chunk = self._changes[start:start + CHUNK_SIZE]
+            if not chunk:
+                return
+            yield from chunk
+            seq = chunk[-1].seq
+
+    def net_changes_since(self, seq: int) -> Dict[Tuple[type, Any, int], str]:
+        """Last operation on each object changed since seq, keyed by (type, driver, ikid).
+
+        Handy to apply a batch of changes at once, rewriting each object once.
+
+        Raises:
+            ChangeLogTruncated: if some of these changes were already dropped.
+        """
+        net: Dict[Tuple[type, Any, int], str] = {}
+        for change in self.changes_since(seq):
+            key = (change.item_type, change.driver, change.ikid)
+            net.pop(key, None)
+            net[key] = change.op
+        return net
+
+    def attach(self) -> None:
+        """Start logging every save and delete."""
+        # Imported here as items attaches CHANGES on its own import.
+        from indiek.core.items import add_listener
+        add_listener(self.record)
+
+    def detach(self) -> None:
+        from indiek.core.items import remove_listener
+        remove_listener(self.record)
+
+
+CHANGES = ChangeLog()
+"""Default log, attached by `indiek.core.items` on import."""
@@ -0,0 +1,74 @@
+"""Backend drivers shipped with indiek-core.
+
+A driver is a module exposing one class per item type (`Item`, `Definition`,
+`Theorem`, `Proof`, `Note`, `Question`) with the same surface as
+`indiek.mockdb.items`: instance methods `save`, `delete`, `reload` and
+`to_dict`, and class methods `load`, `list_all` and `str_filter`.
+
+Drivers may also provide a class method `update(ikid, fields)` overwriting
+only the given fields of a stored item, and raising KeyError if it doesn't
+exist; core objects then only send the fields changed since their last load
+or save.
+
+Drivers holding connections may provide a module-level context manager
+`transaction()` grouping the calls made by the current thread into a single
+transaction; `indiek.core.session.session` relies on it. `pool.ConnectionPool`
+implements the connection reuse and per-thread binding this requires.
+
+Drivers are imported lazily: core objects resolve theirs through `default`
+when first saved or loaded, so importing the core does no backend work.
+"""
+from __future__ import annotations
+import importlib
+import os
+import threading
+from types import ModuleType
+from typing import Dict, Optional, Union
+
+
+DRIVER_ENV_VAR = 'INDIEK_DRIVER'
+DEFAULT_DRIVER = 'mockdb'
+
+_registry: Dict[str, str] = {
+    'mockdb': 'indiek.mockdb.items',
+    'sqlite': 'indiek.core.drivers.sqlite',
+}
+_default: Optional[ModuleType] = None
+_lock = threading.Lock()
+
+
+def register(name: str, module: str) -> None:
+    """Make the driver module, given by its dotted path, selectable as name."""
+    _registry[name] = module
+
+
+def get(name: str) -> ModuleType:
+    """Driver module registered as name, or with that dotted path, imported on first use.
+
+    Raises:
+        ModuleNotFoundError: if the module can't be imported.
+    """
+    return importlib.import_module(_registry.get(name, name))
+
+
+def default() -> ModuleType:
+    """Driver of core objects created without `driver=`.
+
+    It is named by the `INDIEK_DRIVER` environment variable, defaulting to
+    mockdb, and only imported by the first call.
+    """
+    global _default
+    if _default is None:
+        with _lock:
+            if _default is None:
+                _default = get(os.environ.get(DRIVER_ENV_VAR) or DEFAULT_DRIVER)
+    return _default
+
+
+def set_default(driver: Union[str, ModuleType]) -> None:
+    """Change the default driver, given as a module or a name passed to `get`.
+
+    Objects that already used their driver keep it.
+    """
+    global _default
+    _default = get(driver) if isinstance(driver, str) else driver
@@ -0,0 +1,148 @@
+"""Thread-safe pool of reusable backend connections.
+
+Connections are opened on demand, up to the pool size, and kept open once
+released, so that drivers pay the connection setup cost once per pooled
+connection instead of once per call. A `session` binds one connection to the
+calling thread, so that every call made by that thread in the meantime goes
+through it; drivers build transactions on top of that.
+"""
+from __future__ import annotations
+import threading
+from contextlib import contextmanager
+from time import monotonic
+from typing import Any, Callable, Iterator, List, Optional
+
+
+DEFAULT_POOL_SIZE = 4
+DEFAULT_TIMEOUT = 30.0
+
+
+class PoolTimeout(TimeoutError):
+    """No connection of the pool was released in time."""
+    pass
+
+
+class ConnectionPool:
+    """Bounded pool of connections opened by factory.
+
+    Args:
+        factory (Callable[[], Any]): opens a new connection.
+        size (int, optional): maximum number of open connections.
+        timeout (float, optional): seconds `acquire` waits for a connection to be released.
+        close (Callable[[Any], None], optional): closes a connection. Defaults to calling its `close` method.
+    """
+
+    def __init__(self,
+                 factory: Callable[[], Any],
+                 size: int = DEFAULT_POOL_SIZE,
+                 timeout: float = DEFAULT_TIMEOUT,
+                 close: Optional[Callable[[Any], None]] = None):
+        if size < 1:
+            raise ValueError(f"Pool size must be at least 1, got {size}.")
+        self.size = size
+        self.timeout = timeout
+        self._factory = factory
+        self._close = close or (lambda conn: conn.close())
+        self._idle: List[Any] = []
+        self._opened = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        self._local = threading.local()
+
+    @property
+    def opened(self) -> int:
+        """Number of open connections, idle or not."""
+        return self._opened
+
+    @property
+    def idle(self) -> int:
+        return len(self._idle)
+
+    def acquire(self, timeout: Optional[float] = None) -> Any:
+        """Take an idle connection, or open one if the pool isn't full, or wait for one.
+
+        The connection must be handed back with `release`.
+
+        Args:
+            timeout (float, optional): seconds to wait. Defaults to the pool timeout.
+
+        Raises:
+            PoolTimeout: if no connection was released in time.
+            RuntimeError: if the pool is closed.
+        """
+        deadline = monotonic() + (self.timeout if timeout is None else timeout)
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise RuntimeError("Connection pool is closed.")
+                if self._idle:
+                    return self._idle.pop()
+                if self._opened < self.size:
+                    self._opened += 1
+                    break
+                remaining = deadline - monotonic()
+                if remaining <= 0:
+                    raise PoolTimeout(f"No connection released within {self.timeout}s.")
+                self._cond.wait(remaining)
+        try:
+            return self._factory()
+        except BaseException:
+            with self._cond:
+                self._opened -= 1
+                self._cond.notify()
+            raise
+
+    def release(self, conn: Any) -> None:
+        """Hand a connection back to the pool, closing it if the pool was closed meanwhile."""
+        with self._cond:
+            if not self._closed:
+                self._idle.append(conn)
+                self._cond.notify()
+                return
+            self._opened -= 1
+        self._close(conn)
+
+    @contextmanager
+    def connection(self) -> Iterator[Any]:
+        """Connection for the enclosed block: the session one if any, else a pooled one."""
+        bound = getattr(self._local, 'conn', None)
+        if bound is not None:
+            yield bound
+            return
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    @contextmanager
+    def session(self) -> Iterator[Any]:
+        """Bind a connection to the current thread for the enclosed block.
+
+        Nested sessions of a thread share the connection of the outermost one.
+        """
+        bound = getattr(self._local, 'conn', None)
+        if bound is not None:
+            yield bound
+            return
+        with self.connection() as conn:
+            self._local.conn = conn
+            try:
+                yield conn
+            finally:
+                self._local.conn = None
+
+    @property
+    def in_session(self) -> bool:
+        """Whether the current thread has a session open."""
+        return getattr(self._local, 'conn', None) is not None
+
+    def close(self) -> None:
+        """Close idle connections; connections in use are closed once released."""
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._opened -= len(idle)
+            self._cond.notify_all()
+        for conn in idle:
+            self._close(conn)
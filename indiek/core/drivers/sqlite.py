@@ -0,0 +1,439 @@
+"""Persistent, file-backed driver built on SQLite.
+
+All items live in a single `items` table keyed by ikid, so ikids are unique
+across types as in mockdb. Opening a database costs the same regardless of its
+size: nothing is reloaded at startup, lookups go through the primary key and
+the file is memory-mapped by SQLite. When FTS5 is available, a trigram index
+narrows down `str_filter` candidates before the regex is applied.
+
+The database path is taken from the `INDIEK_SQLITE_PATH` environment variable,
+or set explicitly with `connect`. Select this driver in core with the usual
+`driver=` parameter, e.g. `Definition(name='x', driver=sqlite)`.
+
+Connections are pooled: each call borrows one for the time of its statements,
+so threads may use the driver concurrently. Calls enclosed in `transaction()`
+share the connection of their thread and are committed together. In-memory
+databases are per-connection, so their pool holds a single connection.
+"""
+from __future__ import annotations
+import os
+import re
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence
+from indiek.core.drivers.pool import DEFAULT_POOL_SIZE, ConnectionPool
+
+
+PATH_ENV_VAR = 'INDIEK_SQLITE_PATH'
+DEFAULT_PATH = os.path.join(os.path.expanduser('~'), '.indiek', 'indiek.sqlite3')
+MMAP_SIZE = 256 * 1024 * 1024
+FETCH_SIZE = 512
+BUSY_TIMEOUT = 5.0
+"""Seconds a connection waits for another one to finish writing."""
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS items (
+    ikid INTEGER PRIMARY KEY,
+    type TEXT NOT NULL,
+    name TEXT NOT NULL DEFAULT '',
+    content TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS items_type ON items (type, ikid);
+"""
+
+_FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS items_fts USING fts5(
+    name, content, content='items', content_rowid='ikid', tokenize='trigram'
+);
+CREATE TRIGGER IF NOT EXISTS items_ai AFTER INSERT ON items BEGIN
+    INSERT INTO items_fts (rowid, name, content) VALUES (new.ikid, new.name, new.content);
+END;
+CREATE TRIGGER IF NOT EXISTS items_ad AFTER DELETE ON items BEGIN
+    INSERT INTO items_fts (items_fts, rowid, name, content) VALUES ('delete', old.ikid, old.name, old.content);
+END;
+CREATE TRIGGER IF NOT EXISTS items_au AFTER UPDATE ON items BEGIN
+    INSERT INTO items_fts (items_fts, rowid, name, content) VALUES ('delete', old.ikid, old.name, old.content);
+    INSERT INTO items_fts (rowid, name, content) VALUES (new.ikid, new.name, new.content);
+END;
+"""
+
+_UPSERT = ("INSERT INTO items (ikid, type, name, content) VALUES (?, ?, ?, ?) "
+           "ON CONFLICT (ikid) DO UPDATE SET name = excluded.name, content = excluded.content")
+
+
+class MixedTypeOverrideError(Exception):
+    """
+    An item is trying to be saved with an ID
+    pertaining to an existing item of a different type.
+    """
+    pass
+
+
+_lock = threading.RLock()
+_pool: Optional[ConnectionPool] = None
+_path: Optional[str] = None
+_pid: Optional[int] = None
+_has_fts = False
+
+
+def _regexp(pattern: str, flags: int, value: Any) -> bool:
+    return value is not None and re.search(pattern, str(value), flags) is not None
+
+
+def _open(path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT, check_same_thread=False, isolation_level=None)
+    conn.create_function('re_search', 3, _regexp, deterministic=True)
+    conn.execute(f'PRAGMA mmap_size = {MMAP_SIZE}')
+    return conn
+
+
+def connect(path: Optional[str] = None, pool_size: int = DEFAULT_POOL_SIZE) -> ConnectionPool:
+    """Open (creating if needed) the database used by this driver.
+
+    Args:
+        path (str, optional): database file; ':memory:' is accepted. Defaults to
+            `INDIEK_SQLITE_PATH` if set, `DEFAULT_PATH` otherwise.
+        pool_size (int, optional): maximum number of connections. Ignored for ':memory:'.
+
+    Returns:
+        ConnectionPool: the driver connections.
+    """
+    global _pool, _path, _pid, _has_fts
+    path = path or os.environ.get(PATH_ENV_VAR, DEFAULT_PATH)
+    with _lock:
+        close()
+        if path == ':memory:':
+            pool_size = 1
+        else:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = _open(path)
+        if path != ':memory:':
+            conn.execute('PRAGMA journal_mode = WAL')
+        conn.executescript(_SCHEMA)
+        try:
+            conn.executescript(_FTS_SCHEMA)
+            _has_fts = True
+        except sqlite3.OperationalError:
+            _has_fts = False
+        # The connection that set the schema up is the first one handed out.
+        first = [conn]
+        _pool = ConnectionPool(lambda: first.pop() if first else _open(path), size=pool_size)
+        _path, _pid = path, os.getpid()
+    return _pool
+
+
+def close() -> None:
+    global _pool
+    with _lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
+
+def _get_pool() -> ConnectionPool:
+    pool = _pool
+    if pool is not None:
+        return pool
+    with _lock:
+        if _pool is None:
+            connect()
+        return _pool
+
+
+def _connection():
+    """Context manager lending a connection: the one of the thread's transaction, if any."""
+    return _get_pool().connection()
+
+
+@contextmanager
+def transaction() -> Iterator[sqlite3.Connection]:
+    """Run the driver calls made by this thread in the enclosed block in a single transaction.
+
+    Nested uses join the outermost transaction.
+    """
+    with _get_pool().session() as conn:
+        if conn.in_transaction:
+            yield conn
+            return
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+
+
+def _literal_terms(regex: re.Pattern) -> Optional[List[str]]:
+    """Words of an alternation of plain words (as built by core search), else None."""
+    pattern = regex.pattern
+    if pattern.startswith('(') and pattern.endswith(')'):
+        pattern = pattern[1:-1]
+    terms = pattern.split('|')
+    if all(len(t) >= 3 and re.fullmatch(r'\w+', t) for t in terms):
+        return terms
+    return None
+
+
+def _filter_sql(regex: re.Pattern, type_names: Sequence[str]) -> tuple:
+    marks = ', '.join('?' * len(type_names))
+    sql = f"SELECT ikid, type, name, content FROM items WHERE type IN ({marks})"
+    params = list(type_names)
+    terms = _literal_terms(regex) if _has_fts else None
+    if terms:
+        sql += " AND ikid IN (SELECT rowid FROM items_fts WHERE items_fts MATCH ?)"
+        params.append(' OR '.join('"' + t.replace('"', '""') + '"' for t in terms))
+    sql += " AND (re_search(?, ?, name) OR re_search(?, ?, content))"
+    params += [regex.pattern, regex.flags, regex.pattern, regex.flags]
+    return sql, params
+
+
+def _stream(sql: str, params: Sequence[Any]) -> Iterator[tuple]:
+    """Rows selected by sql, a query with a WHERE clause, in ikid order.
+
+    Rows are fetched by pages following the last ikid seen, so that no
+    connection is held while the caller consumes them.
+    """
+    page_sql = sql + " AND ikid > ? ORDER BY ikid LIMIT ?"
+    last = -1
+    while True:
+        with _connection() as conn:
+            rows = conn.execute(page_sql, [*params, last, FETCH_SIZE]).fetchall()
+        yield from rows
+        if len(rows) < FETCH_SIZE:
+            return
+        last = rows[-1][0]
+
+
+class Item:
+    """Class that represents generic Item in the SQLite driver.
+
+    Attributes:
+        name (str): item name.
+        content (str): item content.
+        _ikid (int): ID of item in the database.
+    """
+
+    _attr_defs = ['name', 'content', '_ikid']
+    """List of attr that fully define an Item."""
+
+    def __init__(
+            self, *,
+            name: str = '',
+            content: str = '',
+            _ikid: Optional[int] = None
+    ):
+        self._ikid = _ikid
+        self.name = name
+        self.content = content
+
+    def __repr__(self):
+        _ikid = self._ikid
+        name = self.name
+        return f"SQLite Item:{_ikid=};{name=}"
+
+    def __str__(self):
+        return f"SQLite Item with ID {self._ikid} and name {self.name}"
+
+    def __eq__(self, other) -> bool:
+        attr_eq = all(getattr(self, a) == getattr(other, a) for a in Item._attr_defs)
+        return attr_eq and type(other) == type(self)
+
+    def to_dict(self):
+        """Return Item instance content as dict."""
+        return {a: getattr(self, a) for a in self._attr_defs}
+
+    @classmethod
+    def _from_row(cls, row: tuple) -> Item:
+        ikid, _, name, content = row
+        return cls(name=name, content=content, _ikid=ikid)
+
+    @classmethod
+    def _write(cls, conn: sqlite3.Connection, record: Dict[str, Any]) -> int:
+        ikid = record.get('_ikid')
+        name, content = record.get('name', ''), record.get('content', '')
+        if ikid is None:
+            return conn.execute("INSERT INTO items (type, name, content) VALUES (?, ?, ?)",
+                                (cls.__name__, name, content)).lastrowid
+        row = conn.execute("SELECT type FROM items WHERE ikid = ?", (ikid,)).fetchone()
+        if row is not None and row[0] != cls.__name__:
+            raise MixedTypeOverrideError()
+        conn.execute(_UPSERT, (ikid, cls.__name__, name, content))
+        return ikid
+
+    def save(self) -> int:
+        with transaction() as conn:
+            self._ikid = self._write(conn, self.to_dict())
+        return self._ikid
+
+    def delete(self) -> None:
+        if self._ikid is not None:
+            with _connection() as conn:
+                conn.execute("DELETE FROM items WHERE ikid = ? AND type = ?",
+                             (self._ikid, self.__class__.__name__))
+            self._ikid = None
+
+    def reload(self) -> None:
+        """Reload written values if _ikid exists otherwise nothing happens."""
+        if self._ikid is not None:
+            written = self.load(self._ikid)
+            self.name, self.content = written.name, written.content
+
+    @classmethod
+    def from_core(cls, pure_item: Any) -> Item:
+        return cls(**pure_item.to_dict())
+
+    @classmethod
+    def load(cls, _ikid: int) -> Item:
+        """Load Item from its ID.
+
+        Raises:
+            KeyError: if no item of this type has that ID.
+        """
+        with _connection() as conn:
+            row = conn.execute(
+                "SELECT ikid, type, name, content FROM items WHERE ikid = ? AND type = ?",
+                (_ikid, cls.__name__)).fetchone()
+        if row is None:
+            raise KeyError(_ikid)
+        return cls._from_row(row)
+
+    @classmethod
+    def iter_all(cls) -> Iterator[Item]:
+        """Stream stored items of this type, in ikid order."""
+        sql = "SELECT ikid, type, name, content FROM items WHERE type = ?"
+        return (cls._from_row(row) for row in _stream(sql, (cls.__name__,)))
+
+    @classmethod
+    def list_all(cls) -> List[Item]:
+        return list(cls.iter_all())
+
+    @classmethod
+    def iter_filter(cls, regex: re.Pattern) -> Iterator[Item]:
+        """Stream items of this type whose name or content matches regex."""
+        sql, params = _filter_sql(regex, [cls.__name__])
+        return (cls._from_row(row) for row in _stream(sql, params))
+
+    @classmethod
+    def str_filter(cls, regex: re.Pattern) -> List[Item]:
+        """Return list of items from specified class with a regex match on name or content."""
+        return list(cls.iter_filter(regex))
+
+    @classmethod
+    def save_many(cls, records: Iterable[Dict[str, Any]]) -> List[int]:
+        """Write several item dicts in a single transaction and return their ikids."""
+        with transaction() as conn:
+            return [cls._write(conn, record) for record in records]
+
+    @classmethod
+    def update(cls, ikid: int, fields: Dict[str, Any]) -> None:
+        """Overwrite the given fields of an existing item, leaving the others as is.
+
+        Raises:
+            KeyError: if no item of this type has that ID.
+        """
+        columns = [field for field in ('name', 'content') if field in fields]
+        if not columns:
+            return
+        assignments = ', '.join(f"{column} = ?" for column in columns)
+        with transaction() as conn:
+            cursor = conn.execute(f"UPDATE items SET {assignments} WHERE ikid = ? AND type = ?",
+                                  [*(fields[column] for column in columns), ikid, cls.__name__])
+            if cursor.rowcount == 0:
+                raise KeyError(ikid)
+
+    @classmethod
+    def load_many(cls, ikids: Sequence[int]) -> List[Item]:
+        """Load several items in one query, in ikids order.
+
+        Raises:
+            KeyError: if any ikid is missing.
+        """
+        ikids = list(ikids)
+        marks = ', '.join('?' * len(ikids))
+        with _connection() as conn:
+            rows = conn.execute(
+                f"SELECT ikid, type, name, content FROM items WHERE type = ? AND ikid IN ({marks})",
+                [cls.__name__, *ikids]).fetchall()
+        by_ikid = {row[0]: cls._from_row(row) for row in rows}
+        return [by_ikid[ikid] for ikid in ikids]
+
+    @classmethod
+    def delete_many(cls, ikids: Sequence[int]) -> None:
+        ikids = list(ikids)
+        marks = ', '.join('?' * len(ikids))
+        with transaction() as conn:
+            conn.execute(f"DELETE FROM items WHERE type = ? AND ikid IN ({marks})",
+                         [cls.__name__, *ikids])
+
+
+class Definition(Item): pass
+class Theorem(Item): pass
+class Proof(Item): pass
+class Note(Item): pass
+class Question(Item): pass
+
+
+ITEM_CLASSES = [
+    Definition,
+    Theorem,
+    Proof,
+    Note,
+    Question,
+    ]
+_CLASSES_BY_NAME = {cls.__name__: cls for cls in ITEM_CLASSES}
+
+
+def str_filter_many(regex: re.Pattern, db_classes: Sequence[type]) -> Dict[type, List[Item]]:
+    """Run `str_filter` for several classes in a single query."""
+    sql, params = _filter_sql(regex, [cls.__name__ for cls in db_classes])
+    results = {cls: [] for cls in db_classes}
+    for row in _stream(sql, params):
+        cls = _CLASSES_BY_NAME[row[1]]
+        results[cls].append(cls._from_row(row))
+    return results
+
+
+def list_all_many(db_classes: Sequence[type]) -> Dict[type, List[Item]]:
+    """Run `list_all` for several classes in a single query."""
+    marks = ', '.join('?' * len(db_classes))
+    sql = f"SELECT ikid, type, name, content FROM items WHERE type IN ({marks})"
+    results = {cls: [] for cls in db_classes}
+    for row in _stream(sql, [cls.__name__ for cls in db_classes]):
+        cls = _CLASSES_BY_NAME[row[1]]
+        results[cls].append(cls._from_row(row))
+    return results
+
+
+def scan_source() -> Optional[str]:
+    """Database path for worker processes of `indiek.core.parallel`; None for in-memory databases."""
+    _get_pool()
+    return None if _path == ':memory:' else _path
+
+
+def ikid_range(type_names: Sequence[str]) -> Optional[tuple]:
+    """(lowest, highest + 1) ikids of items of these types, None if there are none."""
+    marks = ', '.join('?' * len(type_names))
+    with _connection() as conn:
+        low, high = conn.execute(f"SELECT min(ikid), max(ikid) FROM items WHERE type IN ({marks})",
+                                 list(type_names)).fetchone()
+    return None if low is None else (low, high + 1)
+
+
+def match_range(source: str, type_names: Sequence[str], start: int, stop: int,
+                pattern: str, flags: int) -> List[tuple]:
+    """(type name, ikid) of items of these types with start <= ikid < stop matching the regex.
+
+    Meant to run in worker processes, which open the database at source themselves.
+    """
+    global _pool
+    if _pid != os.getpid():
+        # Connections inherited through fork must not be used by the child.
+        _pool = None
+    if _pool is None or _path != source:
+        connect(source)
+    sql, params = _filter_sql(re.compile(pattern, flags), type_names)
+    with _connection() as conn:
+        rows = conn.execute(sql + " AND ikid >= ? AND ikid < ? ORDER BY ikid", [*params, start, stop])
+        return [(type_name, ikid) for ikid, type_name, _, _ in rows]
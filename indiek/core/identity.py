@@ -0,0 +1,117 @@
+"""Identity map for core objects.
+
+While an identity map is active, loading or casting an item already seen
+returns the live core object instead of building a new one from the backend.
+Objects are keyed by (core type, driver, ikid), as different drivers may
+hand out the same ikids.
+The active map is held in a context variable, so concurrent sessions (threads
+or asyncio tasks) each see their own.
+"""
+from __future__ import annotations
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Hashable, Iterator, Optional
+
+
+DEFAULT_MAXSIZE = 10_000
+
+
+class IdentityMap:
+    """Bounded LRU map from (core type, driver, ikid) to live core objects.
+
+    Attributes:
+        maxsize (int): number of objects retained before least recently used ones are evicted.
+        hits (int): number of lookups served from the map.
+        misses (int): number of lookups not found in the map.
+    """
+
+    def __init__(self, maxsize: int = DEFAULT_MAXSIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._objects: OrderedDict[Hashable, Any] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._objects)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._objects
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Return object stored under key, or None. Counts as a hit or miss."""
+        with self._lock:
+            obj = self._objects.get(key)
+            if obj is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._objects.move_to_end(key)
+            return obj
+
+    def put(self, key: Hashable, obj: Any) -> None:
+        with self._lock:
+            self._objects[key] = obj
+            self._objects.move_to_end(key)
+            while len(self._objects) > self.maxsize:
+                self._objects.popitem(last=False)
+                self.evictions += 1
+
+    def discard(self, key: Hashable) -> None:
+        with self._lock:
+            self._objects.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._objects.clear()
+
+    def stats(self) -> Dict[str, float]:
+        """Snapshot of hit/miss counters and occupancy."""
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'size': len(self._objects),
+            'maxsize': self.maxsize,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
+
+
+_active: ContextVar[Optional[IdentityMap]] = ContextVar('indiek_identity_map', default=None)
+
+
+def current() -> Optional[IdentityMap]:
+    """Identity map active in the current context, if any."""
+    return _active.get()
+
+
+def use_identity_map(imap: Optional[IdentityMap]) -> None:
+    """Activate imap for the current context; None disables the identity map."""
+    _active.set(imap)
+
+
+@contextmanager
+def identity_session(maxsize: int = DEFAULT_MAXSIZE) -> Iterator[IdentityMap]:
+    """Activate a fresh identity map for the duration of the with block."""
+    imap = IdentityMap(maxsize)
+    token = _active.set(imap)
+    try:
+        yield imap
+    finally:
+        _active.reset(token)
+
+
+def track(event: str, obj: Any, ikid: int) -> None:
+    """Write-through listener keeping the active map in line with save/delete."""
+    imap = _active.get()
+    if imap is None:
+        return
+    key = (type(obj), obj.backend, ikid)
+    if event == 'delete':
+        imap.discard(key)
+    else:
+        imap.put(key, obj)
@@ -0,0 +1,226 @@
+"""In-process inverted index over item name and content.
+
+The index maps lower-cased word tokens to the ikids of the items containing
+them, segmented by core type. Once attached, it follows `Nucleus.save` and
+`Nucleus.delete` so that searches never need to scan the backend. An index
+covers the items of a single driver.
+"""
+from __future__ import annotations
+import re
+from bisect import bisect_left, insort
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+from indiek.core import drivers
+from indiek.core.items import (Item,
+                               Note,
+                               Nucleus,
+                               CORE_ITEM_TYPES,
+                               add_listener,
+                               remove_listener)
+
+
+TOKEN_RE = re.compile(r'\w+')
+INDEXED_TYPES = (*CORE_ITEM_TYPES, Note)
+
+
+def tokenize(text: str) -> List[str]:
+    """Split text into lower-cased word tokens."""
+    return TOKEN_RE.findall(str(text).lower())
+
+
+class InvertedIndex:
+    """Token index over name and content of saved items.
+
+    Query terms are matched as token prefixes, so 'theo' matches an item
+    whose name contains 'Theorem'. Lookups bisect a sorted vocabulary and
+    only touch the postings of matching tokens, never the whole corpus.
+
+    Attributes:
+        item_types (Tuple[type, ...]): core types covered by the index.
+
+    Args:
+        item_types (Sequence[type], optional): core types to cover.
+        driver (Any, optional): driver whose items are indexed; writes to other
+            drivers are ignored. Defaults to the default driver, resolved on first use.
+    """
+
+    def __init__(self, item_types: Sequence[type] = INDEXED_TYPES, driver: Any = None):
+        self.item_types = tuple(item_types)
+        self._driver = driver
+        self._postings: Dict[str, Dict[type, Set[int]]] = {}
+        self._doc_terms: Dict[Tuple[type, int], Dict[str, Tuple[int, int]]] = {}
+        self._doc_lengths: Dict[Tuple[type, int], Tuple[int, int]] = {}
+        self._length_totals: Dict[type, List[int]] = {}
+        self._docs_by_type: Dict[type, Set[int]] = {}
+        self._vocab: List[str] = []
+
+    @property
+    def driver(self) -> Any:
+        """Driver module whose items are indexed, which hits are loaded from."""
+        if self._driver is None:
+            self._driver = drivers.default()
+        return self._driver
+
+    def __len__(self) -> int:
+        return len(self._doc_terms)
+
+    def __contains__(self, key: Tuple[type, int]) -> bool:
+        return key in self._doc_terms
+
+    def add(self, item_type: type, ikid: int, name: str, content: str) -> None:
+        """Index (or re-index) a single document."""
+        self.remove(item_type, ikid)
+        key = (item_type, ikid)
+        name_tokens, content_tokens = tokenize(name), tokenize(content)
+        frequencies: Dict[str, Tuple[int, int]] = {}
+        for token in name_tokens:
+            in_name, in_content = frequencies.get(token, (0, 0))
+            frequencies[token] = (in_name + 1, in_content)
+        for token in content_tokens:
+            in_name, in_content = frequencies.get(token, (0, 0))
+            frequencies[token] = (in_name, in_content + 1)
+        for token in frequencies:
+            by_type = self._postings.get(token)
+            if by_type is None:
+                by_type = self._postings[token] = {}
+                insort(self._vocab, token)
+            by_type.setdefault(item_type, set()).add(ikid)
+        self._doc_terms[key] = frequencies
+        lengths = self._doc_lengths[key] = (len(name_tokens), len(content_tokens))
+        totals = self._length_totals.setdefault(item_type, [0, 0])
+        totals[0] += lengths[0]
+        totals[1] += lengths[1]
+        self._docs_by_type.setdefault(item_type, set()).add(ikid)
+
+    def remove(self, item_type: type, ikid: int) -> None:
+        """Drop a document from the index; unknown documents are ignored."""
+        key = (item_type, ikid)
+        frequencies = self._doc_terms.pop(key, None)
+        if frequencies is None:
+            return
+        lengths = self._doc_lengths.pop(key)
+        totals = self._length_totals[item_type]
+        totals[0] -= lengths[0]
+        totals[1] -= lengths[1]
+        self._docs_by_type[item_type].discard(ikid)
+        for token in frequencies:
+            by_type = self._postings[token]
+            ikids = by_type[item_type]
+            ikids.discard(ikid)
+            if not ikids:
+                del by_type[item_type]
+            if not by_type:
+                del self._postings[token]
+                del self._vocab[bisect_left(self._vocab, token)]
+
+    def clear(self) -> None:
+        self._postings.clear()
+        self._doc_terms.clear()
+        self._doc_lengths.clear()
+        self._length_totals.clear()
+        self._docs_by_type.clear()
+        self._vocab.clear()
+
+    def ikids(self, item_type: type) -> Set[int]:
+        """All indexed ikids of item_type (do not mutate)."""
+        return self._docs_by_type.get(item_type, set())
+
+    def term_frequencies(self, item_type: type, ikid: int) -> Dict[str, Tuple[int, int]]:
+        """Token -> (occurrences in name, occurrences in content) for one document."""
+        return self._doc_terms[(item_type, ikid)]
+
+    def field_lengths(self, item_type: type, ikid: int) -> Tuple[int, int]:
+        """Number of tokens in name and content of one document."""
+        return self._doc_lengths[(item_type, ikid)]
+
+    def average_lengths(self, item_type: type) -> Tuple[float, float]:
+        """Mean number of tokens in name and content over documents of item_type."""
+        count = len(self.ikids(item_type))
+        if not count:
+            return 0.0, 0.0
+        name_total, content_total = self._length_totals[item_type]
+        return name_total / count, content_total / count
+
+    def expand(self, term: str) -> List[str]:
+        """Vocabulary tokens starting with term."""
+        return list(self._expand(term.lower()))
+
+    def rebuild(self) -> None:
+        """Re-populate the index from the backend of each covered type in its driver."""
+        self.clear()
+        for item_type in self.item_types:
+            if getattr(item_type, 'BACKEND_NAME', None) is None:
+                continue
+            for dbi in item_type._backend_cls(self.driver).list_all():
+                if issubclass(item_type, Item):
+                    self.add(item_type, dbi._ikid, dbi.name, dbi.content)
+                elif item_type._owns(dbi):
+                    # Notes store their rendered text as name, and their structure as content.
+                    self.add(item_type, dbi._ikid, '', dbi.name)
+
+    def attach(self) -> None:
+        """Keep the index current on every save and delete."""
+        add_listener(self._on_event)
+
+    def detach(self) -> None:
+        remove_listener(self._on_event)
+
+    def _on_event(self, event: str, obj: Nucleus, ikid: int) -> None:
+        item_type = type(obj)
+        if item_type not in self.item_types or obj.backend is not self.driver:
+            return
+        if event == 'delete':
+            self.remove(item_type, ikid)
+        elif isinstance(obj, Item):
+            self.add(item_type, ikid, obj.name, obj.content)
+        else:
+            self.add(item_type, ikid, '', str(obj))
+
+    def _expand(self, term: str) -> Iterable[str]:
+        """Yield vocabulary tokens starting with term."""
+        vocab = self._vocab
+        for position in range(bisect_left(vocab, term), len(vocab)):
+            token = vocab[position]
+            if not token.startswith(term):
+                break
+            yield token
+
+    def match_term(self, term: str, item_type: type) -> Set[int]:
+        """Ikids of item_type having a token that starts with term."""
+        hits = set()
+        for token in self._expand(term.lower()):
+            hits |= self._postings[token].get(item_type, set())
+        return hits
+
+    def search(self,
+               search_str: str,
+               item_types: Optional[Sequence[type]] = None,
+               match_all: bool = False) -> Dict[type, List[int]]:
+        """Find ikids of documents matching the white-space separated terms.
+
+        Args:
+            search_str (str): search string, split into terms like in `build_search_query`.
+            item_types (Sequence[type], optional): types to query. Defaults to all covered types.
+            match_all (bool, optional): if True, every term must match (AND); otherwise any term
+                suffices (OR). Defaults to False.
+
+        Returns:
+            Dict[type, List[int]]: sorted matching ikids per type.
+        """
+        terms = tokenize(search_str)
+        if item_types is None or len(item_types) == 0:
+            item_types = self.item_types
+        results = {}
+        for item_type in item_types:
+            hits = None
+            for term in terms:
+                term_hits = self.match_term(term, item_type)
+                if hits is None:
+                    hits = term_hits
+                elif match_all:
+                    hits &= term_hits
+                else:
+                    hits |= term_hits
+                if match_all and not hits:
+                    break
+            results[item_type] = sorted(hits or ())
+        return results
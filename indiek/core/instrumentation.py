@@ -0,0 +1,142 @@
+"""Opt-in timing of backend calls, casting and rendering.
+
+Instrumented operations are named '<category>.<operation>', with categories
+'backend' (driver calls), 'cast' (backend to core objects) and 'render'
+(`Note.__str__`). Each completed operation is reported to every registered
+hook as `hook(operation, seconds, rows, nbytes)`.
+
+Nothing is measured while no hook is registered: instrumented call sites
+then only check the module-level `enabled` flag.
+
+Example:
+    >>> from indiek.core import instrumentation
+    >>> instrumentation.enable()
+    >>> ...
+    >>> instrumentation.METRICS.snapshot()
+"""
+from __future__ import annotations
+import threading
+from contextlib import contextmanager
+from time import perf_counter
+from typing import Any, Callable, Dict, Iterator, List
+
+
+Hook = Callable[[str, float, int, int], None]
+_hooks: List[Hook] = []
+
+enabled = False
+"""Whether any hook is registered; read it as `instrumentation.enabled`."""
+
+
+def add_hook(hook: Hook) -> None:
+    """Register a callback notified after each instrumented operation."""
+    global enabled
+    if hook not in _hooks:
+        _hooks.append(hook)
+    enabled = True
+
+
+def remove_hook(hook: Hook) -> None:
+    """Unregister a callback previously passed to `add_hook`."""
+    global enabled
+    if hook in _hooks:
+        _hooks.remove(hook)
+    enabled = bool(_hooks)
+
+
+def record(operation: str, seconds: float, rows: int = 0, nbytes: int = 0) -> None:
+    """Report a completed operation to every hook."""
+    for hook in tuple(_hooks):
+        hook(operation, seconds, rows, nbytes)
+
+
+def _rows(result: Any) -> int:
+    """Number of rows in a driver call result."""
+    if isinstance(result, dict):
+        return sum(map(_rows, result.values()))
+    if isinstance(result, (list, tuple)):
+        return len(result)
+    return 0 if result is None else 1
+
+
+def timed(operation: str, call: Callable, *args, **kwargs) -> Any:
+    """Return `call(*args, **kwargs)`, reporting its duration and rows if enabled."""
+    if not enabled:
+        return call(*args, **kwargs)
+    start = perf_counter()
+    result = call(*args, **kwargs)
+    record(operation, perf_counter() - start, _rows(result))
+    return result
+
+
+@contextmanager
+def span(operation: str) -> Iterator[Dict[str, int]]:
+    """Time the enclosed block as operation.
+
+    The yielded dict may be updated with 'rows' and 'nbytes' counts. Useful
+    to attribute whole requests, e.g. `with span('app.search'): ...`.
+    """
+    counts = {'rows': 0, 'nbytes': 0}
+    if not enabled:
+        yield counts
+        return
+    start = perf_counter()
+    try:
+        yield counts
+    finally:
+        record(operation, perf_counter() - start, counts['rows'], counts['nbytes'])
+
+
+class MetricsRecorder:
+    """Hook aggregating count, durations, rows and bytes per operation."""
+
+    def __init__(self):
+        self._stats: Dict[str, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, operation: str, seconds: float, rows: int, nbytes: int) -> None:
+        with self._lock:
+            stats = self._stats.get(operation)
+            if stats is None:
+                stats = self._stats[operation] = [0, 0.0, 0.0, 0, 0]
+            stats[0] += 1
+            stats[1] += seconds
+            stats[2] = max(stats[2], seconds)
+            stats[3] += rows
+            stats[4] += nbytes
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stats.clear()
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        """Per-operation metrics, as plain data ready to be serialized."""
+        with self._lock:
+            return {operation: {'count': count,
+                                'total_seconds': total,
+                                'mean_seconds': total / count,
+                                'max_seconds': longest,
+                                'rows': rows,
+                                'bytes': nbytes}
+                    for operation, (count, total, longest, rows, nbytes) in self._stats.items()}
+
+    def by_category(self) -> Dict[str, float]:
+        """Total seconds spent per category (backend, cast, render, ...)."""
+        totals: Dict[str, float] = {}
+        for operation, stats in self.snapshot().items():
+            category = operation.split('.', 1)[0]
+            totals[category] = totals.get(category, 0.0) + stats['total_seconds']
+        return totals
+
+
+METRICS = MetricsRecorder()
+"""Default recorder, registered by `enable`."""
+
+
+def enable() -> None:
+    """Start aggregating metrics into `METRICS`."""
+    add_hook(METRICS)
+
+
+def disable() -> None:
+    remove_hook(METRICS)
@@ -1,6 +1,17 @@
 from __future__ import annotations
-from typing import Any, Optional, Self
-from indiek.mockdb import items as default_driver
+import json
+import threading
+import weakref
+from operator import attrgetter
+from time import perf_counter
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterable, Iterator, List, Optional, Self
+from indiek.core import drivers, identity, instrumentation
+from indiek.core.changes import CHANGES
+from indiek.core.mentions import MentionIndex
+
+if TYPE_CHECKING:
+    import re
+    from indiek.mockdb import items as default_driver
 
 
 IKID = 'iKiD'
@@ -9,12 +20,123 @@ class NestedNoteLoop(Exception): pass
 class AddContentToPointerNote(Exception): pass
 class DeadPointerNoteSave(Exception): pass
 
+
+Listener = Callable[[str, 'Nucleus', int], None]
+_listeners: List[Listener] = []
+
+
+def add_listener(callback: Listener) -> None:
+    """Register a callback notified after each successful save or delete.
+
+    Writes made in a `session.session` are only notified once it commits.
+
+    The callback is called as `callback(event, obj, ikid)` where event is
+    either 'save' or 'delete'. For deletions, `obj._ikid` is already reset,
+    hence the explicit ikid argument.
+    """
+    if callback not in _listeners:
+        _listeners.append(callback)
+
+
+def remove_listener(callback: Listener) -> None:
+    """Unregister a callback previously passed to `add_listener`."""
+    if callback in _listeners:
+        _listeners.remove(callback)
+
+
+def _notify(event: str, obj: Nucleus, ikid: int) -> None:
+    for callback in tuple(_listeners):
+        callback(event, obj, ikid)
+
+
+_journals = threading.local()
+"""Journals of the sessions open in each thread, outermost first, see `indiek.core.session`."""
+
+
+def _written(event: str, obj: Nucleus, ikid: int) -> None:
+    """Update obj after a successful save or delete of ikid, and notify listeners.
+
+    Inside a session covering the driver of obj, the state of obj before its
+    first write is kept for rollback, and listeners are only notified once
+    the session commits.
+    """
+    journal = next((j for j in getattr(_journals, 'open', ()) if j.covers(obj)), None)
+    if journal is not None:
+        journal.keep(obj)
+    if event == 'save':
+        obj._ikid = ikid
+        obj._dirty.clear()
+    else:
+        obj._ikid = None
+    if journal is None:
+        _notify(event, obj, ikid)
+    else:
+        journal.events.append((event, obj, ikid))
+
+
+MENTIONS = MentionIndex()
+"""Reverse index from ikids to the PointerNotes referring to them."""
+
+
+add_listener(identity.track)
+add_listener(MENTIONS.track)
+add_listener(CHANGES.record)
+
+
+def backlinks(ikid: int) -> List[Note]:
+    """Notes mentioning the item or note with given ikid, directly or through nesting."""
+    return MENTIONS.backlinks(ikid)
+
+
+async def _to_thread(func: Callable, *args: Any) -> Any:
+    # asyncio makes up most of the import time of this module, and is loaded
+    # anyway by the time a coroutine runs.
+    import asyncio
+    return await asyncio.to_thread(func, *args)
+
+
+class _DefaultBackendClass:
+    """Class attribute resolving to the owner's BACKEND_NAME class in the default driver.
+
+    The driver is only imported on first access.
+    """
+
+    def __get__(self, obj: Any, owner: type) -> Optional[type]:
+        name = owner.BACKEND_NAME
+        return None if name is None else getattr(drivers.default(), name)
+
+
 class Nucleus:
-    """Nuclear item."""
+    """Nuclear item.
 
-    def __init__(self, _ikid: Optional[int] = None, driver: Any = default_driver):
+    Core classes declare `__slots__` to keep per-instance overhead low;
+    subclasses should do the same (possibly with an empty tuple).
+    """
+
+    __slots__ = ('_ikid', '_backend', '_dirty', '_digest')
+
+    BACKEND_NAME: Optional[str] = None
+    """Name of the backend class for this core type in drivers, None if it has no dedicated one."""
+
+    BACKEND_CLS = _DefaultBackendClass()
+    """Backend class for this core type in the default driver, None if it has no dedicated one."""
+
+    def __init__(self, _ikid: Optional[int] = None, driver: Any = None):
         self._ikid = _ikid
-        self.backend = driver
+        self._backend = driver
+        self._dirty = set()
+        self._digest: Optional[int] = None
+
+    @property
+    def backend(self) -> Any:
+        """Driver module of this object; the default one, resolved on first access, unless given."""
+        if self._backend is None:
+            self._backend = drivers.default()
+        return self._backend
+
+    @backend.setter
+    def backend(self, driver: Any) -> None:
+        self._backend = driver
 
     @property 
     def ikid(self):
@@ -24,20 +146,158 @@ class Nucleus:
     def exists_in_db(self):
         """Check whether item was ever saved. Doesn't query the DB at all. """
         return self._ikid is not None
-    
+
+    @property
+    def dirty(self) -> frozenset:
+        """Names of the fields changed since the last load or save."""
+        return frozenset(self._dirty)
+
+    @property
+    def is_clean(self) -> bool:
+        """Whether saving would be a no-op: saved before and unchanged since."""
+        return self._ikid is not None and not self._dirty
+
+    def __hash__(self):
+        """Constant time hash: (type, ikid) once saved, cached content digest before."""
+        if self._ikid is not None:
+            return hash((type(self), self._ikid))
+        return self.digest
+
+    @property
+    def digest(self) -> int:
+        """Hash of the content, computed once and cached until the content changes."""
+        if self._digest is None:
+            self._digest = self._compute_digest()
+        return self._digest
+
+    def _compute_digest(self) -> int:
+        return object.__hash__(self)
+
     def save(self) -> int:
         """Save to backend.
         
         This method delegates the save operation to the backend.
         If _ikid is None in self, it will get set to new value
         generated by backend.
+
+        Saving a clean object (see `is_clean`) does nothing. If the backend
+        class provides `update(ikid, fields)`, only the changed fields of an
+        already saved object are sent to it.
         """
-        self._ikid = self._to_db().save()
+        if self.is_clean:
+            return self._ikid
+        _written('save', self, self._write())
         return self._ikid
+
+    def _write(self) -> int:
+        """Write to backend, partially if possible, and return the ikid."""
+        updater = getattr(self._db_cls(), 'update', None)
+        if self._ikid is not None and updater is not None:
+            record = self.to_dict()
+            try:
+                instrumentation.timed('backend.update', updater, self._ikid,
+                                      {field: record[field] for field in self._dirty})
+                return self._ikid
+            except KeyError:
+                pass
+        return instrumentation.timed('backend.save', self._to_db().save)
     
     def delete(self) -> None:
-        self._to_db().delete()
-        self._ikid = None
+        """Delete from backend; does nothing if never saved."""
+        if self._ikid is None:
+            return
+        instrumentation.timed('backend.delete', self._db_ref().delete)
+        _written('delete', self, self._ikid)
+
+    async def asave(self) -> int:
+        """Asynchronous counterpart of `save`.
+
+        Awaits the backend object's `asave` coroutine if the driver provides one,
+        otherwise runs the synchronous save in a worker thread. Clean objects
+        are skipped, as in `save`.
+
+        A worker thread doesn't join the `session` of the awaiting thread: it
+        writes through a connection of its own. Awaiting this inside
+        `session(sqlite)` therefore competes with the session's write lock
+        (`BEGIN IMMEDIATE`), or for its pooled connection, and blocks until
+        the busy or pool timeout expires.
+        """
+        if self.is_clean:
+            return self._ikid
+        native = getattr(self._to_db(), 'asave', None)
+        _written('save', self, await native() if native else await _to_thread(self._write))
+        return self._ikid
+
+    async def adelete(self) -> None:
+        """Asynchronous counterpart of `delete`, see `asave`."""
+        if self._ikid is None:
+            return
+        db_obj = self._db_ref()
+        native = getattr(db_obj, 'adelete', None)
+        await native() if native else await _to_thread(db_obj.delete)
+        _written('delete', self, self._ikid)
+
+    @staticmethod
+    def delete_many(objs: Iterable[Nucleus]) -> None:
+        """Delete several objects from backend with one driver call per backend class.
+
+        Backend classes exposing a `delete_many(ikids)` class method get a single
+        call; for the others, objects are deleted one by one. As with
+        `Note.delete`, notes are dropped from their parent notes, saved ones
+        being saved again afterwards.
+
+        Args:
+            objs (Iterable[Nucleus]): objects to delete. Unsaved ones are ignored.
+        """
+        groups: Dict[type, List[Nucleus]] = {}
+        parents: Dict[int, Note] = {}
+        for obj in objs:
+            if obj.exists_in_db:
+                groups.setdefault(obj._db_cls(), []).append(obj)
+                if isinstance(obj, Note):
+                    parents.update((id(parent), parent) for parent in obj.parents)
+                    obj.detach()
+
+        for db_cls, group in groups.items():
+            deleter = getattr(db_cls, 'delete_many', None)
+            if deleter is None:
+                for obj in group:
+                    instrumentation.timed('backend.delete', obj._db_ref().delete)
+            else:
+                instrumentation.timed('backend.delete_many', deleter, [obj._ikid for obj in group])
+            for obj in group:
+                _written('delete', obj, obj._ikid)
+        for parent in parents.values():
+            if parent.exists_in_db:
+                parent.save()
+
+    def _db_ref(self) -> Any:
+        """Backend object standing for this one in deletions, which only need the ikid."""
+        return self._db_cls()(_ikid=self._ikid)
+
+    def _db_cls(self) -> type:
+        """Backend class that this object gets written to, taken from its own driver."""
+        return getattr(self.backend, self.BACKEND_NAME or 'Item')
+
+    @classmethod
+    def _backend_cls(cls, driver: Any = None) -> type:
+        """Backend class of this core type in driver; BACKEND_CLS if driver is None."""
+        return getattr(driver or drivers.default(), cls.BACKEND_NAME)
+
+
+def _tracked(field: str) -> property:
+    """Property over slot '_' + field which marks field dirty when set."""
+    slot = '_' + field
+
+    def fget(self):
+        return getattr(self, slot)
+
+    def fset(self, value):
+        setattr(self, slot, value)
+        self._dirty.add(field)
+        self._digest = None
+
+    return property(fget, fset, doc=f"{field}, tracked for partial saves.")
 
 
 class Item(Nucleus):
@@ -60,12 +320,17 @@ class Item(Nucleus):
     """
 
     _attr_defs = ['_ikid', 'content', 'name']
+    __slots__ = tuple('_' + a for a in _attr_defs if a not in Nucleus.__slots__)
+    _attr_getter = attrgetter(*_attr_defs)
     
-    def __init__(self, *, name: str = '', content: Any = '', _ikid: Optional[int] = None, driver: Any = default_driver):
+    def __init__(self, *, name: str = '', content: Any = '', _ikid: Optional[int] = None, driver: Any = None):
         super().__init__(_ikid, driver)
         self.name = name
         self.content = content
 
+    name = _tracked('name')
+    content = _tracked('content')
+
     def __repr__(self):
         _ikid = self._ikid
         name = self.name
@@ -73,54 +338,299 @@ class Item(Nucleus):
         driver = self.backend
         return f"module: {__name__}; class:{self.__class__.__name__}; {_ikid=}; {name=}; {content_hash=}; {driver=}"
     
-    def __hash__(self):
-        # TODO: not sure this __hash__ method follows best practices
-        return hash((self._ikid, self.name, self.content, self.__class__.__name__))
+    # Defining __eq__ would otherwise unset the inherited __hash__.
+    __hash__ = Nucleus.__hash__
+
+    def _compute_digest(self) -> int:
+        return hash((self._name, self._content, self.__class__.__name__))
 
     def __str__(self):
         return f"Core {self.__class__.__name__} with ID {self.ikid} and name {self.name}"
 
     def __eq__(self, other) -> bool:
-        return (self._ikid == other._ikid
-                and self.name == other.name
-                and self.content == other.content
-                and type(other) == type(self))
+        """Same type, ikid, name and content.
+
+        Cached digests are compared before contents, so that unequal items
+        are usually told apart in constant time.
+        """
+        if self is other:
+            return True
+        return (type(other) == type(self)
+                and self._ikid == other._ikid
+                and self.digest == other.digest
+                and self._name == other._name
+                and self._content == other._content)
 
     def _to_db(self) -> default_driver.Item:
         """Export core Item to DB Item instance."""
-        as_dict = self.to_dict()
-        try:
-            return self.BACKEND_CLS(**as_dict)
-        except AttributeError:
-            return self.backend.Item(**as_dict)
+        return self._db_cls()(**self.to_dict())
+
+    @staticmethod
+    def save_many(items: Iterable[Item]) -> List[int]:
+        """Save several items with one driver call per backend class.
+
+        Backend classes exposing a `save_many(records)` class method, taking a
+        list of item dicts and returning their ikids, are written in one call.
+        For the others, items are saved one by one. Clean items are skipped.
+
+        Args:
+            items (Iterable[Item]): items to save, possibly of mixed types.
+
+        Returns:
+            List[int]: ikids assigned to items, in input order.
+        """
+        items = list(items)
+        groups: Dict[type, List[Item]] = {}
+        for item in items:
+            if not item.is_clean:
+                groups.setdefault(item._db_cls(), []).append(item)
+
+        for db_cls, group in groups.items():
+            saver = getattr(db_cls, 'save_many', None)
+            if saver is None:
+                ikids = [db_cls(**item.to_dict()).save() for item in group]
+            else:
+                ikids = saver([item.to_dict() for item in group])
+            for item, ikid in zip(group, ikids):
+                _written('save', item, ikid)
+        return [item._ikid for item in items]
+
+    @classmethod
+    def load(cls, ikid, driver: Any = None) -> Item:
+        """Create Core Item from backend using ikid.
+
+        If an identity map is active and already holds this item, the live
+        object is returned without querying the backend.
+
+        Args:
+            ikid (int): id of item to load.
+            driver (Any, optional): driver to load from. Defaults to the one of BACKEND_CLS.
+        """
+        driver = driver or drivers.default()
+        imap = identity.current()
+        if imap is not None:
+            cached = imap.get((cls, driver, ikid))
+            if cached is not None:
+                return cached
+        return cls._cast(instrumentation.timed('backend.load', cls._backend_cls(driver).load, ikid), imap, driver)
 
     @classmethod
-    def load(cls, ikid) -> Item:
-        """Create Core Item from backend using ikid."""
-        return cls.from_db(cls.BACKEND_CLS.load(ikid))
+    async def aload(cls, ikid, driver: Any = None) -> Item:
+        """Asynchronous counterpart of `load`.
+
+        Awaits the backend class' `aload` coroutine if the driver provides one,
+        otherwise runs the synchronous load in a worker thread.
+        """
+        driver = driver or drivers.default()
+        imap = identity.current()
+        if imap is not None:
+            cached = imap.get((cls, driver, ikid))
+            if cached is not None:
+                return cached
+        db_cls = cls._backend_cls(driver)
+        native = getattr(db_cls, 'aload', None)
+        db_item = await native(ikid) if native else await _to_thread(db_cls.load, ikid)
+        return cls._cast(db_item, imap, driver)
 
     @classmethod
-    def from_db(cls, db_item: default_driver.Item) -> Item:
-        """Instantiate core Item off of backend Item."""
-        return cls(**db_item.to_dict())
+    def load_many(cls, ikids: Iterable[int], driver: Any = None) -> List[Item]:
+        """Create several Core Items of this type from backend.
+
+        Items held by an active identity map are reused; the remaining ones
+        are fetched in a single `BACKEND_CLS.load_many(ikids)` call when the
+        driver provides it, one by one otherwise.
+
+        Args:
+            ikids (Iterable[int]): ids of items to load.
+            driver (Any, optional): driver to load from. Defaults to the one of BACKEND_CLS.
+
+        Returns:
+            List[Item]: loaded items, in ikids order.
+        """
+        ikids = list(ikids)
+        driver = driver or drivers.default()
+        imap = identity.current()
+        found = {}
+        if imap is not None:
+            for ikid in ikids:
+                cached = imap.get((cls, driver, ikid))
+                if cached is not None:
+                    found[ikid] = cached
+        missing = [ikid for ikid in dict.fromkeys(ikids) if ikid not in found]
+        if missing:
+            db_items = _fetch_rows(cls._backend_cls(driver), missing)
+            for ikid, db_item in zip(missing, db_items):
+                found[ikid] = cls._cast(db_item, imap, driver)
+        return [found[ikid] for ikid in ikids]
+
+    @classmethod
+    def from_db(cls, db_item: default_driver.Item, driver: Any = None) -> Item:
+        """Instantiate core Item off of backend Item.
+
+        If an identity map is active and already holds this item, the live
+        object is returned instead of a new instance.
+
+        Args:
+            db_item (default_driver.Item): backend item.
+            driver (Any, optional): driver bound to the new core Item. Defaults to the default driver.
+        """
+        driver = driver or drivers.default()
+        imap = identity.current()
+        if imap is not None:
+            cached = imap.get((cls, driver, db_item._ikid))
+            if cached is not None:
+                return cached
+        return cls._cast(db_item, imap, driver)
+
+    @classmethod
+    def _cast(cls, db_item: default_driver.Item, imap: Optional[identity.IdentityMap], driver: Any = None) -> Item:
+        start = perf_counter() if instrumentation.enabled else None
+        # Bind the driver now: the default one may change before the item is saved.
+        item = cls(**db_item.to_dict(), driver=driver or drivers.default())
+        item._dirty.clear()
+        if start is not None:
+            instrumentation.record('cast.from_db', perf_counter() - start, 1,
+                                   len(str(item._name).encode()) + len(str(item._content).encode()))
+        if imap is not None and item._ikid is not None:
+            imap.put((cls, item.backend, item._ikid), item)
+        return item
     
     def to_dict(self):
         """Export core Item content to dict."""
-        return {a: getattr(self, a) for a in self._attr_defs}
-    
+        return dict(zip(self._attr_defs, self._attr_getter(self)))
+
+
+def _fetch_rows(db_cls: type, ikids: List[int]) -> List[Any]:
+    """Backend records of ikids, in one `load_many` call if db_cls has it."""
+    loader = getattr(db_cls, 'load_many', None)
+    if loader is None:
+        return [instrumentation.timed('backend.load', db_cls.load, ikid) for ikid in ikids]
+    return instrumentation.timed('backend.load_many', loader, ikids)
+
+
+def _fetch_existing(db_cls: type, ikids: List[int]) -> Dict[int, Any]:
+    """Backend records of those ikids that exist, by ikid; one call unless some are missing."""
+    try:
+        return {db_item._ikid: db_item for db_item in _fetch_rows(db_cls, ikids)}
+    except KeyError:
+        found = {}
+        for ikid in ikids:
+            try:
+                found[ikid] = instrumentation.timed('backend.load', db_cls.load, ikid)
+            except KeyError:
+                pass
+        return found
+
 
-# TODO: automate class creation below
-class Definition(Item):
-    BACKEND_CLS = default_driver.Definition
-class Theorem(Item):
-    BACKEND_CLS = default_driver.Theorem
-class Proof(Item):
-    BACKEND_CLS = default_driver.Proof
-class Question(Item):
-    BACKEND_CLS = default_driver.Question
+def _make_item_type(name: str) -> type:
+    """Create a slotted Item subclass bound to the homonymous backend class."""
+    namespace = {
+        '__slots__': (),
+        '__module__': __name__,
+        '__doc__': f"{name} item in IndieK core.",
+        'BACKEND_NAME': name,
+    }
+    return type(name, (Item,), namespace)
+
+
+Definition = _make_item_type('Definition')
+Theorem = _make_item_type('Theorem')
+Proof = _make_item_type('Proof')
+Question = _make_item_type('Question')
 CORE_ITEM_TYPES = [Definition, Theorem, Proof, Question]
 
         
+_rendering = threading.local()
+"""Whether this thread is rendering a note, so that nested renders aren't timed again."""
+
+
+class NoteContent(list):
+    """List of note entries that reports every mutation to its owner Note.
+
+    This lets the owner keep parent links and its rendering cache current,
+    whether entries are added through `Note.add_content` or edited in place
+    (e.g. `note.content[-1] = 'new text'`).
+    """
+
+    __slots__ = ('_owner',)
+
+    def __init__(self, owner: Note, entries: Iterable[Any] = ()):
+        super().__init__(entries)
+        self._owner = owner
+
+    def _check(self, added: Iterable[Any]) -> None:
+        self._owner._check_loop(added)
+
+    def _changed(self, removed: Iterable[Any] = (), added: Iterable[Any] = ()) -> None:
+        self._owner._content_changed(removed, added)
+
+    def __setitem__(self, key, value):
+        removed = self[key] if isinstance(key, slice) else [self[key]]
+        value = list(value) if isinstance(key, slice) else value
+        self._check(value if isinstance(key, slice) else [value])
+        super().__setitem__(key, value)
+        self._changed(removed, value if isinstance(key, slice) else [value])
+
+    def __delitem__(self, key):
+        removed = self[key] if isinstance(key, slice) else [self[key]]
+        super().__delitem__(key)
+        self._changed(removed)
+
+    def __iadd__(self, values):
+        values = list(values)
+        self._check(values)
+        super().__iadd__(values)
+        self._changed(added=values)
+        return self
+
+    def __imul__(self, n):
+        before = list(self)
+        super().__imul__(n)
+        if n <= 0:
+            self._changed(removed=before)
+        else:
+            self._changed(added=before * (n - 1))
+        return self
+
+    def append(self, value):
+        self._check([value])
+        super().append(value)
+        self._changed(added=[value])
+
+    def extend(self, values):
+        values = list(values)
+        self._check(values)
+        super().extend(values)
+        self._changed(added=values)
+
+    def insert(self, index, value):
+        self._check([value])
+        super().insert(index, value)
+        self._changed(added=[value])
+
+    def pop(self, index=-1):
+        value = super().pop(index)
+        self._changed(removed=[value])
+        return value
+
+    def remove(self, value):
+        super().remove(value)
+        self._changed(removed=[value])
+
+    def clear(self):
+        removed = list(self)
+        super().clear()
+        self._changed(removed)
+
+    def sort(self, *args, **kwargs):
+        super().sort(*args, **kwargs)
+        self._changed()
+
+    def reverse(self):
+        super().reverse()
+        self._changed()
+
+
 class Note(Nucleus):
     """Generic note.
 
@@ -128,36 +638,519 @@ class Note(Nucleus):
     being either a string literal or a Note itself.
 
     Notes are meant to act as Wikis in IndieK.
+
+    The rendered string of a note is cached together with the character span
+    of each entry. Nested notes keep weak references to the notes containing
+    them, so that any content mutation only invalidates the caches on the
+    path up to the root notes.
+
+    In the backend, each note is a record whose content lists its entries as
+    JSON: `["s", text]` for strings, `["n", ikid]` for nested notes, stored as
+    records of their own, and `["p", type name, ikid]` for PointerNotes,
+    stored inline. Notes shared by several parents are thus stored once.
+    The name of the record holds the rendered text, which backends search;
+    editing a nested note thus marks it dirty in every ancestor too.
+    Loaded notes may be stubs whose content is only fetched when accessed.
+    Nested notes whose record is gone, e.g. deleted while their parents
+    weren't loaded, are dropped from the loaded parents, which are then
+    dirty; a stub reached lazily loads empty.
     """
 
-    def __init__(self, *, _ikid: Optional[int] = None, driver: Any = default_driver):
+    __slots__ = ('_parents', '_rendered', '_spans', '_content', '_loaded', 'mentions', '__weakref__')
+
+    BACKEND_NAME = 'Note'
+
+    def __init__(self, *, _ikid: Optional[int] = None, driver: Any = None):
         super().__init__(_ikid, driver)
-        self.content = []
+        self._parents: Dict[int, List[Any]] = {}
+        self._rendered: Optional[str] = None
+        self._spans: Optional[List[tuple]] = None
+        self._content = NoteContent(self)
+        self._loaded = True
         self.mentions = set()
         # TODO: add a content_type attr?
+
+    @property
+    def content(self) -> NoteContent:
+        if not self._loaded:
+            self._load_content()
+        return self._content
+
+    @property
+    def loaded(self) -> bool:
+        """False for a stub whose content wasn't fetched from the backend yet."""
+        return self._loaded
+
+    @content.setter
+    def content(self, entries: Iterable[Any]) -> None:
+        entries = list(entries)
+        self._check_loop(entries)
+        removed = self._content
+        self._content = NoteContent(self, entries)
+        self._content_changed(removed, self._content)
     
     def add_content(self, content: Self | str) -> None:
-        if not isinstance(content, str):
-            self.update_mentions(content)
+        """Append an entry.
+
+        Raises:
+            NestedNoteLoop: if content is a note containing self, or self.
+        """
         self.content.append(content)
 
-    def __hash__(self):
-        return hash(tuple(map(hash, self.content)))
+    @property
+    def parents(self) -> List[Note]:
+        """Live notes holding this note among their entries."""
+        refs = (ref() for ref, _ in self._parents.values())
+        return [parent for parent in refs if parent is not None]
+
+    def ancestors(self) -> Iterator[Note]:
+        """Iterate once over every note containing this one, directly or not."""
+        seen = {id(self)}
+        stack = [self]
+        while stack:
+            for parent in stack.pop().parents:
+                if id(parent) not in seen:
+                    seen.add(id(parent))
+                    stack.append(parent)
+                    yield parent
+
+    def descendants(self) -> Iterator[Note]:
+        """Iterate once over every note nested in this one, directly or not."""
+        seen = {id(self)}
+        stack = [self]
+        while stack:
+            for entry in stack.pop().content:
+                if isinstance(entry, Note) and id(entry) not in seen:
+                    seen.add(id(entry))
+                    stack.append(entry)
+                    yield entry
+
+    def resolve(self) -> int:
+        """Load the references of all unresolved pointers in this note tree.
+
+        References are fetched from the driver of each pointer, with one
+        `load_many` call per reference type and driver (see `Item.load_many`).
+        Pointers whose reference no longer exists in that driver are marked
+        dead.
+
+        Returns:
+            int: number of pointers resolved.
+        """
+        pending: Dict[tuple, Dict[int, List[PointerNote]]] = {}
+        for note in (self, *self.descendants()):
+            if isinstance(note, PointerNote) and not note.dead and not note.resolved:
+                key = (note.reference_type, note.backend)
+                pending.setdefault(key, {}).setdefault(note.reference_ikid, []).append(note)
+
+        resolved = 0
+        for (reference_type, driver), by_ikid in pending.items():
+            ikids = list(by_ikid)
+            try:
+                references = reference_type.load_many(ikids, driver=driver)
+            except KeyError:
+                references = []
+                for ikid in ikids:
+                    try:
+                        references.append(reference_type.load(ikid, driver=driver))
+                    except KeyError:
+                        references.append(None)
+            for ikid, reference in zip(ikids, references):
+                for pointer in by_ikid[ikid]:
+                    if reference is None:
+                        pointer._mark_dead()
+                    else:
+                        pointer._set_reference(reference)
+                        resolved += 1
+        return resolved
+
+    def _check_loop(self, entries: Iterable[Any]) -> None:
+        """Raise NestedNoteLoop if nesting any of entries in self would create a loop.
+
+        Since notes only ever form a DAG, a loop appears iff an entry is self or
+        one of its ancestors. Only the ancestors are walked, not the (usually much
+        larger) nested content of entries.
+        """
+        candidates = {id(e) for e in entries if isinstance(e, Note)}
+        if not candidates:
+            return
+        if id(self) in candidates or any(id(a) in candidates for a in self.ancestors()):
+            raise NestedNoteLoop(f"Nesting would create a loop through {self!r}.")
+
+    def detach(self) -> None:
+        """Remove every occurrence of this note from the notes containing it."""
+        for parent in self.parents:
+            parent.content[:] = [entry for entry in parent.content if entry is not self]
+
+    def delete(self) -> None:
+        """Delete note and drop it from the content of its parent notes.
+
+        Saved parents are saved again, so that their records no longer refer
+        to this note. Nested notes are left untouched.
+        """
+        parents = [parent for parent in self.parents if parent.exists_in_db]
+        self.detach()
+        if self.exists_in_db:
+            super().delete()
+            for parent in parents:
+                parent.save()
+
+    def _link_parent(self, parent: Note) -> None:
+        entry = self._parents.get(id(parent))
+        if entry is None or entry[0]() is not parent:
+            self._parents[id(parent)] = [weakref.ref(parent), 1]
+        else:
+            entry[1] += 1
+
+    def _unlink_parent(self, parent: Note) -> None:
+        entry = self._parents.get(id(parent))
+        if entry is None:
+            return
+        entry[1] -= 1
+        if entry[1] <= 0:
+            del self._parents[id(parent)]
+
+    def _content_changed(self, removed: Iterable[Any] = (), added: Iterable[Any] = (),
+                         stored: bool = False) -> None:
+        """Update links, mentions and caches after entries changed; stored means they come from the backend."""
+        lost_mentions = False
+        for entry in removed:
+            if isinstance(entry, Note):
+                entry._unlink_parent(self)
+                lost_mentions = lost_mentions or bool(entry.mentions)
+        for entry in added:
+            if isinstance(entry, Note):
+                entry._link_parent(self)
+                self.update_mentions(entry)
+        if lost_mentions:
+            self._refresh_mentions()
+        if not stored:
+            self._dirty.add('content')
+            self._mark_text_dirty()
+        self._invalidate()
+
+    def _mark_text_dirty(self) -> None:
+        """Mark the stored rendered text dirty here and in all ancestors.
+
+        Saving a note saves its dirty nested notes first, so a note whose text
+        is already dirty has dirty ancestors too: propagation stops there.
+        """
+        stack = [self]
+        while stack:
+            note = stack.pop()
+            if 'name' in note._dirty and note is not self:
+                continue
+            note._dirty.add('name')
+            stack.extend(note.parents)
+
+    def _invalidate(self) -> None:
+        """Drop cached rendering and digest here and in all ancestors.
+
+        A note whose caches are already empty has empty-cached ancestors too,
+        so propagation stops there.
+        """
+        stack = [self]
+        while stack:
+            note = stack.pop()
+            if note._rendered is None and note._digest is None and note is not self:
+                continue
+            note._rendered = None
+            note._spans = None
+            note._digest = None
+            stack.extend(note.parents)
+
+    def _compute_digest(self) -> int:
+        # Nested notes contribute their digest rather than their hash, which
+        # changes with their ikid, so this only depends on the content tree.
+        return hash(tuple(e.digest if isinstance(e, Note) else hash(e) for e in self.content))
+
+    def __eq__(self, other) -> bool:
+        """Same type, ikid and entries, nested notes being compared recursively."""
+        if self is other:
+            return True
+        return (type(other) == type(self)
+                and self._ikid == other._ikid
+                and self.digest == other.digest
+                and list(self.content) == list(other.content))
+
+    # Defining __eq__ would otherwise unset the inherited __hash__.
+    __hash__ = Nucleus.__hash__
 
     def __str__(self) -> str:
         """Resolves content into str.
 
+        The result is cached until the content of this note, or of any
+        nested note, changes.
+
         Returns:
             str: string representation.
 
         Raises:
             RecursionError: if loops are present (a contains b contains a)
         """
-        # TODO: store the start-end chars positions of each content entry
-        return ' '.join(map(str, self.content))
+        if self._rendered is None:
+            self._render()
+        return self._rendered
+
+    def _render(self) -> None:
+        # Only the outermost render of a tree is timed, as it includes the nested ones.
+        outermost = instrumentation.enabled and not getattr(_rendering, 'active', False)
+        if outermost:
+            _rendering.active = True
+            began = perf_counter()
+        try:
+            parts = [str(entry) for entry in self.content]
+        finally:
+            if outermost:
+                _rendering.active = False
+        spans = []
+        start = 0
+        for part in parts:
+            spans.append((start, start + len(part)))
+            start += len(part) + 1
+        self._rendered = ' '.join(parts)
+        self._spans = spans
+        if outermost:
+            instrumentation.record('render.note', perf_counter() - began, len(parts), len(self._rendered.encode()))
+
+    @property
+    def spans(self) -> List[tuple]:
+        """(start, end) character positions of each entry within `str(self)`."""
+        if self._spans is None:
+            self._render()
+        return self._spans
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Export note to a backend record: rendered text as name, entries serialized as JSON as content."""
+        return {'_ikid': self._ikid, 'name': str(self), 'content': self._serialize()}
+
+    def _serialize(self) -> str:
+        return json.dumps([_encode_entry(entry) for entry in self.content], ensure_ascii=False)
+
+    def _to_db(self) -> default_driver.Note:
+        return self._db_cls()(**self.to_dict())
+
+    def save(self) -> int:
+        """Save note, after every nested note that is new or changed.
+
+        Parts of the tree that were never loaded are unchanged, hence skipped.
+
+        Raises:
+            DeadPointerNoteSave: if this is a dead PointerNote.
+        """
+        for note in self._unsaved_descendants():
+            Nucleus.save(note)
+        return super().save()
+
+    async def asave(self) -> int:
+        """Asynchronous counterpart of `save`, run in a worker thread."""
+        return await _to_thread(self.save)
+
+    def _unsaved_descendants(self) -> List[Note]:
+        """Loaded nested notes that need saving, each after the notes nested in it."""
+        order = []
+        visited = {id(self)}
+        stack = [(entry, False) for entry in reversed(self._content)] if self._loaded else []
+        while stack:
+            note, expanded = stack.pop()
+            if expanded:
+                if not note.is_clean:
+                    order.append(note)
+                continue
+            if not isinstance(note, Note) or isinstance(note, PointerNote) or id(note) in visited:
+                continue
+            visited.add(id(note))
+            stack.append((note, True))
+            if note._loaded:
+                stack.extend((entry, False) for entry in reversed(note._content))
+        return order
+
+    @classmethod
+    def load(cls, ikid: int, depth: Optional[int] = None, driver: Any = None) -> Note:
+        """Load note from backend along with its nested notes, down to depth levels.
+
+        Deeper notes are stubs, fetched one level at a time when their content
+        is first accessed. If an identity map is active, notes it holds are
+        reused, and shared nested notes stay shared across loads.
+
+        Args:
+            ikid (int): id of note to load.
+            depth (int, optional): nesting levels loaded along; 0 loads this note only.
+                Defaults to the whole tree.
+            driver (Any, optional): driver to load from. Defaults to the one of BACKEND_CLS.
+
+        Raises:
+            KeyError: if a note is missing from the backend.
+        """
+        return cls.load_many([ikid], depth, driver)[0]
+
+    @classmethod
+    def load_many(cls, ikids: Iterable[int], depth: Optional[int] = None, driver: Any = None) -> List[Note]:
+        """Load several notes, see `load`. Each tree level costs a single backend call.
+
+        Returns:
+            List[Note]: loaded notes, in ikids order.
+        """
+        ikids = list(ikids)
+        driver = driver or drivers.default()
+        imap = identity.current()
+        nodes: Dict[int, Note] = {}
+        missing = []
+        for ikid in dict.fromkeys(ikids):
+            cached = _cached_note(imap, driver, ikid)
+            if cached is not None:
+                nodes[ikid] = cached
+            if cached is None or not cached._loaded:
+                missing.append(ikid)
+        db_cls = cls._backend_cls(driver)
+        for db_item in _fetch_rows(db_cls, missing):
+            nodes[db_item._ikid] = cls._from_row(db_item, nodes, imap, driver)
+        notes = [nodes[ikid] for ikid in ikids]
+        cls._expand(notes, depth, db_cls, nodes, imap, driver)
+        return notes
+
+    @classmethod
+    def from_db(cls, db_item: default_driver.Note, driver: Any = None) -> Note:
+        """Instantiate note off of a backend record; nested notes are stubs."""
+        driver = driver or drivers.default()
+        imap = identity.current()
+        cached = _cached_note(imap, driver, db_item._ikid)
+        if cached is not None and cached._loaded:
+            return cached
+        nodes = {} if cached is None else {db_item._ikid: cached}
+        return cls._from_row(db_item, nodes, imap, driver)
+
+    @classmethod
+    def str_filter(cls, regex: re.Pattern, driver: Any = None) -> List[Note]:
+        """Stored notes of this type whose rendered text matches regex, in backend order.
+
+        The backend is searched, on the rendered text stored along each note,
+        and only matches are cast. A note thus matches the text of the notes
+        nested in it; nested notes are stubs.
+
+        Args:
+            regex (re.Pattern): compiled regex object.
+            driver (Any, optional): driver to search. Defaults to the default driver.
+        """
+        driver = driver or drivers.default()
+        return [cls.from_db(db_item, driver) for db_item in cls._matching_rows(regex, driver)]
+
+    @classmethod
+    def _matching_rows(cls, regex: re.Pattern, driver: Any = None) -> Iterator[Any]:
+        """Stream backend records of notes of this type whose stored text matches regex."""
+        db_cls = cls._backend_cls(driver)
+        rows = instrumentation.timed('backend.str_filter', getattr(db_cls, 'iter_filter', db_cls.str_filter), regex)
+        # The backend matches the structure in content too, hence the check on name.
+        return (db_item for db_item in rows if cls._owns(db_item) and regex.search(db_item.name))
+
+    @classmethod
+    def _owns(cls, db_item: Any) -> bool:
+        """Whether backend record db_item holds a note of this very type, without casting it."""
+        return (db_item.content or '').startswith('{') == issubclass(cls, PointerNote)
+
+    @classmethod
+    def _from_row(cls, db_item: default_driver.Note, nodes: Dict[int, Note],
+                  imap: Optional[identity.IdentityMap], driver: Any) -> Note:
+        data = json.loads(db_item.content or '[]')
+        if isinstance(data, dict):
+            type_name, reference_ikid = data['pointer']
+            note = PointerNote(reference_type=_pointer_types()[type_name], reference_ikid=reference_ikid)
+            note._ikid = db_item._ikid
+            note.backend = driver
+        else:
+            note = Note._stub(db_item._ikid, nodes, imap, driver)
+            note._fill(data, nodes, imap, driver)
+        note._dirty.clear()
+        if imap is not None:
+            imap.put((type(note), driver, note._ikid), note)
+        return note
+
+    @staticmethod
+    def _stub(ikid: int, nodes: Dict[int, Note], imap: Optional[identity.IdentityMap], driver: Any) -> Note:
+        """Note standing for ikid in this load, created unloaded if not known yet."""
+        note = nodes.get(ikid) or _cached_note(imap, driver, ikid)
+        if note is None:
+            note = Note(_ikid=ikid, driver=driver)
+            note._loaded = False
+            if imap is not None:
+                imap.put((Note, driver, ikid), note)
+        nodes[ikid] = note
+        return note
+
+    def _fill(self, data: List[list], nodes: Dict[int, Note],
+              imap: Optional[identity.IdentityMap], driver: Any) -> None:
+        """Set content from decoded backend entries, nested notes becoming stubs."""
+        types = _pointer_types()
+        entries = []
+        for entry in data:
+            kind = entry[0]
+            if kind == 'n':
+                entries.append(Note._stub(entry[1], nodes, imap, driver))
+            elif kind == 'p':
+                pointer = PointerNote(reference_type=types[entry[1]], reference_ikid=entry[2])
+                pointer.backend = driver
+                entries.append(pointer)
+            else:
+                entries.append(entry[1])
+        removed = self._content
+        self._content = NoteContent(self, entries)
+        self._loaded = True
+        self._content_changed(removed, entries, stored=True)
 
-    def update_mentions(self, content):
-        self.mentions.update(content.mentions)
+    @staticmethod
+    def _expand(notes: List[Note], depth: Optional[int], db_cls: type, nodes: Dict[int, Note],
+                imap: Optional[identity.IdentityMap], driver: Any) -> None:
+        """Fetch stubs nested in notes level by level, down to depth levels."""
+        visited = {id(note) for note in notes}
+        level = notes
+        while level and (depth is None or depth > 0):
+            children = []
+            for note in level:
+                if not note._loaded:
+                    continue
+                for entry in note._content:
+                    if isinstance(entry, Note) and not isinstance(entry, PointerNote) and id(entry) not in visited:
+                        visited.add(id(entry))
+                        children.append(entry)
+            stubs = [child for child in children if not child._loaded]
+            if stubs:
+                rows = _fetch_existing(db_cls, [stub._ikid for stub in stubs])
+                for stub in stubs:
+                    db_item = rows.get(stub._ikid)
+                    if db_item is not None:
+                        stub._fill(json.loads(db_item.content or '[]'), nodes, imap, driver)
+                        continue
+                    # Deleted while a stored parent still referred to it.
+                    stub.detach()
+                    children.remove(stub)
+                    if imap is not None:
+                        imap.discard((Note, driver, stub._ikid))
+            level = children
+            depth = None if depth is None else depth - 1
+
+    def _load_content(self) -> None:
+        db_item = _fetch_existing(self._db_cls(), [self._ikid]).get(self._ikid)
+        data = [] if db_item is None else json.loads(db_item.content or '[]')
+        self._fill(data, {self._ikid: self}, identity.current(), self.backend)
+
+    def update_mentions(self, content: Note) -> None:
+        """Merge mentions of content into this note and all its ancestors."""
+        if not content.mentions:
+            return
+        for note in (self, *self.ancestors()):
+            note.mentions.update(content.mentions)
+
+    def _collect_mentions(self) -> set:
+        return set().union(*(e.mentions for e in self.content if isinstance(e, Note)))
+
+    def _refresh_mentions(self) -> None:
+        """Rebuild mentions from entries, moving upward only where they changed."""
+        stack = [self]
+        while stack:
+            note = stack.pop()
+            mentions = note._collect_mentions()
+            if note is self or mentions != note.mentions:
+                note.mentions = mentions
+                stack.extend(note.parents)
 
 
 class PointerNote(Note):
@@ -165,16 +1158,118 @@ class PointerNote(Note):
 
     This kind of notes doesn't allow for content addition.
 
+    Pointers register with the `MENTIONS` reverse index. When the referenced
+    item or note is deleted, the pointer becomes dead: it no longer mentions
+    anything and can't be saved.
+
+    A pointer may be built from the type and ikid of its reference only. The
+    reference is then loaded on first access to `reference`, and only counts
+    in `mentions` from then on; `Note.resolve` loads the references of a
+    whole note tree in batches.
+
     Args:
-        Note (_type_): _description_
+        reference (Note | Item, optional): saved item or note to point to.
+        reference_type (type, optional): core type of the reference, if reference isn't given.
+        reference_ikid (int, optional): ikid of the reference, if reference isn't given.
     """
 
-    def __init__(self, reference: Note | Item):
-        assert reference.exists_in_db, "Cannot reference unsaved item or note."
+    __slots__ = ('_reference', 'reference_type', 'reference_ikid', 'dead')
+
+    def __init__(self,
+                 reference: Optional[Note | Item] = None,
+                 *,
+                 reference_type: Optional[type] = None,
+                 reference_ikid: Optional[int] = None):
+        if reference is not None:
+            assert reference.exists_in_db, "Cannot reference unsaved item or note."
+            reference_type, reference_ikid = type(reference), reference.ikid
+        elif reference_type is None or reference_ikid is None:
+            raise TypeError("Either reference, or reference_type and reference_ikid, are required.")
         super().__init__()
-        self.content = [IKID + str(reference.ikid)]
+        self._reference = reference
+        self.reference_type = reference_type
+        self.reference_ikid = reference_ikid
+        self.dead = False
+        self.content = [IKID + str(reference_ikid)]
+        self.mentions = set() if reference is None else {reference}
+        MENTIONS.register(self, reference_ikid)
+
+    @classmethod
+    def _restore(cls, reference: Optional[Note | Item], reference_type: type, reference_ikid: int,
+                 dead: bool = False, _ikid: Optional[int] = None) -> PointerNote:
+        """Rebuild a pointer, e.g. when reading it back from storage.
+
+        Unlike `__init__`, the pointer may be dead and reference needn't be saved.
+        """
+        pointer = cls(reference_type=reference_type, reference_ikid=reference_ikid)
+        pointer._ikid = _ikid
+        if reference is not None:
+            pointer._set_reference(reference)
+        if dead:
+            pointer._mark_dead()
+        return pointer
+
+    @property
+    def reference(self) -> Optional[Note | Item]:
+        """Referenced item or note, loaded from the driver of this pointer on first access; None once dead."""
+        if self._reference is None and not self.dead:
+            self._set_reference(self.reference_type.load(self.reference_ikid, driver=self.backend))
+        return self._reference
+
+    @property
+    def resolved(self) -> bool:
+        """Whether the reference is loaded."""
+        return self._reference is not None
+
+    def _set_reference(self, reference: Note | Item) -> None:
+        self._reference = reference
+        if self.dead:
+            return
         self.mentions = {reference}
+        for parent in self.parents:
+            parent.update_mentions(self)
 
-    def add_content(self) -> None:
-        raise NotImplementedError(f"{self.__class__} doesn't allow content addition.")
-    
+    def add_content(self, content: Any = None) -> None:
+        raise AddContentToPointerNote(f"{self.__class__} doesn't allow content addition.")
+
+    @property
+    def exists_in_db(self):
+        """Same as for Nucleus, but always False once the reference was deleted."""
+        return self._ikid is not None and not self.dead
+
+    def save(self) -> int:
+        if self.dead:
+            raise DeadPointerNoteSave(f"Referenced item {self.reference_ikid} was deleted.")
+        return super().save()
+
+    def _serialize(self) -> str:
+        return json.dumps({'pointer': [self.reference_type.__name__, self.reference_ikid]})
+
+    def _collect_mentions(self) -> set:
+        return set() if self.dead or self._reference is None else {self._reference}
+
+    def _mark_dead(self) -> None:
+        self.dead = True
+        MENTIONS.unregister(self, self.reference_ikid)
+        self._refresh_mentions()
+
+
+def _encode_entry(entry: Any) -> list:
+    if isinstance(entry, PointerNote):
+        return ['p', entry.reference_type.__name__, entry.reference_ikid]
+    if isinstance(entry, Note):
+        if entry._ikid is None:
+            raise ValueError(f"Nested note {entry!r} must be saved before the notes containing it.")
+        return ['n', entry._ikid]
+    return ['s', str(entry)]
+
+
+def _pointer_types() -> Dict[str, type]:
+    """Types a persisted PointerNote may refer to, by name."""
+    return {t.__name__: t for t in (*CORE_ITEM_TYPES, Note, PointerNote)}
+
+
+def _cached_note(imap: Optional[identity.IdentityMap], driver: Any, ikid: int) -> Optional[Note]:
+    if imap is None:
+        return None
+    return imap.get((Note, driver, ikid)) or imap.get((PointerNote, driver, ikid))
@@ -0,0 +1,79 @@
+"""Reverse index of note mentions.
+
+Maps the ikid of a referenced item or note to the PointerNotes referring to
+it. Notes mentioning an ikid indirectly, by nesting such a PointerNote, are
+found by walking up parent links from the pointers, so that backlink queries
+never scan the whole note set.
+"""
+from __future__ import annotations
+import threading
+import weakref
+from typing import Any, Dict, List
+
+
+class MentionIndex:
+    """Reverse index from referenced ikid to the live PointerNotes targeting it.
+
+    Pointers are held weakly: a PointerNote dropped by the application leaves
+    the index on its own.
+    """
+
+    def __init__(self):
+        self._pointers: Dict[int, Dict[int, weakref.ref]] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._pointers)
+
+    def register(self, pointer: Any, ikid: int) -> None:
+        """Record that pointer refers to ikid."""
+        key = id(pointer)
+
+        def _drop(_ref, ikid=ikid, key=key):
+            self._discard(ikid, key)
+
+        with self._lock:
+            self._pointers.setdefault(ikid, {})[key] = weakref.ref(pointer, _drop)
+
+    def unregister(self, pointer: Any, ikid: int) -> None:
+        self._discard(ikid, id(pointer))
+
+    def _discard(self, ikid: int, key: int) -> None:
+        with self._lock:
+            refs = self._pointers.get(ikid)
+            if refs is None:
+                return
+            refs.pop(key, None)
+            if not refs:
+                del self._pointers[ikid]
+
+    def pointers(self, ikid: int) -> List[Any]:
+        """Live PointerNotes referring to ikid."""
+        with self._lock:
+            refs = list(self._pointers.get(ikid, {}).values())
+        return [pointer for pointer in (ref() for ref in refs) if pointer is not None]
+
+    def backlinks(self, ikid: int) -> List[Any]:
+        """Notes mentioning ikid, either as a PointerNote or by nesting one.
+
+        Returns:
+            List[Note]: each mentioning note once, pointers first.
+        """
+        found = {}
+        for pointer in self.pointers(ikid):
+            found.setdefault(id(pointer), pointer)
+        for pointer in list(found.values()):
+            for ancestor in pointer.ancestors():
+                found.setdefault(id(ancestor), ancestor)
+        return list(found.values())
+
+    def is_mentioned(self, ikid: int) -> bool:
+        return bool(self.pointers(ikid))
+
+    def track(self, event: str, obj: Any, ikid: int) -> None:
+        """Listener marking pointers to deleted items or notes as dead."""
+        if event != 'delete':
+            return
+        for pointer in self.pointers(ikid):
+            if pointer.reference_type is type(obj):
+                pointer._mark_dead()
@@ -0,0 +1,134 @@
+"""Multi-process regex search over large corpora.
+
+The ikid space of the searched items is cut into ranges, and each range is
+matched by a worker process reading it straight from the backend. Workers only
+send back the (type name, ikid) pairs of matching items; the parent then
+fetches and casts those, so neither the corpus nor its text travels between
+processes.
+
+This requires the driver to let other processes open its data, through three
+module functions:
+
+- `scan_source()`: picklable description of the data to open in a worker,
+  or None if it can't be shared (e.g. an in-memory database);
+- `ikid_range(type_names)`: (lowest, highest + 1) ikids of items of these
+  types, or None if there are none;
+- `match_range(source, type_names, start, stop, pattern, flags)`: (type name,
+  ikid) pairs of the items of these types with start <= ikid < stop whose
+  name or content matches, in ikid order. Runs in workers.
+
+Items of other drivers, such as mockdb whose data lives in the parent process
+only, are matched serially in the calling process, like `filter_str` does. So
+are notes, whose records hold their structure rather than their text, see
+`Note.str_filter`.
+"""
+from __future__ import annotations
+import importlib
+import os
+import re
+import sys
+from concurrent.futures import Future
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Sequence, Tuple
+from indiek.core import instrumentation
+from indiek.core.items import Item, Note, _fetch_rows
+
+if TYPE_CHECKING:
+    from concurrent.futures import ProcessPoolExecutor
+
+
+DEFAULT_SHARD_SIZE = 50_000
+"""Width of the ikid range matched by one worker task."""
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_size: Optional[int] = None
+
+
+def _get_pool(processes: int) -> ProcessPoolExecutor:
+    """Shared pool, re-created if a different number of processes is requested."""
+    global _pool, _pool_size
+    if _pool is None or _pool_size != processes:
+        # Imported here as multiprocessing weighs on the import of search.
+        from concurrent.futures import ProcessPoolExecutor
+        shutdown()
+        _pool = ProcessPoolExecutor(max_workers=processes)
+        _pool_size = processes
+    return _pool
+
+
+def shutdown() -> None:
+    """Stop the worker processes, if any."""
+    global _pool, _pool_size
+    if _pool is not None:
+        _pool.shutdown()
+        _pool = _pool_size = None
+
+
+def match_range(driver_name: str, source: Any, type_names: Sequence[str],
+                start: int, stop: int, pattern: str, flags: int) -> List[Tuple[str, int]]:
+    """Run `match_range` of the driver module named driver_name. Runs in workers."""
+    driver = importlib.import_module(driver_name)
+    return driver.match_range(source, type_names, start, stop, pattern, flags)
+
+
+def _ranges(bounds: Tuple[int, int], shard_size: int) -> List[Tuple[int, int]]:
+    start, stop = bounds
+    return [(low, min(low + shard_size, stop)) for low in range(start, stop, shard_size)]
+
+
+def parallel_search_and_cast(query: re.Pattern,
+                             item_types: Sequence[Item],
+                             processes: Optional[int] = None,
+                             shard_size: int = DEFAULT_SHARD_SIZE) -> Dict[Item, List[Item]]:
+    """Match query against backend items of item_types in a process pool.
+
+    Args:
+        query (re.Pattern): compiled regex, applied on name and content like `str_filter` does.
+        item_types (Sequence[Item]): core item classes to search.
+        processes (int, optional): number of worker processes. Defaults to the CPU count;
+            with 1, ranges are matched in the calling process.
+        shard_size (int, optional): width of the ikid range of each worker task.
+
+    Returns:
+        Dict[Item, List[Item]]: core items keyed by type, in backend order.
+    """
+    processes = processes or os.cpu_count() or 1
+    results: Dict[Item, List[Item]] = {item_type: [] for item_type in item_types}
+    groups: Dict[Any, List[Item]] = {}
+    for item_type in item_types:
+        if issubclass(item_type, Note):
+            results[item_type] = item_type.str_filter(query)
+            continue
+        groups.setdefault(sys.modules[item_type.BACKEND_CLS.__module__], []).append(item_type)
+
+    tasks: List[Tuple[Any, Dict[str, Item], Future]] = []
+    for driver, types in groups.items():
+        source = driver.scan_source() if hasattr(driver, 'scan_source') else None
+        if source is None:
+            for item_type in types:
+                rows = instrumentation.timed('backend.str_filter', item_type.BACKEND_CLS.str_filter, query)
+                results[item_type] = [item_type.from_db(dbi, driver) for dbi in rows]
+            continue
+        by_name = {item_type.BACKEND_CLS.__name__: item_type for item_type in types}
+        bounds = driver.ikid_range(list(by_name))
+        if bounds is None:
+            continue
+        for start, stop in _ranges(bounds, shard_size):
+            args = (driver.__name__, source, list(by_name), start, stop, query.pattern, query.flags)
+            if processes == 1:
+                future = Future()
+                future.set_result(match_range(*args))
+            else:
+                future = _get_pool(processes).submit(match_range, *args)
+            tasks.append((driver, by_name, future))
+
+    matches: Dict[Item, List[int]] = {}
+    drivers_of: Dict[Item, Any] = {}
+    for driver, by_name, future in tasks:
+        for type_name, ikid in future.result():
+            matches.setdefault(by_name[type_name], []).append(ikid)
+            drivers_of[by_name[type_name]] = driver
+    for item_type, ikids in matches.items():
+        # Ranges are disjoint and increasing, so ikids are in backend order already.
+        rows = _fetch_rows(item_type.BACKEND_CLS, ikids)
+        results[item_type] = [item_type.from_db(dbi, drivers_of[item_type]) for dbi in rows]
+    return results
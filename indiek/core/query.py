@@ -0,0 +1,388 @@
+"""Small query language and planner for item search.
+
+Syntax, from loosest to tightest binding:
+
+- `a OR b`: either side matches.
+- `a AND b`, or simply `a b`: both sides match.
+- `NOT a`, or `-a`: a doesn't match.
+- `(...)`: grouping.
+- `"some words"`: phrase, the words appear in this order.
+- `name:a`, `content:"some words"`: restrict a term or phrase to one field.
+
+A term matches words starting with it, case-insensitively, so `theo` matches
+'Theorem'. Operators are only recognized in upper case.
+
+Evaluation first narrows down candidates as cheaply as possible, then applies
+the term regexes to the survivors only, cheapest and most selective terms
+first, stopping as soon as the outcome of an AND or OR is known.
+"""
+from __future__ import annotations
+import re
+from abc import ABC, abstractmethod
+from operator import attrgetter
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+from indiek.core.items import Item, Definition, Theorem, Proof, Note, Question
+from indiek.core.items import CORE_ITEM_TYPES as ITEM_TYPES
+from indiek.core.index import tokenize
+
+if TYPE_CHECKING:
+    from indiek.core.index import InvertedIndex
+
+
+FIELDS = ('name', 'content')
+_ANY = re.compile('')
+
+
+class QuerySyntaxError(ValueError):
+    """Query string couldn't be parsed."""
+    pass
+
+
+class Node(ABC):
+    """Base class of query expression nodes."""
+
+    @abstractmethod
+    def matches(self, fields: Dict[str, str]) -> bool:
+        """Whether the document made of fields satisfies this node."""
+
+    @abstractmethod
+    def selectivity(self, estimate) -> float:
+        """Estimated fraction of documents matching, given a Term estimator."""
+
+
+class Term(Node):
+    """Word or phrase, optionally restricted to a field."""
+
+    def __init__(self, text: str, field: Optional[str] = None, phrase: bool = False):
+        self.text = text
+        self.field = field
+        self.words = tokenize(text)
+        self.phrase = phrase or len(self.words) > 1
+        body = r'\W+'.join(map(re.escape, self.words))
+        if self.phrase:
+            body += r'\b'
+        self.regex = re.compile(r'\b' + body, flags=re.IGNORECASE)
+
+    def __repr__(self):
+        prefix = f'{self.field}:' if self.field else ''
+        text = f'"{self.text}"' if self.phrase else self.text
+        return f"Term({prefix}{text})"
+
+    def matches(self, fields: Dict[str, str]) -> bool:
+        if self.field is not None:
+            return self.regex.search(fields[self.field]) is not None
+        return any(self.regex.search(value) is not None for value in fields.values())
+
+    def selectivity(self, estimate) -> float:
+        return estimate(self)
+
+
+class And(Node):
+    def __init__(self, children: List[Node]):
+        self.children = children
+
+    def __repr__(self):
+        return f"And({', '.join(map(repr, self.children))})"
+
+    def matches(self, fields: Dict[str, str]) -> bool:
+        return all(child.matches(fields) for child in self.children)
+
+    def selectivity(self, estimate) -> float:
+        result = 1.0
+        for child in self.children:
+            result *= child.selectivity(estimate)
+        return result
+
+
+class Or(Node):
+    def __init__(self, children: List[Node]):
+        self.children = children
+
+    def __repr__(self):
+        return f"Or({', '.join(map(repr, self.children))})"
+
+    def matches(self, fields: Dict[str, str]) -> bool:
+        return any(child.matches(fields) for child in self.children)
+
+    def selectivity(self, estimate) -> float:
+        miss = 1.0
+        for child in self.children:
+            miss *= 1 - child.selectivity(estimate)
+        return 1 - miss
+
+
+class Not(Node):
+    def __init__(self, child: Node):
+        self.child = child
+
+    def __repr__(self):
+        return f"Not({self.child!r})"
+
+    def matches(self, fields: Dict[str, str]) -> bool:
+        return not self.child.matches(fields)
+
+    def selectivity(self, estimate) -> float:
+        return 1 - self.child.selectivity(estimate)
+
+
+_TOKEN_RE = re.compile(r'\s*(?:(\()|(\))|(-(?=[\w"]))?(?:(\w+):)?(?:"([^"]*)"|([^\s()"]+)))')
+
+
+def _lex(query_str: str) -> List[Tuple[str, Optional[str], str]]:
+    """Split query string into (kind, field, text) tokens."""
+    tokens = []
+    position = 0
+    query_str = query_str.strip()
+    while position < len(query_str):
+        match = _TOKEN_RE.match(query_str, position)
+        if match is None or match.end() == position:
+            raise QuerySyntaxError(f"Unexpected character at {position} in {query_str!r}.")
+        position = match.end()
+        opening, closing, negate, field, phrase, word = match.groups()
+        if opening:
+            tokens.append(('(', None, opening))
+        elif closing:
+            tokens.append((')', None, closing))
+        else:
+            if negate:
+                tokens.append(('NOT', None, negate))
+            if field is not None and field not in FIELDS:
+                if phrase is not None:
+                    raise QuerySyntaxError(f"Unknown field {field!r}; expected one of {FIELDS}.")
+                word, field = f'{field}:{word}', None
+            if phrase is not None:
+                tokens.append(('phrase', field, phrase))
+            elif field is None and word in ('AND', 'OR', 'NOT'):
+                tokens.append((word, None, word))
+            else:
+                tokens.append(('word', field, word))
+    return tokens
+
+
+class _Parser:
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.position = 0
+
+    def peek(self) -> Optional[str]:
+        return self.tokens[self.position][0] if self.position < len(self.tokens) else None
+
+    def take(self):
+        token = self.tokens[self.position]
+        self.position += 1
+        return token
+
+    def parse(self) -> Node:
+        node = self.parse_or()
+        if self.peek() is not None:
+            raise QuerySyntaxError(f"Unexpected {self.tokens[self.position][2]!r}.")
+        return node
+
+    def parse_or(self) -> Node:
+        children = [self.parse_and()]
+        while self.peek() == 'OR':
+            self.take()
+            children.append(self.parse_and())
+        return children[0] if len(children) == 1 else Or(children)
+
+    def parse_and(self) -> Node:
+        children = [self.parse_not()]
+        while self.peek() not in (None, 'OR', ')'):
+            if self.peek() == 'AND':
+                self.take()
+            children.append(self.parse_not())
+        return children[0] if len(children) == 1 else And(children)
+
+    def parse_not(self) -> Node:
+        if self.peek() == 'NOT':
+            self.take()
+            return Not(self.parse_not())
+        return self.parse_atom()
+
+    def parse_atom(self) -> Node:
+        kind = self.peek()
+        if kind is None:
+            raise QuerySyntaxError("Query ends unexpectedly.")
+        kind, field, text = self.take()
+        if kind == '(':
+            node = self.parse_or()
+            if self.peek() != ')':
+                raise QuerySyntaxError("Missing closing parenthesis.")
+            self.take()
+            return node
+        if kind in ('word', 'phrase'):
+            return self._term(text, field, kind == 'phrase')
+        raise QuerySyntaxError(f"Unexpected {text!r}.")
+
+    @staticmethod
+    def _term(text: str, field: Optional[str], phrase: bool) -> Term:
+        if not tokenize(text):
+            raise QuerySyntaxError(f"Term {text!r} contains no word characters.")
+        return Term(text, field, phrase)
+
+
+def parse_query(query_str: str) -> Node:
+    """Parse query string into an expression tree.
+
+    Raises:
+        QuerySyntaxError: if query_str is malformed or empty.
+    """
+    return _Parser(_lex(query_str)).parse()
+
+
+def heuristic_estimate(term: Term) -> float:
+    """Index-free selectivity guess: longer terms, phrases and scoped terms are rarer."""
+    length = sum(len(word) for word in term.words)
+    estimate = 0.5 ** min(length, 10)
+    if term.field is not None:
+        estimate /= 2
+    return estimate
+
+
+class QueryPlan:
+    """Evaluation plan of a parsed query for one item type.
+
+    Args:
+        root (Node): parsed query.
+        index (InvertedIndex, optional): index used for candidate generation and
+            selectivity estimates.
+        item_type (type): core type the plan is evaluated on.
+    """
+
+    def __init__(self, root: Node, item_type: type, index: Optional[InvertedIndex] = None):
+        self.item_type = item_type
+        self.index = index
+        self.driver = None if index is None else index.driver
+        self._term_hits: Dict[int, Set[int]] = {}
+        if index is not None:
+            universe = max(len(index.ikids(item_type)), 1)
+            self.estimate = lambda term: len(self.term_candidates(term)) / universe
+        else:
+            self.estimate = heuristic_estimate
+        self.root = self._order(root)
+
+    def term_candidates(self, term: Term) -> Set[int]:
+        """Superset of ikids matching term, from the index."""
+        key = id(term)
+        if key not in self._term_hits:
+            hits = None
+            for word in sorted(term.words, key=len, reverse=True):
+                word_hits = self.index.match_term(word, self.item_type)
+                hits = word_hits if hits is None else hits & word_hits
+                if not hits:
+                    break
+            self._term_hits[key] = hits or set()
+        return self._term_hits[key]
+
+    def _order(self, node: Node) -> Node:
+        """Sort AND children rarest first and OR children most frequent first.
+
+        Negations go last within an AND since they can't narrow candidates
+        through the index.
+        """
+        if isinstance(node, Not):
+            return Not(self._order(node.child))
+        if isinstance(node, And):
+            children = [self._order(child) for child in node.children]
+            children.sort(key=lambda c: (isinstance(c, Not), c.selectivity(self.estimate)))
+            return And(children)
+        if isinstance(node, Or):
+            children = [self._order(child) for child in node.children]
+            children.sort(key=lambda c: -c.selectivity(self.estimate))
+            return Or(children)
+        return node
+
+    def candidates(self, node: Optional[Node] = None) -> Optional[Set[int]]:
+        """Ikids possibly matching node according to the index; None means unrestricted."""
+        node = self.root if node is None else node
+        if self.index is None:
+            return None
+        if isinstance(node, Term):
+            return self.term_candidates(node)
+        if isinstance(node, And):
+            result = None
+            for child in node.children:
+                child_hits = self.candidates(child)
+                if child_hits is None:
+                    continue
+                result = set(child_hits) if result is None else result & child_hits
+                if not result:
+                    break
+            return result
+        if isinstance(node, Or):
+            result = set()
+            for child in node.children:
+                child_hits = self.candidates(child)
+                if child_hits is None:
+                    return None
+                result |= child_hits
+            return result
+        return None
+
+    def pushdown_term(self, node: Optional[Node] = None) -> Optional[Term]:
+        """Most selective term every match must satisfy, for backend pre-filtering."""
+        node = self.root if node is None else node
+        if isinstance(node, Term):
+            return node
+        if isinstance(node, And):
+            for child in node.children:
+                term = self.pushdown_term(child)
+                if term is not None:
+                    return term
+        return None
+
+    def matches(self, name: str, content: str) -> bool:
+        return self.root.matches({'name': str(name), 'content': str(content)})
+
+
+def _fetch_rows(plan: QueryPlan, core_cls: type) -> Iterable:
+    db_cls = core_cls._backend_cls(plan.driver)
+    candidates = plan.candidates()
+    if candidates is not None:
+        if not candidates:
+            return []
+        ikids = sorted(candidates)
+        loader = getattr(db_cls, 'load_many', None)
+        return loader(ikids) if loader else [db_cls.load(ikid) for ikid in ikids]
+    term = plan.pushdown_term()
+    if issubclass(core_cls, Note):
+        return core_cls._matching_rows(_ANY if term is None else term.regex, plan.driver)
+    if term is not None:
+        return db_cls.str_filter(term.regex)
+    return getattr(db_cls, 'iter_all', db_cls.list_all)()
+
+
+def filter_query(query_str: str,
+                 item_types: Sequence[Item] = (Definition, Theorem, Proof, Note, Question),
+                 index: Optional[InvertedIndex] = None) -> Dict[Item, List[Item]]:
+    """Search items with the query language described in this module.
+
+    Without an index, the backend is narrowed down with the most selective
+    term that every match requires, if any; with an index, candidates come
+    from set operations on its postings. In both cases, the full expression is
+    then checked on the candidates only, and only matches are cast. Notes are
+    matched on their stored rendered text, as their content, see `Note.str_filter`.
+
+    Args:
+        query_str (str): query string.
+        item_types (Sequence[Item], optional): same as in `search.filter_str`.
+        index (InvertedIndex, optional): attached index covering item_types.
+
+    Returns:
+        Dict[Item, List[Item]]: segmented results, only containing matching items.
+
+    Raises:
+        QuerySyntaxError: if query_str is malformed.
+    """
+    if len(item_types) == 0:
+        item_types = ITEM_TYPES
+    root = parse_query(query_str)
+    results = {}
+    for item_type in item_types:
+        plan = QueryPlan(root, item_type, index)
+        # The rendered text of notes is stored as name, their content holding the structure.
+        fields = (lambda dbi: ('', dbi.name)) if issubclass(item_type, Note) else attrgetter('name', 'content')
+        results[item_type] = [item_type.from_db(dbi, plan.driver)
+                              for dbi in _fetch_rows(plan, item_type)
+                              if plan.matches(*fields(dbi))]
+    return results
@@ -0,0 +1,162 @@
+"""Relevance ranking of search results.
+
+Documents are scored with BM25F over two fields, name and content, where name
+matches weigh `NAME_BOOST` times more. Only the `top_k` best documents are
+selected, with a heap, and cast to core objects.
+
+Query terms match word prefixes, as in `indiek.core.index`.
+"""
+from __future__ import annotations
+import heapq
+import math
+import re
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Sequence, Tuple
+from indiek.core.items import Item, Note
+from indiek.core.index import tokenize
+
+if TYPE_CHECKING:
+    from indiek.core.index import InvertedIndex
+
+
+K1 = 1.2
+"""Term frequency saturation."""
+B = 0.75
+"""Field length normalization strength."""
+NAME_BOOST = 2.0
+"""Weight of name matches relative to content matches."""
+
+FieldCounts = Tuple[int, int]
+
+
+class BM25Scorer:
+    """BM25F scorer for a fixed set of query terms over a collection.
+
+    Args:
+        doc_count (int): number of documents in the collection.
+        doc_freqs (Dict[str, int]): number of documents matching each term.
+        avg_lengths (Tuple[float, float]): mean token count of name and content.
+    """
+
+    def __init__(self, doc_count: int, doc_freqs: Dict[str, int], avg_lengths: Tuple[float, float],
+                 k1: float = K1, b: float = B, name_boost: float = NAME_BOOST):
+        self.k1 = k1
+        self.b = b
+        self.name_boost = name_boost
+        self.avg_lengths = avg_lengths
+        self.idfs = {term: math.log(1 + (doc_count - df + 0.5) / (df + 0.5))
+                     for term, df in doc_freqs.items()}
+
+    def _norm(self, length: int, avg_length: float) -> float:
+        if not avg_length:
+            return 1.0
+        return 1 - self.b + self.b * length / avg_length
+
+    def score(self, term_counts: Dict[str, FieldCounts], lengths: FieldCounts) -> float:
+        """Score one document given per-term (name, content) occurrence counts and field lengths."""
+        name_norm = self._norm(lengths[0], self.avg_lengths[0])
+        content_norm = self._norm(lengths[1], self.avg_lengths[1])
+        total = 0.0
+        for term, (in_name, in_content) in term_counts.items():
+            weight = self.name_boost * in_name / name_norm + in_content / content_norm
+            if weight:
+                total += self.idfs.get(term, 0.0) * weight / (self.k1 + weight)
+        return total
+
+
+def _count_prefixed(terms: Sequence[str], tokens: Iterable[str]) -> Dict[str, int]:
+    counts = dict.fromkeys(terms, 0)
+    for token in tokens:
+        for term in terms:
+            if token.startswith(term):
+                counts[term] += 1
+    return counts
+
+
+def _top(scores: Iterable[Tuple[float, int]], top_k: int) -> List[int]:
+    """Keys of the top_k scores; ties go to the smallest key."""
+    best = heapq.nlargest(top_k, scores, key=lambda pair: (pair[0], -pair[1]))
+    return [key for _, key in best]
+
+
+def rank_indexed(index: InvertedIndex, terms: Sequence[str], item_type: Item, top_k: int) -> List[Item]:
+    """Top-k items of item_type for terms, scored from index statistics only."""
+    postings = {term: index.match_term(term, item_type) for term in terms}
+    candidates = set().union(*postings.values())
+    if not candidates:
+        return []
+    scorer = BM25Scorer(len(index.ikids(item_type)),
+                        {term: len(hits) for term, hits in postings.items()},
+                        index.average_lengths(item_type))
+
+    def scored():
+        for ikid in candidates:
+            frequencies = index.term_frequencies(item_type, ikid)
+            counts = {}
+            for term in terms:
+                in_name = in_content = 0
+                for token, (token_name, token_content) in frequencies.items():
+                    if token.startswith(term):
+                        in_name += token_name
+                        in_content += token_content
+                counts[term] = (in_name, in_content)
+            yield scorer.score(counts, index.field_lengths(item_type, ikid)), ikid
+
+    return item_type.load_many(_top(scored(), top_k), driver=index.driver)
+
+
+def rank_scanned(query: re.Pattern, terms: Sequence[str], item_type: Item, top_k: int) -> List[Item]:
+    """Top-k items of item_type among backend matches of query.
+
+    Collection statistics are computed over the matching rows. Rows are
+    scored before casting, so only the winners go through `from_db`. Notes
+    are scored on their stored rendered text, see `Note.str_filter`.
+    """
+    if issubclass(item_type, Note):
+        rows = list(item_type._matching_rows(query))
+        fields = [('', dbi.name) for dbi in rows]
+    else:
+        rows = item_type.BACKEND_CLS.str_filter(query)
+        fields = [(dbi.name, dbi.content) for dbi in rows]
+    if not rows:
+        return []
+    stats = []
+    doc_freqs = dict.fromkeys(terms, 0)
+    name_total = content_total = 0
+    for name, content in fields:
+        name_tokens, content_tokens = tokenize(name), tokenize(content)
+        in_name, in_content = _count_prefixed(terms, name_tokens), _count_prefixed(terms, content_tokens)
+        counts = {term: (in_name[term], in_content[term]) for term in terms}
+        for term, (n, c) in counts.items():
+            if n or c:
+                doc_freqs[term] += 1
+        stats.append((counts, (len(name_tokens), len(content_tokens))))
+        name_total += len(name_tokens)
+        content_total += len(content_tokens)
+    scorer = BM25Scorer(len(rows), doc_freqs, (name_total / len(rows), content_total / len(rows)))
+    scores = ((scorer.score(counts, lengths), position) for position, (counts, lengths) in enumerate(stats))
+    return [item_type.from_db(rows[position]) for position in _top(scores, top_k)]
+
+
+def rank_and_cast(search_str: str,
+                  query: re.Pattern,
+                  item_type: Item,
+                  top_k: int,
+                  index: Optional[InvertedIndex] = None) -> List[Item]:
+    """Best top_k items of item_type for search_str, in decreasing relevance.
+
+    Args:
+        search_str (str): search string, its word tokens are the scored terms.
+        query (re.Pattern): compiled search_str, used to find matches when no index is given.
+        item_type (Item): core item class.
+        top_k (int): maximum number of items returned.
+        index (InvertedIndex, optional): index providing matches and statistics.
+
+    Returns:
+        List[Item]: ranked core items.
+    """
+    terms = list(dict.fromkeys(tokenize(search_str)))
+    if top_k <= 0 or not terms:
+        return []
+    if index is not None:
+        return rank_indexed(index, terms, item_type, top_k)
+    return rank_scanned(query, terms, item_type, top_k)
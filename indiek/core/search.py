@@ -1,19 +1,45 @@
 """Search logic for the core IndieK API."""
+from __future__ import annotations
 import re
-from typing import List, Union, Sequence, Dict
-from indiek.core.items import Item, Definition, Theorem, Proof, Note, Question
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+from functools import lru_cache
+from itertools import islice
+from typing import TYPE_CHECKING, Any, Callable, Iterable, Iterator, List, Optional, Tuple, Union, Sequence, Dict
+from indiek.core.items import Item, Definition, Theorem, Proof, Note, Question, _to_thread
 from indiek.core.items import CORE_ITEM_TYPES as ITEM_TYPES
-from indiek.mockdb.items import (Item as DBItem,
-                                 Definition as DBDefinition,
-                                 Theorem as DBTheorem,
-                                 Proof as DBProof,
-                                 Note as DBNote,
-                                 Question as DBQuestion)
+from indiek.core import instrumentation
+from indiek.core.cache import QueryCache, generation
+from indiek.core.ranking import rank_and_cast
+from indiek.core.parallel import parallel_search_and_cast
 
 
-BackendItem = Union[DBItem, DBDefinition, DBTheorem, DBProof, DBNote, DBQuestion]
+if TYPE_CHECKING:
+    from indiek.core.index import InvertedIndex
+    from indiek.mockdb.items import (Item as DBItem,
+                                     Definition as DBDefinition,
+                                     Theorem as DBTheorem,
+                                     Proof as DBProof,
+                                     Note as DBNote,
+                                     Question as DBQuestion)
 
+    BackendItem = Union[DBItem, DBDefinition, DBTheorem, DBProof, DBNote, DBQuestion]
 
+MAX_WORKERS = 8
+"""Upper bound on threads used to query backends lacking native multi-type calls."""
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix='indiek-search')
+    return _executor
+
+
+@lru_cache(maxsize=1024)
 def build_search_query(string: str) -> re.Pattern:
     base_str = '('
     base_str += '|'.join(string.split())
@@ -26,13 +52,16 @@ def search_and_cast(query: re.Pattern, core_cls: Item) -> List[Item]:
 
     Args:
         query (re.Pattern): compiled regex object.
-        core_cls (Item): item class in core API to use for filtering.
+        core_cls (Item): item class in core API to use for filtering. Notes are
+            matched on their rendered text, see `Note.str_filter`.
 
     Returns:
         List[Item]: list of core items
     """
+    if issubclass(core_cls, Note):
+        return core_cls.str_filter(query)
     db_cls = core_cls.BACKEND_CLS
-    return [core_cls.from_db(dbi) for dbi in db_cls.str_filter(query)]
+    return [core_cls.from_db(dbi) for dbi in instrumentation.timed('backend.str_filter', db_cls.str_filter, query)]
 
 
 def fetch_and_cast(core_cls: Item) -> List[Item]:
@@ -45,7 +74,82 @@ def fetch_and_cast(core_cls: Item) -> List[Item]:
         List[Item]: list of core items
     """
     db_cls = core_cls.BACKEND_CLS
-    return [core_cls.from_db(dbi) for dbi in db_cls.list_all()]
+    return [core_cls.from_db(dbi) for dbi in instrumentation.timed('backend.list_all', db_cls.list_all)]
+
+
+def _run_batched(item_types: Sequence[Item],
+                 native_name: str,
+                 native_args: tuple,
+                 per_type: Callable[[Item], List[Item]]) -> Dict[Item, List[Item]]:
+    """Query backends once per driver and route results into per-type buckets.
+
+    Item types are grouped by the driver module defining their BACKEND_CLS. A driver
+    exposing the module-level function `native_name` is called a single time as
+    `native_name(*native_args, db_classes)` and must return a dict keyed by backend
+    class. Types whose driver lacks that function are handled by `per_type`, run
+    concurrently in a thread pool within a copy of the caller's context (so that,
+    e.g., the active identity map is honored).
+    """
+    groups: Dict[Any, List[Item]] = {}
+    for item_type in item_types:
+        groups.setdefault(sys.modules[item_type.BACKEND_CLS.__module__], []).append(item_type)
+
+    results = {}
+    fallback = []
+    for driver, types in groups.items():
+        native = getattr(driver, native_name, None)
+        if native is None:
+            fallback += types
+            continue
+        by_db_cls = instrumentation.timed(f'backend.{native_name}', native,
+                                          *native_args, [t.BACKEND_CLS for t in types])
+        for item_type in types:
+            results[item_type] = [item_type.from_db(dbi) for dbi in by_db_cls.get(item_type.BACKEND_CLS, ())]
+
+    if len(fallback) == 1:
+        results[fallback[0]] = per_type(fallback[0])
+    elif fallback:
+        executor = _get_executor()
+        futures = [executor.submit(copy_context().run, per_type, t) for t in fallback]
+        for item_type, future in zip(fallback, futures):
+            results[item_type] = future.result()
+    return {item_type: results[item_type] for item_type in item_types}
+
+
+def batch_search_and_cast(query: re.Pattern, item_types: Sequence[Item]) -> Dict[Item, List[Item]]:
+    """Multi-type counterpart of `search_and_cast` walking each backend once.
+
+    Drivers may implement `str_filter_many(regex, db_classes)` to serve all
+    requested types in a single pass; otherwise types are searched concurrently.
+    Notes are always searched through `Note.str_filter`.
+
+    Args:
+        query (re.Pattern): compiled regex object.
+        item_types (Sequence[Item]): core item classes to search.
+
+    Returns:
+        Dict[Item, List[Item]]: core items keyed by type, in item_types order.
+    """
+    note_types = [t for t in item_types if issubclass(t, Note)]
+    results = _run_batched([t for t in item_types if t not in note_types], 'str_filter_many', (query,),
+                           lambda t: search_and_cast(query, t))
+    results.update((t, t.str_filter(query)) for t in note_types)
+    return {item_type: results[item_type] for item_type in item_types}
+
+
+def batch_fetch_and_cast(item_types: Sequence[Item]) -> Dict[Item, List[Item]]:
+    """Multi-type counterpart of `fetch_and_cast`.
+
+    Drivers may implement `list_all_many(db_classes)`; otherwise types are
+    fetched concurrently.
+
+    Args:
+        item_types (Sequence[Item]): core item classes to fetch.
+
+    Returns:
+        Dict[Item, List[Item]]: core items keyed by type, in item_types order.
+    """
+    return _run_batched(item_types, 'list_all_many', (), fetch_and_cast)
 
 
 def list_all_items(item_types: Sequence[Item] = (Definition, Theorem, Proof, Note, Question)) -> Dict[Item, List[Item]]:
@@ -65,24 +169,201 @@ def list_all_items(item_types: Sequence[Item] = (Definition, Theorem, Proof, Not
     """
     if len(item_types) == 0:
         item_types = ITEM_TYPES
-    return {item_type: fetch_and_cast(item_type) for item_type in item_types}
+    return batch_fetch_and_cast(item_types)
+
+
+def index_and_cast(index: InvertedIndex, search_str: str, item_types: Sequence[Item]) -> Dict[Item, List[Item]]:
+    """Resolve search terms through an inverted index and cast hits to core objects.
+
+    Args:
+        index (InvertedIndex): attached index covering item_types.
+        search_str (str): search string.
+        item_types (Sequence[Item]): list-like of core item types.
+
+    Returns:
+        Dict[Item, List[Item]]: segmented results, only containing matching items.
+    """
+    hits = index.search(search_str, item_types)
+    return {item_type: item_type.load_many(hits[item_type], driver=index.driver) if hits[item_type] else []
+            for item_type in item_types}
 
 
-def filter_str(search_str: str, item_types: Sequence[Item] = (Definition, Theorem, Proof, Note, Question)) -> Dict[Item, List[Item]]:
+def filter_str(search_str: str,
+               item_types: Sequence[Item] = (Definition, Theorem, Proof, Note, Question),
+               index: Optional[InvertedIndex] = None,
+               cache: Optional[QueryCache] = None,
+               top_k: Optional[int] = None,
+               processes: Optional[int] = None) -> Dict[Item, List[Item]]:
     """Search items from specified type which match search string.
 
     Backend items of type compatible with item_types are searched, retrieved and cast to Core type.
-    The search_str is split on white spaces and regex are built and 'and-ed'. The resulting regex is
-    applied on item name and content.
+    The search_str is split on white spaces and regex are built and 'or-ed'. The resulting regex is
+    applied on item name and content. For AND/NOT operators, phrases and field scoping, see
+    `indiek.core.query.filter_query`.
     
     Args:
         search_str (str): search string.
         item_types (Sequence[Item]): list-like of core item types (similar to `list_all_items` arg of same name).
+        index (InvertedIndex, optional): if provided, terms are looked up in this index instead of
+            scanning the backend. Terms then match word prefixes rather than arbitrary substrings.
+        cache (QueryCache, optional): if provided, results are served from and stored in this cache.
+            Cached results are dropped as soon as an item of one of item_types is saved or deleted.
+        top_k (int, optional): if provided, only the top_k most relevant items of each type are returned,
+            best first, as ranked by `indiek.core.ranking`. Only those items are cast to core objects.
+        processes (int, optional): if provided, and neither index nor top_k is, the regex is matched in
+            that many worker processes, see `indiek.core.parallel`.
     
     Returns:
         Dict[Item, List[Item]]: segmented results, only containing matching items.
     """
     if len(item_types) == 0:
         item_types = ITEM_TYPES
+    if cache is None:
+        return _filter_str(search_str, item_types, index, top_k, processes)
+
+    key = cache.make_key(search_str, item_types, index is not None, top_k)
+    cached = cache.get(key, item_types)
+    if cached is None:
+        generations = tuple(map(generation, item_types))
+        cached = _filter_str(search_str, item_types, index, top_k, processes)
+        cache.put(key, item_types, cached, generations)
+    return {item_type: list(found) for item_type, found in cached.items()}
+
+
+def _filter_str(search_str: str,
+                item_types: Sequence[Item],
+                index: Optional[InvertedIndex],
+                top_k: Optional[int],
+                processes: Optional[int] = None) -> Dict[Item, List[Item]]:
+    query = build_search_query(search_str)
+    if top_k is not None:
+        return {item_type: rank_and_cast(search_str, query, item_type, top_k, index) for item_type in item_types}
+    if index is not None:
+        return index_and_cast(index, search_str, item_types)
+    if processes is not None:
+        return parallel_search_and_cast(query, item_types, processes)
+    return batch_search_and_cast(query, item_types)
+
+
+def _iter_rows(item_types: Sequence[Item], fetch: Callable[[Item], Iterable[BackendItem]]) -> Iterator[Tuple[Item, BackendItem]]:
+    for item_type in item_types:
+        for dbi in fetch(item_type):
+            yield item_type, dbi
+
+
+def _paginate_and_cast(rows: Iterator[Tuple[Item, BackendItem]],
+                       limit: Optional[int],
+                       offset: int) -> Iterator[Tuple[Item, Item]]:
+    """Skip and truncate backend rows, then cast the survivors one at a time."""
+    stop = None if limit is None else offset + limit
+    for item_type, dbi in islice(rows, offset, stop):
+        yield item_type, item_type.from_db(dbi)
+
+
+def iter_all_items(item_types: Sequence[Item] = (Definition, Theorem, Proof, Note, Question),
+                   limit: Optional[int] = None,
+                   offset: int = 0) -> Iterator[Tuple[Item, Item]]:
+    """Lazily iterate over all items, type after type.
+
+    Backend rows are pulled through the driver's `iter_all` class method when
+    available (`list_all` otherwise), and only cast to core objects as the caller
+    consumes them. Rows skipped by offset are never cast.
+
+    Args:
+        item_types (Sequence[Item], optional): same as in `list_all_items`.
+        limit (int, optional): maximum number of items to yield. Defaults to None (no limit).
+        offset (int, optional): number of leading items to skip. Defaults to 0.
+
+    Yields:
+        Tuple[Item, Item]: (core type, core item) pairs.
+    """
+    if len(item_types) == 0:
+        item_types = ITEM_TYPES
+
+    def fetch(item_type):
+        db_cls = item_type.BACKEND_CLS
+        return getattr(db_cls, 'iter_all', db_cls.list_all)()
+
+    return _paginate_and_cast(_iter_rows(item_types, fetch), limit, offset)
+
+
+def iter_filter_str(search_str: str,
+                    item_types: Sequence[Item] = (Definition, Theorem, Proof, Note, Question),
+                    limit: Optional[int] = None,
+                    offset: int = 0) -> Iterator[Tuple[Item, Item]]:
+    """Lazily iterate over items matching search string, type after type.
+
+    Streaming counterpart of `filter_str`. Drivers may provide an `iter_filter`
+    class method with the signature of `str_filter` to stream matches.
+
+    Args:
+        search_str (str): search string.
+        item_types (Sequence[Item], optional): same as in `filter_str`.
+        limit (int, optional): maximum number of items to yield. Defaults to None (no limit).
+        offset (int, optional): number of leading matches to skip. Defaults to 0.
+
+    Yields:
+        Tuple[Item, Item]: (core type, core item) pairs.
+    """
+    if len(item_types) == 0:
+        item_types = ITEM_TYPES
+    query = build_search_query(search_str)
+
+    def fetch(item_type):
+        if issubclass(item_type, Note):
+            return item_type._matching_rows(query)
+        db_cls = item_type.BACKEND_CLS
+        return getattr(db_cls, 'iter_filter', db_cls.str_filter)(query)
+
+    return _paginate_and_cast(_iter_rows(item_types, fetch), limit, offset)
+
+
+async def _acall(db_cls: Any, name: str, *args: Any) -> List[BackendItem]:
+    """Await db_cls.a<name>(*args) if the driver defines it, else run db_cls.<name> in a thread."""
+    native = getattr(db_cls, 'a' + name, None)
+    if native is not None:
+        return await native(*args)
+    return await _to_thread(getattr(db_cls, name), *args)
+
+
+async def asearch_and_cast(query: re.Pattern, core_cls: Item) -> List[Item]:
+    """Asynchronous counterpart of `search_and_cast`.
+
+    Drivers may provide a native `astr_filter` coroutine class method.
+    """
+    if issubclass(core_cls, Note):
+        return await _to_thread(core_cls.str_filter, query)
+    rows = await _acall(core_cls.BACKEND_CLS, 'str_filter', query)
+    return [core_cls.from_db(dbi) for dbi in rows]
+
+
+async def afetch_and_cast(core_cls: Item) -> List[Item]:
+    """Asynchronous counterpart of `fetch_and_cast`.
+
+    Drivers may provide a native `alist_all` coroutine class method.
+    """
+    rows = await _acall(core_cls.BACKEND_CLS, 'list_all')
+    return [core_cls.from_db(dbi) for dbi in rows]
+
+
+async def alist_all_items(item_types: Sequence[Item] = (Definition, Theorem, Proof, Note, Question)) -> Dict[Item, List[Item]]:
+    """Asynchronous counterpart of `list_all_items`, querying all types concurrently."""
+    if len(item_types) == 0:
+        item_types = ITEM_TYPES
+    import asyncio
+    found = await asyncio.gather(*(afetch_and_cast(item_type) for item_type in item_types))
+    return dict(zip(item_types, found))
+
+
+async def afilter_str(search_str: str,
+                      item_types: Sequence[Item] = (Definition, Theorem, Proof, Note, Question),
+                      index: Optional[InvertedIndex] = None) -> Dict[Item, List[Item]]:
+    """Asynchronous counterpart of `filter_str`, querying all types concurrently."""
+    if len(item_types) == 0:
+        item_types = ITEM_TYPES
+    import asyncio
+    if index is not None:
+        return await asyncio.to_thread(index_and_cast, index, search_str, item_types)
     query = build_search_query(search_str)
-    return {item_type: search_and_cast(query, item_type) for item_type in item_types}
+    found = await asyncio.gather(*(asearch_and_cast(query, item_type) for item_type in item_types))
+    return dict(zip(item_types, found))
@@ -0,0 +1,82 @@
+"""Group core calls into backend transactions.
+
+Example:
+    >>> from indiek.core.drivers import sqlite
+    >>> from indiek.core.session import session
+    >>> with session(sqlite):
+    ...     for item in items:
+    ...         item.save()
+
+Sessions belong to the thread that opens them: other threads, including the
+worker threads running async calls, keep using their own connections. Hence
+awaiting `asave`/`adelete` of a sqlite object inside `session(sqlite)` waits
+for the session's write lock or pooled connection, until the busy or pool
+timeout expires.
+
+Core objects written in a session only look saved until the session ends:
+listeners (identity maps, caches, indexes, the change log) hear of the
+writes once they are committed, and a rollback restores the ikid and dirty
+fields the objects had before, so that saving them again writes them anew.
+"""
+from __future__ import annotations
+from contextlib import ExitStack, contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from indiek.core import drivers as drivers_module
+from indiek.core import items
+
+
+class _Journal:
+    """Writes made through a session's transactions, notified on commit or undone on rollback."""
+
+    def __init__(self, drivers: List[Any]):
+        self.drivers = drivers
+        self.states: Dict[int, Tuple[items.Nucleus, Optional[int], set]] = {}
+        self.events: List[Tuple[str, items.Nucleus, int]] = []
+
+    def covers(self, obj: items.Nucleus) -> bool:
+        return any(obj.backend is driver for driver in self.drivers)
+
+    def keep(self, obj: items.Nucleus) -> None:
+        """Remember the state of obj before its first write in the session."""
+        self.states.setdefault(id(obj), (obj, obj._ikid, set(obj._dirty)))
+
+    def commit(self) -> None:
+        for event in self.events:
+            items._notify(*event)
+
+    def rollback(self) -> None:
+        for obj, ikid, dirty in self.states.values():
+            obj._ikid = ikid
+            obj._dirty = dirty
+
+
+@contextmanager
+def session(*drivers: Any) -> Iterator[None]:
+    """Run the calls of the enclosed block on drivers in one transaction per driver.
+
+    Everything is rolled back if the block raises, including the state of the
+    core objects written. Drivers without a `transaction` context manager,
+    such as mockdb, run calls as usual. Nested sessions join the transactions
+    already open.
+
+    Args:
+        *drivers (Any): driver modules. Defaults to the default driver.
+    """
+    opened = getattr(items._journals, 'open', None)
+    if opened is None:
+        opened = items._journals.open = []
+    joined = [driver for journal in opened for driver in journal.drivers]
+    journal = _Journal([driver for driver in drivers or (drivers_module.default(),)
+                        if hasattr(driver, 'transaction') and not any(driver is j for j in joined)])
+    opened.append(journal)
+    try:
+        with ExitStack() as stack:
+            for driver in journal.drivers:
+                stack.enter_context(driver.transaction())
+            yield
+    except BaseException:
+        journal.rollback()
+        raise
+    finally:
+        opened.remove(journal)
+    journal.commit()
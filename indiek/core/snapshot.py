@@ -0,0 +1,442 @@
+"""Binary snapshots of items and note trees.
+
+A snapshot file starts with `MAGIC` and is followed by sections, each made of
+a 16-byte header (4-byte tag, 4 padding bytes, little-endian uint64 payload
+length) and a payload padded to a multiple of 8 bytes:
+
+- 'STRS': strings interned since the previous STRS section. Payload: count n,
+  n + 1 uint64 offsets into the UTF-8 blob that follows. String ids are
+  assigned in order of first appearance across the file.
+- 'ITEM': up to `chunk_size` items of one type, stored column-wise. Payload:
+  type name string id, row count n, then int64 ikids, uint32 name string ids
+  and uint32 content string ids.
+- 'NOTE': up to `chunk_size` notes, children before parents, and their
+  entries. Payload: note count n, entry count m, then int64 columns (note
+  ikids, referenced ikids, entry values) and uint32 columns (note kinds,
+  referenced type string ids, entry counts, entry kinds). An entry value is a
+  string id or, for nested notes, the position of the note in the file.
+- 'END ': number of items and notes, marks a complete file.
+
+Since strings are interned and sections are written as they fill up, the
+writer streams from the backend in bounded memory (apart from the interning
+table). The reader maps the file and copies numeric columns out one section
+at a time, so no view of the map outlives a call; strings are only decoded
+when accessed.
+"""
+from __future__ import annotations
+import mmap
+import struct
+import sys
+from array import array
+from bisect import bisect_right
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+from indiek.core.items import CORE_ITEM_TYPES, Item, Note, PointerNote
+
+
+MAGIC = b'IKSNAP1\n'
+DEFAULT_CHUNK_SIZE = 10000
+
+_HEADER = struct.Struct('<4s4xQ')
+_COUNTS = struct.Struct('<QQ')
+
+NOTE, POINTER, DEAD_POINTER = 0, 1, 2
+"""Note kinds."""
+TEXT, NESTED = 0, 1
+"""Note entry kinds."""
+_NO_IKID = -1
+
+_LITTLE_ENDIAN = sys.byteorder == 'little'
+
+
+class SnapshotError(ValueError):
+    """Snapshot file is malformed or truncated."""
+    pass
+
+
+def _le(column: array) -> bytes:
+    if not _LITTLE_ENDIAN:
+        column = array(column.typecode, column)
+        column.byteswap()
+    return column.tobytes()
+
+
+def _chunks(values: Iterable, size: int) -> Iterator[list]:
+    chunk = []
+    for value in values:
+        chunk.append(value)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _post_order(roots: Iterable[Note], seen: Dict[int, int]) -> List[Note]:
+    """Notes reachable from roots and not in seen, each nested note before its parents."""
+    order = []
+    for root in roots:
+        stack = [(root, False)]
+        while stack:
+            note, expanded = stack.pop()
+            if id(note) in seen:
+                continue
+            if expanded:
+                seen[id(note)] = -1
+                order.append(note)
+                continue
+            stack.append((note, True))
+            if not isinstance(note, PointerNote):
+                stack.extend((e, False) for e in reversed(note.content)
+                             if isinstance(e, Note) and id(e) not in seen)
+    return order
+
+
+class SnapshotWriter:
+    """Streaming snapshot writer.
+
+    Args:
+        file (BinaryIO): binary file open for writing.
+        chunk_size (int, optional): maximum number of items or notes per section.
+    """
+
+    def __init__(self, file: BinaryIO, chunk_size: int = DEFAULT_CHUNK_SIZE):
+        self._file = file
+        self.chunk_size = chunk_size
+        self._sids: Dict[str, int] = {}
+        self._pending: List[str] = []
+        self._note_positions: Dict[int, int] = {}
+        self._notes: List[Note] = []
+        self.item_count = 0
+        file.write(MAGIC)
+
+    def intern(self, text: str) -> int:
+        sid = self._sids.get(text)
+        if sid is None:
+            sid = self._sids[text] = len(self._sids)
+            self._pending.append(text)
+        return sid
+
+    def _section(self, tag: bytes, *parts: bytes) -> None:
+        length = sum(map(len, parts))
+        self._file.write(_HEADER.pack(tag, length))
+        for part in parts:
+            self._file.write(part)
+        self._file.write(b'\0' * (-length % 8))
+
+    def _flush_strings(self) -> None:
+        if not self._pending:
+            return
+        blobs = [text.encode('utf-8') for text in self._pending]
+        offsets = array('Q', [0])
+        total = 0
+        for blob in blobs:
+            total += len(blob)
+            offsets.append(total)
+        self._section(b'STRS', struct.pack('<Q', len(blobs)), _le(offsets), b''.join(blobs))
+        self._pending = []
+
+    def write_items(self, type_name: str, rows: Iterable[Tuple[int, str, str]]) -> None:
+        """Write (ikid, name, content) rows of the named item type."""
+        type_sid = self.intern(type_name)
+        for chunk in _chunks(rows, self.chunk_size):
+            ikids, names, contents = array('q'), array('I'), array('I')
+            for ikid, name, content in chunk:
+                ikids.append(ikid)
+                names.append(self.intern(str(name)))
+                contents.append(self.intern(str(content)))
+            self._flush_strings()
+            self._section(b'ITEM', _COUNTS.pack(type_sid, len(chunk)), _le(ikids), _le(names), _le(contents))
+            self.item_count += len(chunk)
+
+    def write_notes(self, roots: Iterable[Note]) -> None:
+        """Write notes along with every note nested in them; shared notes are written once."""
+        order = _post_order(roots, self._note_positions)
+        for chunk in _chunks(order, self.chunk_size):
+            ikids, ref_ikids, values = array('q'), array('q'), array('q')
+            kinds, ref_types, counts, entry_kinds = array('I'), array('I'), array('I'), array('I')
+            for note in chunk:
+                self._note_positions[id(note)] = len(self._notes)
+                self._notes.append(note)
+                ikids.append(_NO_IKID if note.ikid is None else note.ikid)
+                if isinstance(note, PointerNote):
+                    kinds.append(DEAD_POINTER if note.dead else POINTER)
+                    ref_types.append(self.intern(note.reference_type.__name__))
+                    ref_ikids.append(note.reference_ikid)
+                    counts.append(0)
+                    continue
+                kinds.append(NOTE)
+                ref_types.append(0)
+                ref_ikids.append(_NO_IKID)
+                counts.append(len(note.content))
+                for entry in note.content:
+                    if isinstance(entry, Note):
+                        entry_kinds.append(NESTED)
+                        values.append(self._note_positions[id(entry)])
+                    else:
+                        entry_kinds.append(TEXT)
+                        values.append(self.intern(str(entry)))
+            self._flush_strings()
+            self._section(b'NOTE', _COUNTS.pack(len(chunk), len(values)),
+                          _le(ikids), _le(ref_ikids), _le(values),
+                          _le(kinds), _le(ref_types), _le(counts), _le(entry_kinds))
+
+    def close(self) -> None:
+        """Mark the snapshot complete. The file itself is left open."""
+        self._flush_strings()
+        self._section(b'END ', _COUNTS.pack(self.item_count, self.note_count))
+
+    @property
+    def note_count(self) -> int:
+        return len(self._notes)
+
+
+class SnapshotReader:
+    """Memory-mapped snapshot reader, usable as a context manager.
+
+    Args:
+        path (str): snapshot file path.
+
+    Raises:
+        SnapshotError: if the file isn't a complete snapshot.
+    """
+
+    def __init__(self, path: str):
+        self._file = open(path, 'rb')
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise SnapshotError(f"{path} is empty.")
+        self._view = memoryview(self._map)
+        self._string_sections: List[Tuple[int, int, int, int]] = []
+        self._item_sections: List[Tuple[int, int, int]] = []
+        self._note_sections: List[Tuple[int, int, int]] = []
+        self._string_count = 0
+        try:
+            self._scan()
+        except BaseException:
+            self.close()
+            raise
+
+    def __enter__(self) -> SnapshotReader:
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Unmap the file. Pending `iter_rows`/`items` generators fail when resumed."""
+        self._view.release()
+        self._map.close()
+        self._file.close()
+
+    def _scan(self) -> None:
+        if self._map[:len(MAGIC)] != MAGIC:
+            raise SnapshotError("Not an indiek snapshot.")
+        position = len(MAGIC)
+        complete = False
+        while position < len(self._map):
+            if position + _HEADER.size > len(self._map):
+                raise SnapshotError("Truncated section header.")
+            tag, length = _HEADER.unpack_from(self._map, position)
+            payload = position + _HEADER.size
+            position = payload + length + (-length % 8)
+            if position > len(self._map):
+                raise SnapshotError(f"Truncated {tag!r} section.")
+            if tag == b'STRS':
+                count = struct.unpack_from('<Q', self._map, payload)[0]
+                offsets = payload + 8
+                self._string_sections.append((self._string_count, count, offsets, offsets + 8 * (count + 1)))
+                self._string_count += count
+            elif tag == b'ITEM':
+                type_sid, count = _COUNTS.unpack_from(self._map, payload)
+                self._item_sections.append((type_sid, count, payload + _COUNTS.size))
+            elif tag == b'NOTE':
+                count, entries = _COUNTS.unpack_from(self._map, payload)
+                self._note_sections.append((count, entries, payload + _COUNTS.size))
+            elif tag == b'END ':
+                complete = True
+                break
+            else:
+                raise SnapshotError(f"Unknown section {tag!r}.")
+        if not complete:
+            raise SnapshotError("Snapshot is incomplete.")
+        self._string_firsts = [first for first, *_ in self._string_sections]
+
+    def _column(self, position: int, count: int, typecode: str) -> array:
+        column = array(typecode)
+        with self._view[position:position + count * column.itemsize] as raw:
+            column.frombytes(raw)
+        if not _LITTLE_ENDIAN:
+            column.byteswap()
+        return column
+
+    def string(self, sid: int) -> str:
+        """Decode interned string sid."""
+        section = self._string_sections[bisect_right(self._string_firsts, sid) - 1]
+        first, count, offsets, blob = section
+        start, end = struct.unpack_from('<QQ', self._map, offsets + 8 * (sid - first))
+        return str(self._view[blob + start:blob + end], 'utf-8')
+
+    def item_types(self) -> List[str]:
+        """Names of the item types present, in file order."""
+        return list(dict.fromkeys(self.string(type_sid) for type_sid, _, _ in self._item_sections))
+
+    def _item_columns(self, type_name: Optional[str]) -> Iterator[Tuple[str, array, array, array]]:
+        for type_sid, count, position in self._item_sections:
+            name = self.string(type_sid)
+            if type_name is not None and name != type_name:
+                continue
+            ikids = self._column(position, count, 'q')
+            names = self._column(position + 8 * count, count, 'I')
+            contents = self._column(position + 12 * count, count, 'I')
+            yield name, ikids, names, contents
+
+    def ikids(self, type_name: str) -> List[int]:
+        """Ikids of the items of the named type, read straight from the columns."""
+        found = []
+        for _, ikids, _, _ in self._item_columns(type_name):
+            found.extend(ikids)
+        return found
+
+    def iter_rows(self, type_name: Optional[str] = None) -> Iterator[Tuple[str, int, str, str]]:
+        """Yield (type name, ikid, name, content) of items, of the named type only if given."""
+        for name, ikids, names, contents in self._item_columns(type_name):
+            for position in range(len(ikids)):
+                yield name, ikids[position], self.string(names[position]), self.string(contents[position])
+
+    def items(self, item_type: type) -> Iterator[Item]:
+        """Core items of item_type; they are not saved to any backend."""
+        for _, ikid, name, content in self.iter_rows(item_type.__name__):
+            yield item_type(_ikid=ikid, name=name, content=content)
+
+    def notes(self, item_types: Sequence[type] = CORE_ITEM_TYPES) -> List[Note]:
+        """Rebuild every note, with shared nested notes shared again.
+
+        Pointers to items are given references built from this snapshot's item
+        rows of item_types; pointers to notes refer to the rebuilt notes. Other
+        pointers are left unresolved, see `Note.resolve`.
+
+        Returns:
+            List[Note]: notes in file order, nested notes before their parents.
+        """
+        sections = []
+        wanted: Dict[str, set] = {}
+        for count, entries, position in self._note_sections:
+            columns = {'ikids': self._column(position, count, 'q'),
+                       'ref_ikids': self._column(position + 8 * count, count, 'q'),
+                       'values': self._column(position + 16 * count, entries, 'q')}
+            position += 16 * count + 8 * entries
+            for key in ('kinds', 'ref_types', 'counts'):
+                columns[key] = self._column(position, count, 'I')
+                position += 4 * count
+            columns['entry_kinds'] = self._column(position, entries, 'I')
+            sections.append((count, columns))
+            for row in range(count):
+                if columns['kinds'][row] == POINTER:
+                    type_name = self.string(columns['ref_types'][row])
+                    wanted.setdefault(type_name, set()).add(columns['ref_ikids'][row])
+
+        types_by_name = {t.__name__: t for t in item_types}
+        known_types = {**types_by_name, 'Note': Note, 'PointerNote': PointerNote}
+        references: Dict[Tuple[str, int], Item] = {}
+        for type_name, ikids in wanted.items():
+            if type_name in types_by_name:
+                for _, ikid, name, content in self.iter_rows(type_name):
+                    if ikid in ikids:
+                        references[(type_name, ikid)] = types_by_name[type_name](_ikid=ikid, name=name, content=content)
+
+        notes: List[Note] = []
+        notes_by_ikid: Dict[int, Note] = {}
+        unresolved: List[PointerNote] = []
+        for count, columns in sections:
+            entry = 0
+            for row in range(count):
+                ikid = columns['ikids'][row]
+                ikid = None if ikid == _NO_IKID else ikid
+                kind = columns['kinds'][row]
+                if kind == NOTE:
+                    note = Note(_ikid=ikid)
+                    entries = []
+                    for position in range(entry, entry + columns['counts'][row]):
+                        value = columns['values'][position]
+                        entries.append(notes[value] if columns['entry_kinds'][position] == NESTED else self.string(value))
+                    entry += columns['counts'][row]
+                    note.content = entries
+                else:
+                    type_name = self.string(columns['ref_types'][row])
+                    ref_ikid = columns['ref_ikids'][row]
+                    dead = kind == DEAD_POINTER
+                    reference = references.get((type_name, ref_ikid))
+                    reference_type = known_types.get(type_name)
+                    if reference_type is None:
+                        raise SnapshotError(f"Pointer to unknown type {type_name!r}.")
+                    note = PointerNote._restore(reference, reference_type, ref_ikid, dead=dead, _ikid=ikid)
+                    if reference is None and not dead and type_name not in types_by_name:
+                        unresolved.append(note)
+                notes.append(note)
+                if ikid is not None:
+                    notes_by_ikid[ikid] = note
+
+        # Pointers to notes may precede the notes they refer to.
+        for pointer in unresolved:
+            reference = notes_by_ikid.get(pointer.reference_ikid)
+            if reference is not None:
+                pointer._set_reference(reference)
+        return notes
+
+
+def stored_notes(driver: Any = None) -> List[Note]:
+    """Every note stored in driver, pointers included, loaded with one `Note.load_many`.
+
+    Shared nested notes are loaded once, so `SnapshotWriter.write_notes` writes them once.
+
+    Args:
+        driver (Any, optional): driver to read from. Defaults to the default driver.
+    """
+    db_cls = Note._backend_cls(driver)
+    rows = getattr(db_cls, 'iter_all', db_cls.list_all)()
+    return Note.load_many([dbi._ikid for dbi in rows], driver=driver)
+
+
+def export_snapshot(path: str,
+                    item_types: Sequence[type] = CORE_ITEM_TYPES,
+                    notes: Optional[Iterable[Note]] = None,
+                    chunk_size: int = DEFAULT_CHUNK_SIZE) -> Tuple[int, int]:
+    """Write every backend item of item_types, and notes, to a snapshot file.
+
+    Backend rows are streamed and written without being cast to core objects.
+
+    Args:
+        path (str): destination file, overwritten if it exists.
+        item_types (Sequence[type], optional): core item types to export.
+        notes (Iterable[Note], optional): notes to export with all their nested notes.
+            Defaults to every stored note, see `stored_notes`.
+        chunk_size (int, optional): maximum number of rows per section.
+
+    Returns:
+        Tuple[int, int]: number of items and notes written.
+    """
+    if notes is None:
+        notes = stored_notes()
+    with open(path, 'wb') as file:
+        writer = SnapshotWriter(file, chunk_size)
+        for item_type in item_types:
+            db_cls = item_type.BACKEND_CLS
+            rows = getattr(db_cls, 'iter_all', db_cls.list_all)()
+            writer.write_items(item_type.__name__, ((dbi._ikid, dbi.name, dbi.content) for dbi in rows))
+        writer.write_notes(notes)
+        writer.close()
+    return writer.item_count, writer.note_count
+
+
+def import_snapshot(path: str, item_types: Sequence[type] = CORE_ITEM_TYPES) -> Tuple[Dict[type, List[int]], List[Note]]:
+    """Save the items of a snapshot to the backend, keeping their ikids, and rebuild its notes.
+
+    Returns:
+        Tuple[Dict[type, List[int]], List[Note]]: saved ikids per type, and the rebuilt notes.
+    """
+    with SnapshotReader(path) as reader:
+        saved = {item_type: Item.save_many(reader.items(item_type)) for item_type in item_types}
+        notes = reader.notes(item_types)
+    return saved, notes
@@ -15,7 +15,7 @@ setup(
     author='Adrian Ernesto Radillo',
     author_email='adrian.radillo@gmail.com',
     license='GNU Affero General Public License v3.0',
-    packages=['indiek.core'],
+    packages=['indiek.core', 'indiek.core.drivers'],
     install_requires=['indiek-mockdb >= 0.2.0, <0.3.0'],
     extras_require={
         'dev': [
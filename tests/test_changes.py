@@ -0,0 +1,91 @@
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from indiek.core.changes import CHANGES, Change, ChangeLog, ChangeLogTruncated
+from indiek.core.drivers import sqlite
+from indiek.core.items import Definition, Theorem
+from indiek.core.session import session
+
+
+class TestChangeLog(unittest.TestCase):
+    def setUp(self) -> None:
+        self.log = ChangeLog(maxlen=4)
+        self.log.attach()
+        self.addCleanup(self.log.detach)
+
+    def test_record(self):
+        item = Definition(name='logged')
+        ikid = item.save()
+        item.save()
+        item.delete()
+        self.assertEqual(list(self.log.changes_since(0)),
+                         [Change(1, Definition, item.backend, ikid, 'save'),
+                          Change(2, Definition, item.backend, ikid, 'delete')])
+        self.assertEqual(self.log.last_seq, 2)
+        self.assertEqual(CHANGES.last_seq, CHANGES.first_seq + len(CHANGES) - 1)
+
+    def test_unsaved_delete(self):
+        Definition(name='never saved').delete()
+        asyncio.run(Definition(name='never saved').adelete())
+        self.assertEqual(list(self.log.changes_since(0)), [])
+
+    def test_changes_since(self):
+        Definition(name='seen').save()
+        seq = self.log.last_seq
+        theorem = Theorem(name='new')
+        ikid = theorem.save()
+        self.assertEqual([c.ikid for c in self.log.changes_since(seq)], [ikid])
+        self.assertEqual(list(self.log.changes_since(self.log.last_seq)), [])
+        self.assertEqual(self.log.net_changes_since(0)[(Theorem, theorem.backend, ikid)], 'save')
+        theorem.delete()
+        self.assertEqual(self.log.net_changes_since(seq), {(Theorem, theorem.backend, ikid): 'delete'})
+
+    def test_attached_by_items(self):
+        script = ("from indiek.core.items import Definition; Definition(name='early').save(); "
+                  "from indiek.core.changes import CHANGES; print(CHANGES.last_seq)")
+        output = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True, check=True).stdout
+        self.assertEqual(output.strip(), '1')
+
+    def test_drivers_and_sessions(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        sqlite.connect(os.path.join(tmpdir.name, 'changes.sqlite3'))
+        self.addCleanup(sqlite.close)
+        with self.assertRaises(ZeroDivisionError), session(sqlite):
+            Definition(name='rolled back', driver=sqlite).save()
+            1 / 0
+        self.assertEqual(self.log.last_seq, 0)
+
+        in_sqlite = Definition(name='sqlite', driver=sqlite)
+        with session(sqlite):
+            in_sqlite.save()
+            self.assertEqual(self.log.last_seq, 0)
+        in_mockdb = Definition(name='mockdb', _ikid=in_sqlite.ikid)
+        in_mockdb.save()
+        self.assertEqual(in_mockdb.ikid, in_sqlite.ikid)
+        self.assertEqual(self.log.net_changes_since(0),
+                         {(Definition, sqlite, in_sqlite.ikid): 'save',
+                          (Definition, in_mockdb.backend, in_mockdb.ikid): 'save'})
+
+    def test_live_iteration(self):
+        Definition(name='first').save()
+        seen = []
+        for change in self.log.changes_since(0):
+            seen.append(change.seq)
+            if change.seq == 1:
+                Definition(name='during').save()
+        self.assertEqual(seen, [1, 2])
+
+    def test_truncated(self):
+        for i in range(6):
+            Definition(name=str(i)).save()
+        self.assertEqual(self.log.first_seq, 3)
+        self.assertEqual([c.seq for c in self.log.changes_since(2)], [3, 4, 5, 6])
+        self.assertRaises(ChangeLogTruncated, list, self.log.changes_since(1))
+
+
+if __name__ == '__main__':
+    unittest.main()
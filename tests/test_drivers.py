@@ -0,0 +1,87 @@
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from indiek.core import drivers
+from indiek.core.drivers import sqlite
+from indiek.core.items import Definition, Note, PointerNote
+
+
+def run_python(code: str, **env: str) -> str:
+    result = subprocess.run([sys.executable, '-c', code], env=dict(os.environ, **env),
+                            capture_output=True, text=True, check=True)
+    return result.stdout.strip()
+
+
+class TestDriverRegistry(unittest.TestCase):
+    def test_lazy_import(self):
+        loaded = run_python("import sys, indiek.core.items, indiek.core.search\n"
+                            "print(sorted(m for m in sys.modules if 'mockdb' in m or 'sqlite' in m))")
+        self.assertEqual(loaded, '[]')
+
+    def test_env_var(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            module = run_python("from indiek.core.items import Definition\n"
+                                "Definition(name='x').save()\n"
+                                "print(Definition.BACKEND_CLS.__module__)",
+                                INDIEK_DRIVER='sqlite', INDIEK_SQLITE_PATH=os.path.join(tmpdir, 'db.sqlite3'))
+        self.assertEqual(module, 'indiek.core.drivers.sqlite')
+
+    def test_set_default(self):
+        previous = drivers.default()
+        item = Definition(name='kept driver')
+        self.assertIs(item.backend, previous)
+        sqlite.connect(':memory:')
+        drivers.set_default('sqlite')
+        try:
+            self.assertIs(Definition.BACKEND_CLS, sqlite.Definition)
+            self.assertIs(Definition(name='new').backend, sqlite)
+            self.assertIs(item.backend, previous)
+        finally:
+            drivers.set_default(previous)
+            sqlite.close()
+
+    def test_loaded_keep_driver(self):
+        previous = drivers.default()
+        ikid = Definition(name='before').save()
+        note = Note()
+        note.content = ['text', Note()]
+        note.save()
+        loaded = Definition.load(ikid)
+        loaded_note = Note.load(note.ikid, depth=0)
+        sqlite.connect(':memory:')
+        drivers.set_default('sqlite')
+        try:
+            loaded.name = 'after'
+            self.assertEqual(loaded.save(), ikid)
+            self.assertIs(loaded_note.content[1].backend, previous)
+        finally:
+            drivers.set_default(previous)
+            sqlite.close()
+        self.assertEqual(Definition.load(ikid).name, 'after')
+
+    def test_pointers_keep_driver(self):
+        sqlite.connect(':memory:')
+        self.addCleanup(sqlite.close)
+        definition = Definition(name='in sqlite', driver=sqlite)
+        definition.save()
+        note = Note(driver=sqlite)
+        note.content = [PointerNote(definition)]
+        note.save()
+        loaded = Note.load(note.ikid, driver=sqlite)
+        self.assertEqual(loaded.resolve(), 1)
+        self.assertFalse(loaded.content[0].dead)
+        self.assertEqual(loaded.mentions, {definition})
+        lazy = Note.load(note.ikid, driver=sqlite).content[0].reference
+        self.assertEqual((lazy.name, lazy.backend), ('in sqlite', sqlite))
+
+    def test_register(self):
+        drivers.register('alias', 'indiek.core.drivers.sqlite')
+        self.addCleanup(drivers._registry.pop, 'alias')
+        self.assertIs(drivers.get('alias'), sqlite)
+        self.assertRaises(ModuleNotFoundError, drivers.get, 'indiek.no_such_driver')
+
+
+if __name__ == '__main__':
+    unittest.main()
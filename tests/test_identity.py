@@ -0,0 +1,72 @@
+import unittest
+from indiek.core.items import Definition, Theorem
+from indiek.core.identity import IdentityMap, identity_session, current
+from indiek.core.search import filter_str
+from indiek.core.drivers import sqlite
+
+
+class TestIdentityMap(unittest.TestCase):
+    def test_lru_eviction(self):
+        imap = IdentityMap(maxsize=2)
+        imap.put('a', 1)
+        imap.put('b', 2)
+        imap.get('a')
+        imap.put('c', 3)
+        self.assertIn('a', imap)
+        self.assertNotIn('b', imap)
+        self.assertEqual(imap.stats()['evictions'], 1)
+
+    def test_stats(self):
+        imap = IdentityMap()
+        imap.put('a', 1)
+        imap.get('a')
+        imap.get('z')
+        stats = imap.stats()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 1))
+        self.assertEqual(stats['hit_rate'], 0.5)
+
+
+class TestIdentitySession(unittest.TestCase):
+    def setUp(self) -> None:
+        self.defin = Definition(name='identity map', content='same object')
+        self.defin.save()
+
+    def test_inactive_by_default(self):
+        self.assertIsNone(current())
+        self.assertIsNot(Definition.load(self.defin.ikid), Definition.load(self.defin.ikid))
+
+    def test_load_returns_live_object(self):
+        with identity_session() as imap:
+            first = Definition.load(self.defin.ikid)
+            self.assertIs(Definition.load(self.defin.ikid), first)
+            self.assertGreaterEqual(imap.hits, 1)
+        self.assertIsNone(current())
+
+    def test_write_through(self):
+        with identity_session() as imap:
+            thm = Theorem(name='identity theorem')
+            thm.save()
+            self.assertIs(Theorem.load(thm.ikid), thm)
+            found = filter_str('identity', [Theorem])[Theorem]
+            self.assertTrue(any(item is thm for item in found))
+            ikid = thm.ikid
+            key = (Theorem, thm.backend, ikid)
+            self.assertIn(key, imap)
+            thm.delete()
+            self.assertNotIn(key, imap)
+
+    def test_per_driver(self):
+        sqlite.connect(':memory:')
+        self.addCleanup(sqlite.close)
+        ikid = self.defin.ikid
+        Definition(name='sqlite twin', _ikid=ikid, driver=sqlite).save()
+        with identity_session():
+            from_mockdb = Definition.load(ikid)
+            from_sqlite = Definition.load(ikid, driver=sqlite)
+            self.assertEqual(from_sqlite.name, 'sqlite twin')
+            self.assertIs(Definition.load(ikid, driver=sqlite), from_sqlite)
+            self.assertIs(Definition.load(ikid), from_mockdb)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+import unittest
+from indiek.core.drivers import sqlite
+from indiek.core.items import Definition, Theorem, Proof
+from indiek.core.index import InvertedIndex, tokenize
+from indiek.core.search import filter_str
+
+
+class TestInvertedIndex(unittest.TestCase):
+    def setUp(self) -> None:
+        self.index = InvertedIndex()
+        self.index.rebuild()
+        self.index.attach()
+        self.thm = Theorem(name='Pythagoras theorem', content='right triangle')
+        self.thm.save()
+        self.defin = Definition(name='triangle', content='three sides polygon')
+        self.defin.save()
+
+    def tearDown(self) -> None:
+        self.index.detach()
+
+    def test_tokenize(self):
+        self.assertEqual(tokenize('Right-angled Triangle'), ['right', 'angled', 'triangle'])
+
+    def test_follows_save_delete(self):
+        hits = self.index.search('pythagoras', [Theorem])
+        self.assertIn(self.thm.ikid, hits[Theorem])
+        ikid = self.thm.ikid
+        self.thm.delete()
+        hits = self.index.search('pythagoras', [Theorem])
+        self.assertNotIn(ikid, hits[Theorem])
+
+    def test_resave_reindexes(self):
+        self.defin.content = 'four sides'
+        self.defin.save()
+        self.assertNotIn(self.defin.ikid, self.index.search('polygon', [Definition])[Definition])
+        self.assertIn(self.defin.ikid, self.index.search('four', [Definition])[Definition])
+
+    def test_or_and(self):
+        either = self.index.search('pythagoras polygon', [Theorem, Definition])
+        self.assertIn(self.thm.ikid, either[Theorem])
+        self.assertIn(self.defin.ikid, either[Definition])
+        both = self.index.search('triangle right', [Theorem, Definition], match_all=True)
+        self.assertIn(self.thm.ikid, both[Theorem])
+        self.assertNotIn(self.defin.ikid, both[Definition])
+
+    def test_prefix(self):
+        self.assertIn(self.thm.ikid, self.index.search('pyth', [Theorem])[Theorem])
+
+    def test_filter_str_with_index(self):
+        result = filter_str('triangle', [Definition, Theorem, Proof], index=self.index)
+        self.assertEqual(set(result.keys()), {Definition, Theorem, Proof})
+        self.assertIn(self.thm, result[Theorem])
+        self.assertIn(self.defin, result[Definition])
+
+
+    def test_other_driver_ignored(self):
+        sqlite.connect(':memory:')
+        self.addCleanup(sqlite.close)
+        Definition(name='zebra', driver=sqlite).save()
+        self.assertEqual(filter_str('zebra', [Definition], index=self.index), {Definition: []})
+
+        in_sqlite = InvertedIndex(driver=sqlite)
+        in_sqlite.rebuild()
+        found = filter_str('zebra', [Definition], index=in_sqlite)[Definition]
+        self.assertEqual([(d.name, d.backend) for d in found], [('zebra', sqlite)])
+        self.assertEqual(filter_str('triangle', [Definition], index=in_sqlite), {Definition: []})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+import unittest
+from indiek.core import instrumentation
+from indiek.core.items import Definition, Note
+from indiek.core.search import filter_str
+
+
+class TestInstrumentation(unittest.TestCase):
+    def setUp(self) -> None:
+        instrumentation.METRICS.reset()
+        instrumentation.enable()
+
+    def tearDown(self) -> None:
+        instrumentation.disable()
+        instrumentation.METRICS.reset()
+
+    def test_operations(self):
+        item = Definition(name='instrumented', content='abc')
+        item.save()
+        Definition.load(item.ikid)
+        filter_str('instrumented', [Definition])
+        note = Note()
+        note.add_content('text')
+        str(note)
+
+        metrics = instrumentation.METRICS.snapshot()
+        for operation in ('backend.save', 'backend.load', 'backend.str_filter', 'cast.from_db', 'render.note'):
+            self.assertIn(operation, metrics)
+        self.assertGreaterEqual(metrics['backend.str_filter']['rows'], 1)
+        self.assertGreaterEqual(metrics['cast.from_db']['bytes'], len('instrumentedabc'))
+        self.assertEqual(set(instrumentation.METRICS.by_category()), {'backend', 'cast', 'render'})
+
+    def test_nested_render(self):
+        root, child, leaf = Note(), Note(), Note()
+        leaf.add_content('leaf')
+        child.content = ['child', leaf]
+        root.content = ['root', child]
+        str(root)
+        self.assertEqual(instrumentation.METRICS.snapshot()['render.note']['count'], 1)
+
+    def test_disabled(self):
+        instrumentation.disable()
+        self.assertFalse(instrumentation.enabled)
+        Definition(name='not instrumented').save()
+        with instrumentation.span('app.block') as counts:
+            counts['rows'] = 3
+        self.assertEqual(instrumentation.METRICS.snapshot(), {})
+
+    def test_span(self):
+        with instrumentation.span('app.block') as counts:
+            counts['rows'] = 3
+        self.assertEqual(instrumentation.METRICS.snapshot()['app.block']['rows'], 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,11 +1,18 @@
 import unittest
 from indiek.core.items import (Item, 
+                               Nucleus,
                                Definition, 
+                               Theorem,
                                CORE_ITEM_TYPES, 
                                Note, 
                                PointerNote, 
                                NestedNoteLoop, 
-                               AddContentToPointerNote)
+                               AddContentToPointerNote,
+                               DeadPointerNoteSave,
+                               add_listener,
+                               remove_listener,
+                               backlinks)
+from indiek.core import instrumentation, search
 from indiek.mockdb.items import Definition as DBDefinition
 from indiek import mockdb
 
@@ -23,6 +30,12 @@ class TestItemAttr(unittest.TestCase):
         for attr_name in expected_attr:
             self.assertTrue(hasattr(item, attr_name))
     
+    def test_slots(self):
+        for core_cls in CORE_ITEM_TYPES + [Item, Note]:
+            self.assertFalse(hasattr(core_cls(), '__dict__'))
+        item = Definition(name='n', content='c', _ikid=3)
+        self.assertEqual(item.to_dict(), {'_ikid': 3, 'content': 'c', 'name': 'n'})
+
     def test_notes_presence(self):
         item = Definition()
         self.assertIsInstance(item.name, Note)
@@ -51,12 +64,113 @@ class TestItemIO(unittest.TestCase):
             self.assertEqual(core_item, new_item)
             
 
+class TestAsyncIO(unittest.IsolatedAsyncioTestCase):
+    async def test_async_item_io(self):
+        for item_type in CORE_ITEM_TYPES:
+            core_item = item_type(name='async')
+            ikid = await core_item.asave()
+            self.assertEqual(ikid, core_item.ikid)
+            self.assertEqual(await item_type.aload(ikid), core_item)
+            await core_item.adelete()
+            self.assertFalse(core_item.exists_in_db)
+
+
+class TestBulkIO(unittest.TestCase):
+    def test_save_load_delete_many(self):
+        items = [Definition(name='d1'), Theorem(name='t1'), Definition(name='d2')]
+        ikids = Item.save_many(items)
+        self.assertEqual(ikids, [i.ikid for i in items])
+        self.assertEqual(len(set(ikids)), 3)
+
+        loaded = Definition.load_many([ikids[2], ikids[0]])
+        self.assertEqual(loaded, [items[2], items[0]])
+
+        Nucleus.delete_many(items)
+        self.assertTrue(all(not i.exists_in_db for i in items))
+        stored = [dbi._ikid for dbi in Definition.BACKEND_CLS.list_all()]
+        self.assertNotIn(ikids[0], stored)
+
+    def test_delete_many_notes(self):
+        parent, child, other = Note(), Note(), Note()
+        child.add_content('child')
+        other.add_content('other')
+        parent.content = ['parent', child, other]
+        parent.save()
+        Nucleus.delete_many([child, other])
+        self.assertEqual(list(parent.content), ['parent'])
+        self.assertTrue(parent.is_clean)
+        self.assertEqual(str(Note.load(parent.ikid)), 'parent')
+
+
+class TestDirtyTracking(unittest.TestCase):
+    def test_clean_save_is_noop(self):
+        events = []
+        listener = lambda event, obj, ikid: events.append(event)
+        item = Definition(name='n', content='c')
+        self.assertEqual(item.dirty, {'name', 'content'})
+        item.save()
+        self.assertTrue(item.is_clean)
+        add_listener(listener)
+        try:
+            item.save()
+            self.assertEqual(events, [])
+            item.content = 'new'
+            self.assertEqual(item.dirty, {'content'})
+            item.save()
+            self.assertEqual(events, ['save'])
+        finally:
+            remove_listener(listener)
+        self.assertEqual(Definition.load(item.ikid).content, 'new')
+        self.assertTrue(Definition.load(item.ikid).is_clean)
+
+    def test_note_mutation(self):
+        note = Note()
+        note.add_content('text')
+        note.save()
+        self.assertTrue(note.is_clean)
+        note.content[0] = 'edited'
+        self.assertEqual(note.dirty, {'content', 'name'})
+        note.save()
+        self.assertTrue(note.is_clean)
+        self.assertEqual(str(Note.load(note.ikid)), 'edited')
+
+        # The stored text of ancestors changes with their nested notes.
+        parent = Note()
+        parent.add_content(note)
+        parent.save()
+        note.add_content('more')
+        self.assertEqual((note.dirty, parent.dirty), ({'content', 'name'}, {'name'}))
+        parent.save()
+        self.assertEqual(Note.BACKEND_CLS.load(parent.ikid).name, 'edited more')
+
+
 class TestComparison(unittest.TestCase):
     def test_core_vs_db(self):
         core = Item()
         db = core._to_db()
         self.assertNotEqual(core, db)
 
+    def test_hash(self):
+        item = Definition(name='n', content='c')
+        unsaved_hash = hash(item)
+        self.assertEqual(unsaved_hash, hash(Definition(name='n', content='c')))
+        item.content = 'changed'
+        self.assertNotEqual(hash(item), unsaved_hash)
+        item.save()
+        members = {item}
+        item.content = 'changed again'
+        self.assertIn(item, members)
+        self.assertEqual(hash(item), hash((Definition, item.ikid)))
+        self.assertNotEqual(item, Definition(name='n', content='changed', _ikid=item.ikid))
+
+    def test_note_digest(self):
+        inner, outer = Note(), Note()
+        inner.add_content('a')
+        outer.add_content(inner)
+        before = hash(outer)
+        inner.add_content('b')
+        self.assertNotEqual(hash(outer), before)
+
 
 class TestNote(unittest.TestCase):
     """Tests for Note class
@@ -87,12 +201,83 @@ class TestNote(unittest.TestCase):
     def test_forbid_loop(self):
         self.assertRaises(NestedNoteLoop, self.n3.add_content, self.n1)
 
+    def test_forbid_loop_in_place(self):
+        self.assertRaises(NestedNoteLoop, self.n3.content.insert, 0, self.n2)
+        self.assertRaises(NestedNoteLoop, self.n1.add_content, self.n1)
+        self.assertEqual(str(self.n1), 'a b c')
+
+    def test_delete_detaches(self):
+        self.n2.delete()
+        self.assertEqual(len(self.n1.content), 1)
+        self.assertEqual(str(self.n1), 'a')
+        self.assertEqual(str(self.n3), 'c')
+
     def test_str_update(self):
         self.n3.add_content('d')
         self.assertEqual(str(self.n1), 'a b c d')
         self.n3.content[-1] = 'dollar'
         self.assertEqual(str(self.n1), 'a b c dollar')
 
+    def test_str_cache(self):
+        rendered = str(self.n1)
+        self.assertIs(str(self.n1), rendered)
+        self.n3.content.insert(0, 'z')
+        self.assertIsNone(self.n2._rendered)
+        self.assertEqual(str(self.n1), 'a b z c')
+
+    def test_spans(self):
+        rendered = str(self.n1)
+        self.assertEqual(self.n1.spans, [(0, 1), (2, 5)])
+        self.assertEqual([rendered[i:j] for i, j in self.n1.spans], ['a', 'b c'])
+
+    def test_parents(self):
+        self.assertEqual(self.n3.parents, [self.n2])
+        self.n2.content.pop()
+        self.assertEqual(self.n3.parents, [])
+
+    def test_save_load(self):
+        shared = self.n3
+        self.n1.add_content(shared)
+        self.n1.save()
+        self.assertTrue(all(n.exists_in_db for n in (self.n1, self.n2, self.n3)))
+        loaded = Note.load(self.n1.ikid)
+        self.assertEqual(loaded, self.n1)
+        self.assertEqual(str(loaded), 'a b c c')
+        self.assertIs(loaded.content[1].content[1], loaded.content[2])
+
+    def test_partial_load(self):
+        self.n1.save()
+        loaded = Note.load(self.n1.ikid, depth=1)
+        self.assertTrue(loaded.content[1].loaded)
+        stub = loaded.content[1]._content[1]
+        self.assertFalse(stub.loaded)
+        self.assertEqual(stub.content, ['c'])
+        self.assertTrue(stub.loaded and stub.is_clean)
+        self.assertEqual(str(loaded), 'a b c')
+
+    def test_saved_note_deletion(self):
+        self.n1.save()
+        n2_ikid = self.n2.ikid
+        self.n2.delete()
+        self.assertTrue(self.n1.is_clean)
+        self.assertEqual(str(Note.load(self.n1.ikid)), 'a')
+        self.assertNotIn(n2_ikid, [n.ikid for n in search.filter_str('a', [Note])[Note]])
+
+        # Deleted while the stored parent isn't loaded: the entry is dropped on load.
+        parent = Note()
+        parent.add_content('a')
+        parent.add_content(self.n3)
+        parent.save()
+        ikids = parent.ikid, self.n3.ikid
+        del parent
+        Note.load(ikids[1]).delete()
+        loaded = Note.load(ikids[0])
+        self.assertEqual(str(loaded), 'a')
+        self.assertEqual(loaded.dirty, {'content', 'name'})
+        found = search.filter_str('a', [Note])[Note]
+        # Search results hold stubs; a stub whose record is gone renders empty.
+        self.assertEqual([str(n).strip() for n in found if n.ikid == ikids[0]], ['a'])
+
     def test_nested_note_deletion(self):
         del self.n2
         self.assertEqual(str(self.n3), 'c')
@@ -124,6 +309,55 @@ class TestPointerNote(unittest.TestCase):
     def test_str_repr(self):
         self.assertIn(str(self.defin.ikid), str(self.note))
 
+    def test_backlinks(self):
+        parent, grand_parent = Note(), Note()
+        parent.add_content(self.note)
+        grand_parent.add_content(parent)
+        self.assertEqual(grand_parent.mentions, {self.defin})
+        linked = backlinks(self.defin.ikid)
+        for note in (self.note, parent, grand_parent):
+            self.assertTrue(any(n is note for n in linked))
+
+        parent.content.clear()
+        self.assertEqual(grand_parent.mentions, set())
+        self.assertFalse(any(n is grand_parent for n in backlinks(self.defin.ikid)))
+
+    def test_item_db_deletion(self):
+        parent = Note()
+        parent.add_content(self.note)
+        self.defin.delete()
+        self.assertTrue(self.note.dead)
+        self.assertFalse(self.note.exists_in_db)
+        self.assertEqual(self.note.mentions, set())
+        self.assertEqual(parent.mentions, set())
+        self.assertRaises(DeadPointerNoteSave, self.note.save)
+
+    def test_lazy_reference(self):
+        lazy = PointerNote(reference_type=Definition, reference_ikid=self.defin.ikid)
+        self.assertFalse(lazy.resolved)
+        self.assertEqual(lazy.mentions, set())
+        self.assertEqual(lazy.reference, self.defin)
+        self.assertEqual(lazy.mentions, {self.defin})
+
+    def test_resolve(self):
+        other = Definition(name='other')
+        other.save()
+        root, parent = Note(), Note()
+        pointers = [PointerNote(reference_type=Definition, reference_ikid=ikid)
+                    for ikid in (self.defin.ikid, other.ikid, self.defin.ikid)]
+        parent.content = pointers[:2]
+        root.content = [parent, pointers[2]]
+        calls = []
+        hook = lambda operation, seconds, rows, nbytes: calls.append(operation)
+        instrumentation.add_hook(hook)
+        try:
+            self.assertEqual(root.resolve(), 3)
+        finally:
+            instrumentation.remove_hook(hook)
+        self.assertEqual([c for c in calls if c.startswith('backend.')], ['backend.load'] * 2)
+        self.assertEqual(root.mentions, {self.defin, other})
+        self.assertEqual(root.resolve(), 0)
+
     def test_item_deletion(self):
         del self.defin
         self.assertTrue(not self.note.exists_in_db)
@@ -0,0 +1,59 @@
+import threading
+import unittest
+from indiek.core.drivers.pool import ConnectionPool, PoolTimeout
+
+
+class Connection:
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class TestConnectionPool(unittest.TestCase):
+    def setUp(self) -> None:
+        self.pool = ConnectionPool(Connection, size=2, timeout=0.05)
+
+    def test_reuse(self):
+        with self.pool.connection() as first:
+            pass
+        with self.pool.connection() as second:
+            self.assertIs(second, first)
+        self.assertEqual(self.pool.opened, 1)
+
+    def test_bounded(self):
+        conns = [self.pool.acquire(), self.pool.acquire()]
+        self.assertRaises(PoolTimeout, self.pool.acquire)
+        released = threading.Timer(0.01, self.pool.release, (conns[0],))
+        released.start()
+        self.assertIs(self.pool.acquire(timeout=1), conns[0])
+        released.join()
+
+    def test_session(self):
+        with self.pool.session() as conn:
+            with self.pool.connection() as inner, self.pool.session() as nested:
+                self.assertIs(inner, conn)
+                self.assertIs(nested, conn)
+            other = []
+            thread = threading.Thread(target=lambda: other.append(self.pool.acquire()))
+            thread.start()
+            thread.join()
+            self.assertIsNot(other[0], conn)
+        self.assertFalse(self.pool.in_session)
+
+    def test_close(self):
+        idle = self.pool.acquire()
+        busy = self.pool.acquire()
+        self.pool.release(idle)
+        self.pool.close()
+        self.assertTrue(idle.closed)
+        self.assertFalse(busy.closed)
+        self.pool.release(busy)
+        self.assertTrue(busy.closed)
+        self.assertEqual(self.pool.opened, 0)
+        self.assertRaises(RuntimeError, self.pool.acquire)
+
+
+if __name__ == '__main__':
+    unittest.main()
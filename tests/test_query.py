@@ -0,0 +1,93 @@
+import unittest
+from indiek.core.items import Definition, Theorem, Proof
+from indiek.core.index import InvertedIndex
+from indiek.core.query import (parse_query,
+                               filter_query,
+                               QueryPlan,
+                               QuerySyntaxError,
+                               Term,
+                               And,
+                               Or,
+                               Not)
+
+
+class TestParser(unittest.TestCase):
+    def test_implicit_and(self):
+        node = parse_query('prime number')
+        self.assertIsInstance(node, And)
+        self.assertEqual([c.text for c in node.children], ['prime', 'number'])
+
+    def test_precedence(self):
+        node = parse_query('a b OR NOT c')
+        self.assertIsInstance(node, Or)
+        self.assertIsInstance(node.children[0], And)
+        self.assertIsInstance(node.children[1], Not)
+
+    def test_phrase_and_field(self):
+        node = parse_query('name:"prime number" -content:even')
+        phrase, negated = node.children
+        self.assertEqual((phrase.field, phrase.phrase), ('name', True))
+        self.assertIsInstance(negated, Not)
+        self.assertEqual(negated.child.field, 'content')
+
+    def test_grouping(self):
+        node = parse_query('(a OR b) c')
+        self.assertIsInstance(node.children[0], Or)
+
+    def test_errors(self):
+        for bad in ('', '(a', 'a)', 'OR', 'foo:"x y"', '"..."'):
+            self.assertRaises(QuerySyntaxError, parse_query, bad)
+
+    def test_term_matching(self):
+        self.assertTrue(Term('theo').matches({'name': 'Theorem', 'content': ''}))
+        self.assertFalse(Term('heor').matches({'name': 'Theorem', 'content': ''}))
+        phrase = Term('prime number', phrase=True)
+        self.assertTrue(phrase.matches({'name': '', 'content': 'a Prime  number'}))
+        self.assertFalse(phrase.matches({'name': '', 'content': 'number prime'}))
+
+
+class TestFilterQuery(unittest.TestCase):
+    def setUp(self) -> None:
+        self.prime = Definition(name='prime number', content='divisible by one and itself')
+        self.prime.save()
+        self.even = Definition(name='even number', content='divisible by two')
+        self.even.save()
+        self.thm = Theorem(name='infinitude of primes', content='there are infinitely many prime numbers')
+        self.thm.save()
+
+    def check(self, query_str, index=None):
+        found = filter_query(query_str, [Definition, Theorem, Proof], index=index)
+        return {item.ikid for items in found.values() for item in items}
+
+    def test_semantics(self):
+        for index in (None, self.make_index()):
+            found = self.check('number divisible', index)
+            self.assertTrue({self.prime.ikid, self.even.ikid} <= found)
+            self.assertNotIn(self.thm.ikid, found)
+
+            found = self.check('name:prime OR name:infinitude', index)
+            self.assertTrue({self.prime.ikid, self.thm.ikid} <= found)
+
+            found = self.check('number NOT content:two', index)
+            self.assertIn(self.prime.ikid, found)
+            self.assertNotIn(self.even.ikid, found)
+
+            self.assertIn(self.thm.ikid, self.check('"many prime"', index))
+            self.assertNotIn(self.thm.ikid, self.check('"prime many"', index))
+
+    def make_index(self):
+        index = InvertedIndex()
+        index.rebuild()
+        return index
+
+    def test_plan_order(self):
+        index = self.make_index()
+        plan = QueryPlan(parse_query('NOT even number itself'), Definition, index)
+        texts = [getattr(c, 'text', None) for c in plan.root.children]
+        self.assertEqual(texts, ['itself', 'number', None])
+        self.assertIn(self.prime.ikid, plan.candidates())
+        self.assertNotIn(self.even.ikid, plan.candidates())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,43 @@
+import unittest
+import uuid
+from indiek.core.items import Definition, Theorem
+from indiek.core.index import InvertedIndex
+from indiek.core.ranking import BM25Scorer
+from indiek.core.search import filter_str
+
+
+class TestBM25Scorer(unittest.TestCase):
+    def test_name_boost_and_idf(self):
+        scorer = BM25Scorer(10, {'rare': 1, 'common': 9}, (2.0, 10.0))
+        in_name = scorer.score({'rare': (1, 0)}, (2, 10))
+        in_content = scorer.score({'rare': (0, 1)}, (2, 10))
+        self.assertGreater(in_name, in_content)
+        self.assertGreater(scorer.score({'rare': (1, 0)}, (2, 10)),
+                           scorer.score({'common': (1, 0)}, (2, 10)))
+
+
+class TestTopK(unittest.TestCase):
+    def setUp(self) -> None:
+        self.word = word = 'z' + uuid.uuid4().hex
+        self.best = Definition(name=f'{word} {word}', content=word)
+        self.middle = Definition(name='other', content=f'{word} and more words here')
+        self.worst = Definition(name='other', content=f'{word} ' + 'filler ' * 50)
+        for item in (self.worst, self.middle, self.best):
+            item.save()
+
+    def check_order(self, index=None):
+        found = filter_str(self.word, [Definition, Theorem], index=index, top_k=2)
+        self.assertEqual(found[Definition], [self.best, self.middle])
+        self.assertEqual(found[Theorem], [])
+
+    def test_scanned(self):
+        self.check_order()
+
+    def test_indexed(self):
+        index = InvertedIndex()
+        index.rebuild()
+        self.check_order(index)
+
+
+if __name__ == '__main__':
+    unittest.main()
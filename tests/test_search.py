@@ -1,7 +1,22 @@
+import asyncio
 import unittest
 import re
-from indiek.core.items import  Proof, Theorem, Definition, CORE_ITEM_TYPES
-from indiek.core.search import list_all_items, search_and_cast, build_search_query, filter_str
+import sys
+import threading
+from indiek.core.items import  Proof, Theorem, Definition, Note, CORE_ITEM_TYPES
+from indiek.core import instrumentation
+from indiek.core.cache import QueryCache, bump, generation
+from indiek.core.parallel import parallel_search_and_cast
+from indiek.core.query import filter_query
+from indiek.core.search import (list_all_items,
+                                search_and_cast,
+                                batch_search_and_cast,
+                                build_search_query,
+                                filter_str,
+                                iter_all_items,
+                                iter_filter_str,
+                                afilter_str,
+                                alist_all_items)
 
 
 class TestSearch(unittest.TestCase):
@@ -63,6 +78,91 @@ class TestSearch(unittest.TestCase):
         proof_result = search_and_cast(thm_query, Proof)
         self.assertNotIn(written_proof, proof_result)
 
+    def test_batch_search_and_cast(self):
+        query = build_search_query('theorem proof')
+        batched = batch_search_and_cast(query, CORE_ITEM_TYPES)
+        self.assertEqual(list(batched.keys()), CORE_ITEM_TYPES)
+        for core_type in CORE_ITEM_TYPES:
+            self.assertEqual(batched[core_type], search_and_cast(query, core_type))
+
+    def test_iter_all_items(self):
+        streamed = list(iter_all_items(CORE_ITEM_TYPES))
+        listed = [(t, i) for t, items in list_all_items(CORE_ITEM_TYPES).items() for i in items]
+        self.assertEqual(streamed, listed)
+
+        page = list(iter_all_items(CORE_ITEM_TYPES, limit=2, offset=1))
+        self.assertEqual(page, listed[1:3])
+
+    def test_iter_filter_str(self):
+        streamed = list(iter_filter_str('theorem proof', [Theorem, Proof], limit=1))
+        self.assertEqual(len(streamed), 1)
+        self.assertIn(streamed[0][0], {Theorem, Proof})
+
+    def test_async_search(self):
+        async_found = asyncio.run(afilter_str('theorem proof', CORE_ITEM_TYPES))
+        self.assertEqual(async_found, filter_str('theorem proof', CORE_ITEM_TYPES))
+        async_all = asyncio.run(alist_all_items(CORE_ITEM_TYPES))
+        self.assertEqual(async_all, list_all_items(CORE_ITEM_TYPES))
+
+    def test_parallel_filter_str(self):
+        for processes in (1, 2):
+            found = filter_str('class', CORE_ITEM_TYPES, processes=processes)
+            self.assertEqual(found, filter_str('class', CORE_ITEM_TYPES))
+        shuffled = parallel_search_and_cast(build_search_query('class'), CORE_ITEM_TYPES, processes=2, shard_size=1)
+        self.assertEqual(shuffled, filter_str('class', CORE_ITEM_TYPES))
+
+    def test_note_search(self):
+        nested = Note()
+        nested.add_content('zzquokka habitat')
+        parent = Note()
+        parent.add_content('hello world')
+        parent.add_content(nested)
+        parent.save()
+        # Records hold JSON, which must not be what gets matched.
+        self.assertNotIn(parent, filter_str('s', [Note])[Note])
+        self.assertEqual(filter_str('zzquokka', [Note])[Note], [nested, parent])
+        self.assertEqual(filter_str('zzquokka', [Note], processes=1)[Note], [nested, parent])
+        self.assertEqual(filter_str('zzquokka', [Note], top_k=1)[Note], [nested])
+        self.assertEqual([note for _, note in iter_filter_str('zzquokka', [Note])], [nested, parent])
+        self.assertEqual(filter_query('zzquokka hello', [Note])[Note], [parent])
+
+        # Matches come out of a single backend search, nothing else is loaded.
+        calls = []
+        hook = lambda operation, seconds, rows, nbytes: calls.append(operation)
+        instrumentation.add_hook(hook)
+        try:
+            self.assertEqual(len(filter_str('zzquokka', [Note])[Note]), 2)
+        finally:
+            instrumentation.remove_hook(hook)
+        self.assertEqual([c for c in calls if c.startswith('backend.')], ['backend.str_filter'])
+
+    def test_query_cache(self):
+        cache = QueryCache(maxsize=4)
+        first = filter_str('theorem proof', CORE_ITEM_TYPES, cache=cache)
+        again = filter_str('proof  theorem', CORE_ITEM_TYPES, cache=cache)
+        self.assertEqual(first, again)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+        new_thm = Theorem(name='theorem cached')
+        new_thm.save()
+        fresh = filter_str('theorem proof', CORE_ITEM_TYPES, cache=cache)
+        self.assertIn(new_thm, fresh[Theorem])
+        self.assertEqual(cache.stats()['invalidations'], 1)
+
+    def test_concurrent_generations(self):
+        class Bumped: pass
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        try:
+            threads = [threading.Thread(target=lambda: [bump(Bumped) for _ in range(2000)]) for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            sys.setswitchinterval(interval)
+        self.assertEqual(generation(Bumped), 8000)
+
     def test_build_search_query(self):
         raw_str = r'user typed This'
         query = build_search_query(raw_str)
@@ -0,0 +1,84 @@
+import os
+import tempfile
+import unittest
+from indiek.core.items import Definition, Theorem, Note, PointerNote, CORE_ITEM_TYPES
+from indiek.core.snapshot import (export_snapshot,
+                                  import_snapshot,
+                                  SnapshotReader,
+                                  SnapshotError)
+
+
+class TestSnapshot(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'backup.iksnap')
+        self.defin = Definition(name='snapshot déf', content='content')
+        self.defin.save()
+        self.thm = Theorem(name='snapshot thm', content='content')
+        self.thm.save()
+
+    def tearDown(self) -> None:
+        self.tmpdir.cleanup()
+
+    def test_items_round_trip(self):
+        item_count, _ = export_snapshot(self.path, chunk_size=2)
+        with SnapshotReader(self.path) as reader:
+            self.assertEqual(sum(len(reader.ikids(t.__name__)) for t in CORE_ITEM_TYPES), item_count)
+            items = {item.ikid: item for item in reader.items(Definition)}
+            self.assertEqual(items[self.defin.ikid], self.defin)
+        saved, _ = import_snapshot(self.path)
+        self.assertIn(self.thm.ikid, saved[Theorem])
+
+    def test_notes_round_trip(self):
+        shared = Note()
+        shared.add_content('shared')
+        root = Note()
+        root.content = ['intro', shared, PointerNote(self.defin), shared]
+        _, note_count = export_snapshot(self.path, item_types=[Definition], notes=[root, shared])
+        self.assertEqual(note_count, 3)
+
+        with SnapshotReader(self.path) as reader:
+            notes = reader.notes([Definition])
+        restored = notes[-1]
+        self.assertEqual(str(restored), str(root))
+        self.assertIs(restored.content[1], restored.content[3])
+        pointer = restored.content[2]
+        self.assertIsInstance(pointer, PointerNote)
+        self.assertEqual((pointer.reference_type, pointer.reference_ikid), (Definition, self.defin.ikid))
+        self.assertEqual(restored.mentions, {self.defin})
+
+    def test_stored_notes(self):
+        shared = Note()
+        shared.add_content('stored shared')
+        root = Note()
+        root.content = ['stored intro', shared, PointerNote(self.defin), shared]
+        root.save()
+        _, note_count = export_snapshot(self.path, item_types=[Definition])
+        self.assertGreaterEqual(note_count, 3)
+
+        with SnapshotReader(self.path) as reader:
+            restored = [note for note in reader.notes([Definition]) if note.ikid == root.ikid]
+        self.assertEqual(len(restored), 1)
+        self.assertEqual(str(restored[0]), str(root))
+        self.assertIs(restored[0].content[1], restored[0].content[3])
+        self.assertEqual(restored[0].content[2].reference_ikid, self.defin.ikid)
+
+    def test_close_while_reading(self):
+        export_snapshot(self.path)
+        reader = SnapshotReader(self.path)
+        rows = reader.iter_rows()
+        next(rows)
+        items = reader.items(Theorem)
+        next(items)
+        reader.close()
+        self.assertRaises(ValueError, next, rows)
+
+    def test_truncated(self):
+        export_snapshot(self.path)
+        with open(self.path, 'r+b') as file:
+            file.truncate(os.path.getsize(self.path) - 16)
+        self.assertRaises(SnapshotError, SnapshotReader, self.path)
+
+
+if __name__ == '__main__':
+    unittest.main()
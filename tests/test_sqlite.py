@@ -0,0 +1,187 @@
+import asyncio
+import os
+import re
+import tempfile
+import threading
+import unittest
+from indiek.core.drivers import sqlite
+from indiek.core.drivers.sqlite import Definition, Theorem, Proof, MixedTypeOverrideError
+
+
+class SQLiteTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'indiek.sqlite3')
+        sqlite.connect(self.path)
+
+    def tearDown(self) -> None:
+        sqlite.close()
+        self.tmpdir.cleanup()
+
+
+class TestSQLiteDriver(SQLiteTestCase):
+    def test_write_read(self):
+        item_dict = {'name': 'item1', 'content': 'blabla'}
+        ikid = Definition(**item_dict).save()
+        self.assertEqual(Definition.load(ikid).to_dict(), dict(item_dict, _ikid=ikid))
+        self.assertRaises(KeyError, Theorem.load, ikid)
+
+    def test_persistence(self):
+        ikid = Theorem(name='persisted').save()
+        sqlite.connect(self.path)
+        self.assertEqual(Theorem.load(ikid).name, 'persisted')
+
+    def test_override(self):
+        ikid = Definition().save()
+        self.assertRaises(MixedTypeOverrideError, Proof(_ikid=ikid).save)
+        Definition(name='new', _ikid=ikid).save()
+        self.assertEqual(Definition.load(ikid).name, 'new')
+
+    def test_delete(self):
+        item = Proof(name='gone')
+        ikid = item.save()
+        item.delete()
+        self.assertIsNone(item._ikid)
+        self.assertRaises(KeyError, Proof.load, ikid)
+
+    def test_str_filter(self):
+        Theorem(name='Theorem bambi', content='nany').save()
+        Theorem(name='Theorem bamboo', content='granny').save()
+        Proof(name='bambi proof').save()
+        self.assertEqual(len(Theorem.str_filter(re.compile('bambi'))), 1)
+        self.assertEqual(len(Theorem.str_filter(re.compile('(bamb|zzz)'))), 2)
+        self.assertEqual(len(Theorem.str_filter(re.compile('NANY', re.IGNORECASE))), 1)
+        self.assertEqual(len(Theorem.str_filter(re.compile('NANY'))), 0)
+        by_cls = sqlite.str_filter_many(re.compile('bambi'), [Theorem, Proof, Definition])
+        self.assertEqual({cls: len(found) for cls, found in by_cls.items()},
+                         {Theorem: 1, Proof: 1, Definition: 0})
+
+    def test_update(self):
+        ikid = Definition(name='before', content='kept').save()
+        Definition.update(ikid, {'name': 'after'})
+        self.assertEqual(Definition.load(ikid).to_dict(), {'_ikid': ikid, 'name': 'after', 'content': 'kept'})
+        self.assertRaises(KeyError, Theorem.update, ikid, {'name': 'other'})
+
+    def test_batches(self):
+        ikids = Definition.save_many([{'name': 'a'}, {'name': 'b', '_ikid': 1000}])
+        self.assertEqual(ikids[1], 1000)
+        self.assertEqual([d.name for d in Definition.load_many(ikids[::-1])], ['b', 'a'])
+        Definition.delete_many(ikids)
+        self.assertEqual(Definition.list_all(), [])
+
+    def test_paged_stream(self):
+        fetch_size, sqlite.FETCH_SIZE = sqlite.FETCH_SIZE, 2
+        try:
+            ikids = Definition.save_many({'name': f'item {i}'} for i in range(5))
+            self.assertEqual([d._ikid for d in Definition.iter_all()], ikids)
+        finally:
+            sqlite.FETCH_SIZE = fetch_size
+
+    def test_threads(self):
+        sqlite.connect(self.path, pool_size=2)
+        errors = []
+
+        def write(thread_id):
+            try:
+                for i in range(20):
+                    Definition(name=f'{thread_id}-{i}').save()
+            except Exception as error:
+                errors.append(error)
+
+        threads = [threading.Thread(target=write, args=(t,)) for t in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(len(Definition.list_all()), 80)
+        self.assertLessEqual(sqlite._pool.opened, 2)
+
+
+class TestSQLiteCore(SQLiteTestCase):
+    def test_driver_param(self):
+        from indiek.core.items import Definition as CoreDefinition
+        item = CoreDefinition(name='core def', driver=sqlite)
+        ikid = item.save()
+        self.assertEqual(Definition.load(ikid).name, 'core def')
+        reloaded = CoreDefinition.load(ikid, driver=sqlite)
+        self.assertEqual(reloaded, item)
+        self.assertIs(reloaded.backend, sqlite)
+
+    def test_partial_save(self):
+        from indiek.core.items import Definition as CoreDefinition
+        item = CoreDefinition(name='core def', content='old', driver=sqlite)
+        ikid = item.save()
+        Definition.update(ikid, {'name': 'renamed elsewhere'})
+        item.content = 'new'
+        item.save()
+        self.assertEqual(Definition.load(ikid).to_dict(),
+                         {'_ikid': ikid, 'name': 'renamed elsewhere', 'content': 'new'})
+
+    def test_parallel_search(self):
+        from indiek.core import drivers
+        from indiek.core.items import CORE_ITEM_TYPES
+        from indiek.core.parallel import parallel_search_and_cast
+        from indiek.core.search import build_search_query, filter_str
+        Definition.save_many([{'name': f'def {i}', 'content': 'needle' if i % 3 else 'hay'} for i in range(20)])
+        Theorem(name='needle theorem').save()
+        previous = drivers.default()
+        drivers.set_default(sqlite)
+        self.addCleanup(drivers.set_default, previous)
+        serial = filter_str('needle', CORE_ITEM_TYPES)
+        self.assertEqual(sum(map(len, serial.values())), 14)
+        for processes in (1, 2):
+            found = parallel_search_and_cast(build_search_query('needle'), CORE_ITEM_TYPES, processes, shard_size=4)
+            self.assertEqual(found, serial)
+            self.assertTrue(all(item.backend is sqlite for items in found.values() for item in items))
+
+    def test_session(self):
+        from indiek.core.items import Definition as CoreDefinition
+        from indiek.core.items import add_listener, remove_listener
+        from indiek.core.session import session
+        with session(sqlite):
+            kept = CoreDefinition(name='kept', driver=sqlite)
+            kept.save()
+        events = []
+        listener = lambda event, obj, ikid: events.append((event, ikid))
+        add_listener(listener)
+        self.addCleanup(remove_listener, listener)
+        rolled_back = CoreDefinition(name='rolled back', driver=sqlite)
+        with self.assertRaises(ZeroDivisionError), session(sqlite):
+            rolled_back.save()
+            kept.name = 'renamed'
+            kept.save()
+            kept.delete()
+            self.assertEqual(events, [])
+            1 / 0
+        self.assertEqual([d.name for d in Definition.list_all()], ['kept'])
+        self.assertEqual(events, [])
+        self.assertFalse(rolled_back.exists_in_db)
+        self.assertEqual(kept.dirty, {'name'})
+        self.assertTrue(kept.exists_in_db)
+
+        # Saving again after the rollback writes for real, and is only notified once committed.
+        with session(sqlite):
+            rolled_back.save()
+            kept.save()
+            self.assertEqual(events, [])
+        self.assertEqual(sorted(d.name for d in Definition.list_all()), ['renamed', 'rolled back'])
+        self.assertEqual(events, [('save', rolled_back.ikid), ('save', kept.ikid)])
+
+    def test_async_writes(self):
+        from indiek.core.items import Definition as CoreDefinition
+        from indiek.core.items import add_listener, remove_listener
+        events = []
+        listener = lambda event, obj, ikid: events.append((event, ikid))
+        add_listener(listener)
+        self.addCleanup(remove_listener, listener)
+        defin = CoreDefinition(name='async', driver=sqlite)
+        ikid = asyncio.run(defin.asave())
+        self.assertTrue(defin.is_clean)
+        asyncio.run(defin.adelete())
+        self.assertFalse(defin.exists_in_db)
+        self.assertEqual(events, [('save', ikid), ('delete', ikid)])
+
+
+if __name__ == '__main__':
+    unittest.main()